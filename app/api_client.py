@@ -67,3 +67,7 @@ class APIClient:
     @api_error_handler
     def get_queue(self):
         return requests.get(f"{self.base_url}/transcription/queue/")
+
+    @api_error_handler
+    def reset_queue(self):
+        return requests.post(f"{self.base_url}/transcription/reset_queue/")
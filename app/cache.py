@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from app.config import settings
+from app.logging import get_logger
+
+logger = get_logger()
+
+
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """sha256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaCache:
+    """
+    A persistent, content-addressed cache of converted audio files.
+
+    Entries are keyed by the source URL (remote media) or by the hash of the
+    file (local media), so re-running a playlist or re-queuing a failed
+    transcript reuses the audio that was already downloaded and converted.
+    The cache has a size cap; when it is exceeded, the least recently used
+    entries are evicted.
+    """
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size  # in bytes
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        """The cache configured in config.ini, or None when it is disabled"""
+        cache_dir = settings.config.get(
+            "media_cache_dir",
+            os.path.join(settings.TSTBTC_DATA_DIR, "cache", "media"),
+        )
+        if not cache_dir:
+            return None
+        max_size_mb = settings.config.getint("media_cache_max_size", 10240)
+        return cls(cache_dir, max_size_mb * 1024 * 1024)
+
+    @staticmethod
+    def key_for(source_file, local):
+        if local:
+            return file_digest(source_file)
+        return hashlib.sha256(source_file.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def get(self, key):
+        """Path of the cached audio, or None on a miss"""
+        path = self._path(key)
+        try:
+            # mark the entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        logger.debug(f"(cache) Audio found in cache: {path}")
+        return path
+
+    def checkout(self, key, target_dir):
+        """Hard link (or copy) the cached audio into `target_dir` and return
+        the path of the link, or None on a miss. The link outlives the
+        eviction of the entry, and the files derived from the audio (e.g.
+        its chunks) are written next to it instead of into the cache"""
+        path = self.get(key)
+        if path is None:
+            return None
+        target = os.path.join(target_dir, os.path.basename(path))
+        if os.path.exists(target):
+            os.remove(target)
+        try:
+            os.link(path, target)
+        except FileNotFoundError:
+            # evicted in the meantime
+            return None
+        except OSError:
+            # e.g. the cache is on another file system
+            try:
+                shutil.copyfile(path, target)
+            except FileNotFoundError:
+                return None
+        return target
+
+    def put(self, key, audio_file):
+        """Copy `audio_file` into the cache and return the cached path"""
+        path = self._path(key)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # copy under a temporary name first, so that readers never see a
+        # partially written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        os.close(fd)
+        try:
+            shutil.copyfile(audio_file, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logger.debug(f"(cache) Audio stored in cache: {path}")
+        self.evict(keep=path)
+        return path
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [
+            entry for entry in os.scandir(self.cache_dir)
+            if entry.name.endswith(".mp3")
+        ]
+
+    def size(self):
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def evict(self, keep=None):
+        """Remove the least recently used entries until the cache fits
+        in `max_size`"""
+        with self._lock:
+            entries = [
+                (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                for entry in self._entries()
+            ]
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_size:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                    logger.debug(f"(cache) Evicted: {path}")
+                except FileNotFoundError:
+                    pass
+
+
+class ResultCache:
+    """
+    A persistent cache of transcription service outputs.
+
+    Entries are keyed by the digest of the audio together with the service
+    and every option that affects its output (model, language, diarization,
+    summarization), so transcribing the same audio with the same settings
+    again reuses the stored output instead of calling the service.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    @classmethod
+    def from_settings(cls):
+        """The cache configured in config.ini, or None when it is disabled"""
+        cache_dir = settings.config.get(
+            "asr_cache_dir",
+            os.path.join(settings.TSTBTC_DATA_DIR, "cache", "asr"),
+        )
+        if not cache_dir:
+            return None
+        return cls(cache_dir)
+
+    @staticmethod
+    def key_for(audio_file, service, options: dict):
+        descriptor = json.dumps(
+            {"audio": file_digest(audio_file), "service": service, **options},
+            sort_keys=True,
+        )
+        return hashlib.sha256(descriptor.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """The cached service output, or None on a miss"""
+        try:
+            with open(self._path(key), "r") as f:
+                output = json.load(f)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError:
+            logger.warning(f"(cache) Ignoring corrupted entry: {self._path(key)}")
+            return None
+        logger.debug(f"(cache) Transcription found in cache: {self._path(key)}")
+        return output
+
+    def put(self, key, output):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(output, f)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -57,11 +57,12 @@ def media():
 @click.argument("audio_path", type=click.Path(exists=True))
 @click.argument("output_dir", type=click.Path(), default=None)
 @click.option("--chunk_length", default=1200.0, show_default=True, help="Maximum length of each chunk (in seconds)")
-def split_audio(audio_path, output_dir, chunk_length):
-    """Split audio file based on silence"""
+@click.option("--overlap", default=0.0, show_default=True, help="Overlap between consecutive chunks (in seconds)")
+def split_audio(audio_path, output_dir, chunk_length, overlap):
+    """Split audio file into chunks, without re-encoding"""
     try:
         processor = MediaProcessor(chunk_length)
-        processor.split_audio(audio_path, output_dir)
+        processor.split_audio(audio_path, output_dir, overlap=overlap)
         logger.info(f"Audio split successfully and saved in {output_dir}")
     except Exception as e:
         logger.error(f"Error splitting audio: {e}")
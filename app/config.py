@@ -8,6 +8,10 @@ def read_config(profile):
     config.read('config.ini')
     return config[profile]
 
+def default_data_dir():
+    data_home = os.getenv('XDG_DATA_HOME') or os.path.join('~', '.local', 'share')
+    return os.path.join(data_home, 'tstbtc')
+
 class Settings:
     def __init__(self):
         # Reload environment variables from .env file
@@ -15,6 +19,9 @@ class Settings:
 
         # server
         self.TSTBTC_METADATA_DIR = os.getenv('TSTBTC_METADATA_DIR')
+        # job store and caches, kept per user instead of in the working directory
+        self.TSTBTC_DATA_DIR = os.path.abspath(os.path.expanduser(
+            os.getenv('TSTBTC_DATA_DIR') or default_data_dir()))
         # GitHub API settings
         self.GITHUB_REPO_OWNER = os.getenv('GITHUB_REPO_OWNER', 'bitcointranscripts')
         self.GITHUB_REPO_NAME = os.getenv('GITHUB_REPO_NAME', 'bitcointranscripts')
@@ -31,6 +38,7 @@ class Settings:
         overview = "Configuration Settings:\n"
         overview += f"PROFILE: {self.PROFILE}\n"
         overview += f"TSTBTC_METADATA_DIR: {self.TSTBTC_METADATA_DIR}\n"
+        overview += f"TSTBTC_DATA_DIR: {self.TSTBTC_DATA_DIR}\n"
         overview += f"GITHUB_REPO_OWNER: {self.GITHUB_REPO_OWNER}\n"
         overview += f"GITHUB_REPO_NAME: {self.GITHUB_REPO_NAME}\n"
         overview += f"GITHUB_METADATA_REPO_NAME: {self.GITHUB_METADATA_REPO_NAME}\n"
@@ -1,6 +1,10 @@
+import gzip
 import json
 import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
+from collections.abc import Iterable
 from typing import Literal
 
 
@@ -17,6 +21,10 @@ class DataWriter:
         Initializes the DataWriter instance with a basedirectory where all files will be saved.
         """
         self.base_dir = base_dir
+        # writes that happen in the background, by output file
+        self._pending: dict[str, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._executor = None
 
     def add_timestamp(self, filename):
         """
@@ -25,10 +33,16 @@ class DataWriter:
         timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H%M%SZ")
         return f"{filename}_{timestamp}"
 
-    def write_json(self, data, file_path, filename, include_timestamp=True):
+    def write_json(
+        self, data, file_path, filename, include_timestamp=True, background=False
+    ):
         """
         Writes given data to a JSON file, organizing it within the
-        structured directory path based on `file_path` and `filename`
+        structured directory path based on `file_path` and `filename`.
+
+        With `background`, the file is written by a worker thread and the
+        path is returned right away; `data` must not be modified
+        afterwards. Use `wait` before reading the file.
         """
         output_file = self.construct_file_path(
             file_path,
@@ -36,10 +50,101 @@ class DataWriter:
             type="json",
             include_timestamp=include_timestamp,
         )
-        with open(output_file, "w") as json_file:
-            json.dump(data, json_file, indent=4)
+        if not background:
+            self._dump_json(data, output_file)
+            return output_file
+        with self._pending_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="data-writer"
+                )
+            self._pending[output_file] = self._executor.submit(
+                self._dump_json, data, output_file
+            )
         return output_file
 
+    @staticmethod
+    def _dump_json(data, output_file):
+        # readers never see a partially written file
+        tmp_file = f"{output_file}.tmp"
+        try:
+            with open(tmp_file, "w") as json_file:
+                json.dump(data, json_file, indent=4)
+            os.replace(tmp_file, output_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+    def write_json_stream(
+        self, data: dict, file_path, filename, include_timestamp=True, compress=False
+    ):
+        """
+        Writes a JSON object whose values may be iterables (e.g. generators)
+        item by item in compact JSON, so that the items never all need to be
+        in memory. With `compress`, the file is gzip-compressed and gets a
+        `.json.gz` extension.
+        """
+        output_file = self.construct_file_path(
+            file_path,
+            filename,
+            type="json",
+            include_timestamp=include_timestamp,
+        )
+        if compress:
+            output_file = f"{output_file}.gz"
+        encode = json.JSONEncoder(separators=(",", ":")).encode
+        tmp_file = f"{output_file}.tmp"
+        try:
+            if compress:
+                json_file = gzip.open(tmp_file, "wt", encoding="utf-8")
+            else:
+                json_file = open(tmp_file, "w")
+            with json_file:
+                json_file.write("{")
+                for key_index, (key, value) in enumerate(data.items()):
+                    if key_index:
+                        json_file.write(",")
+                    json_file.write(f"{encode(str(key))}:")
+                    if isinstance(value, (str, bytes, dict)) or not isinstance(
+                        value, Iterable
+                    ):
+                        json_file.write(encode(value))
+                        continue
+                    json_file.write("[")
+                    for item_index, item in enumerate(value):
+                        if item_index:
+                            json_file.write(",")
+                        json_file.write(encode(item))
+                    json_file.write("]")
+                json_file.write("}")
+            os.replace(tmp_file, output_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        return output_file
+
+    def wait(self, output_file=None):
+        """
+        Waits until `output_file`, or every file when not given, has been
+        written in the background, raising the error of a failed write
+        """
+        with self._pending_lock:
+            if output_file is None:
+                pending = list(self._pending.items())
+            elif output_file in self._pending:
+                pending = [(output_file, self._pending[output_file])]
+            else:
+                pending = []
+        for path, future in pending:
+            try:
+                future.result()
+            finally:
+                with self._pending_lock:
+                    if self._pending.get(path) is future:
+                        del self._pending[path]
+
     def construct_file_path(
         self,
         file_path,
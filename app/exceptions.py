@@ -3,3 +3,11 @@ class DuplicateSourceError(Exception):
         self.loc = loc
         self.title = title
         super().__init__(f"Source already exists in queue: {title} ({loc})")
+
+
+class StageError(Exception):
+    def __init__(self, stage, item, error):
+        self.stage = stage
+        self.item = item
+        self.error = error
+        super().__init__(str(error))
@@ -164,12 +164,18 @@ class GitHubAPIHandler:
                 commit_files = []
                 for file_path in metadata_files:
                     if file_path:
-                        with open(file_path, 'r') as file:
-                            content = file.read()
-                        commit_files.append({
-                            'path': os.path.join(transcript.output_path_with_title, os.path.basename(file_path)),
-                            'content': content
-                        })
+                        commit_file = {
+                            'path': os.path.join(transcript.output_path_with_title, os.path.basename(file_path))
+                        }
+                        if file_path.endswith('.gz'):
+                            # binary files can only be added as base64 blobs
+                            with open(file_path, 'rb') as file:
+                                commit_file['content'] = base64.b64encode(file.read()).decode('utf-8')
+                            commit_file['encoding'] = 'base64'
+                        else:
+                            with open(file_path, 'r') as file:
+                                commit_file['content'] = file.read()
+                        commit_files.append(commit_file)
                 
                 if commit_files:
                     self.create_commit_with_multiple_files(
@@ -206,12 +212,19 @@ class GitHubAPIHandler:
         # Create a new tree with the new files
         new_tree = []
         for file in files:
-            new_tree.append({
+            entry = {
                 'path': file['path'],
                 'mode': '100644',
-                'type': 'blob',
-                'content': file['content']
-            })
+                'type': 'blob'
+            }
+            if file.get('encoding') == 'base64':
+                # the tree only takes text content, upload the blob first
+                blob_url = f"https://api.github.com/repos/{self.repos[repo_type]['owner']}/{self.repos[repo_type]['name']}/git/blobs"
+                blob_response = self._make_request('POST', blob_url, json={'content': file['content'], 'encoding': 'base64'})
+                entry['sha'] = blob_response.json()['sha']
+            else:
+                entry['content'] = file['content']
+            new_tree.append(entry)
 
         tree_data = {
             'base_tree': branch_sha,
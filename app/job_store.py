@@ -0,0 +1,161 @@
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from app.logging import get_logger
+
+logger = get_logger()
+
+# The stages a transcript goes through, in order. A job's stage is the last
+# stage that finished, so after a restart the work resumes from the next one.
+STAGES = ["queued", "downloaded", "converted", "transcribed", "exported", "pushed"]
+
+
+def stage_reached(current_stage, stage):
+    return STAGES.index(current_stage) >= STAGES.index(stage)
+
+
+class JobStore:
+    """
+    Persists the transcription queue in a local SQLite file.
+
+    The store keeps the configuration of the batch and, for every queued
+    transcript, its source metadata together with the stage it has reached
+    and the artifacts of the finished stages (downloaded media, converted
+    audio, transcription service output, exported files). When the server
+    restarts, the queue is restored from the store and each transcript
+    resumes from its last finished stage instead of downloading and
+    transcribing again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # a second server on the same store would resume or clear this queue
+        self._lock_file = open(f"{path}.lock", "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(
+                f"The job store {path} is in use by another process"
+            )
+        # files of the batch must survive a restart, so they live next to the store
+        self.working_dir = os.path.join(directory, "work")
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS batch ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "loc TEXT, "
+                "title TEXT, "
+                "source TEXT NOT NULL, "
+                "stage TEXT NOT NULL DEFAULT 'queued', "
+                "state TEXT NOT NULL DEFAULT '{}', "
+                "finished INTEGER NOT NULL DEFAULT 0, "
+                "updated_at TEXT NOT NULL)"
+            )
+
+    @staticmethod
+    def _now():
+        return datetime.now(timezone.utc).isoformat()
+
+    def _execute(self, query, parameters=()):
+        with self._lock, self._connection:
+            return self._connection.execute(query, parameters)
+
+    def _query(self, query, parameters=()):
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchall()
+
+    def save_config(self, config: dict):
+        """Save the arguments that the batch's `Transcription` was created with"""
+        self._execute(
+            "INSERT OR REPLACE INTO batch (key, value) VALUES ('config', ?)",
+            (json.dumps(config),),
+        )
+
+    def load_config(self):
+        rows = self._query("SELECT value FROM batch WHERE key = 'config'")
+        return json.loads(rows[0]["value"]) if rows else None
+
+    def set_status(self, status):
+        self._execute(
+            "INSERT OR REPLACE INTO batch (key, value) VALUES ('status', ?)",
+            (status,),
+        )
+
+    def get_status(self):
+        rows = self._query("SELECT value FROM batch WHERE key = 'status'")
+        return rows[0]["value"] if rows else None
+
+    def add_job(self, loc, title, source: dict, state: dict = None):
+        cursor = self._execute(
+            "INSERT INTO jobs (loc, title, source, state, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (loc, title, json.dumps(source), json.dumps(state or {}), self._now()),
+        )
+        return cursor.lastrowid
+
+    def checkpoint(self, job_id, stage=None, finished=False, **state):
+        """Record that a job finished `stage`, together with its artifacts"""
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT stage, state FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return
+            job_state = json.loads(row["state"])
+            job_state.update(state)
+            self._connection.execute(
+                "UPDATE jobs SET stage = ?, state = ?, finished = ?, "
+                "updated_at = ? WHERE id = ?",
+                (
+                    stage or row["stage"],
+                    json.dumps(job_state),
+                    int(finished),
+                    self._now(),
+                    job_id,
+                ),
+            )
+
+    def remove_job(self, job_id):
+        self._execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def pending_jobs(self):
+        """Jobs that have not finished yet, in the order they were queued"""
+        rows = self._query(
+            "SELECT * FROM jobs WHERE finished = 0 ORDER BY id"
+        )
+        return [
+            {
+                "id": row["id"],
+                "loc": row["loc"],
+                "title": row["title"],
+                "source": json.loads(row["source"]),
+                "stage": row["stage"],
+                "state": json.loads(row["state"]),
+            }
+            for row in rows
+        ]
+
+    def clear(self):
+        """Forget the batch, e.g. after it completed"""
+        self._execute("DELETE FROM jobs")
+        self._execute("DELETE FROM batch")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+        self._lock_file.close()
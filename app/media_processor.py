@@ -1,14 +1,16 @@
 import requests
-import librosa
-import soundfile as sf
 import os
 import ffmpeg
+import numpy as np
+import soundfile as sf
 import yt_dlp
 
 from app import (
     logging,
     utils
 )
+from app.types import MediaInfo
+from app.youtube_metadata import youtube_metadata
 
 logger = logging.get_logger()
 
@@ -40,39 +42,155 @@ class MediaProcessor:
                 logger.error(f"Error initializing FFMPEG: {e}")
                 raise Exception("Error initializing FFMPEG")
 
-    def split_audio(self, audio_path, output_dir=None, overlap=0):
+    def chunk_boundaries(self, duration, overlap=0):
+        """(start, end) of each chunk, in seconds. Consecutive chunks share
+        `overlap` seconds"""
+        if overlap >= self.chunk_length:
+            raise Exception(
+                f"Overlap ({overlap}s) must be shorter than the chunk length ({self.chunk_length}s)")
+        boundaries = []
+        chunk_start = 0
+        while chunk_start < duration:
+            chunk_end = min(chunk_start + self.chunk_length, duration)
+            boundaries.append((chunk_start, chunk_end))
+            if chunk_end == duration:
+                break
+            chunk_start = chunk_end - overlap  # Move start point back by overlap duration
+        return boundaries
+
+    def quiet_chunk_boundaries(self, audio_path, duration, overlap=0, search_window=30.0):
+        """(start, end) of each chunk, in seconds, like `chunk_boundaries`,
+        but each chunk ends at the quietest point of the last `search_window`
+        seconds before `chunk_length`, so that no word is cut in half"""
+        if overlap >= self.chunk_length:
+            raise Exception(
+                f"Overlap ({overlap}s) must be shorter than the chunk length ({self.chunk_length}s)")
+        boundaries = []
+        chunk_start = 0
+        while chunk_start < duration:
+            target = chunk_start + self.chunk_length
+            if target >= duration:
+                boundaries.append((chunk_start, duration))
+                break
+            earliest = max(target - search_window, chunk_start + overlap)
+            chunk_end = self.find_quiet_point(audio_path, earliest, target)
+            boundaries.append((chunk_start, chunk_end))
+            chunk_start = chunk_end - overlap
+        return boundaries
+
+    def find_quiet_point(self, audio_path, earliest, latest, window=0.05, min_silence=0.3):
+        """A point in the quietest `min_silence` seconds of the audio between
+        `earliest` and `latest`, or `latest` if the audio can't be read.
+        Of several equally quiet stretches, the middle of the last one"""
+        try:
+            energy = self.rms_energy(audio_path, earliest, latest - earliest, window)
+        except Exception as e:
+            logger.warning(f"Unable to find a quiet point in {audio_path}, cutting at {latest:.2f}s: {e}")
+            return latest
+        span = max(1, round(min_silence / window))
+        if len(energy) < span:
+            return latest
+        # mean energy of each `span` consecutive windows
+        cumulative = np.concatenate(([0.0], np.cumsum(energy, dtype=np.float64)))
+        loudness = cumulative[span:] - cumulative[:-span]
+        quietest = np.flatnonzero(np.isclose(loudness, loudness.min()))
+        breaks = np.flatnonzero(np.diff(quietest) > 1)
+        first = quietest[breaks[-1] + 1] if len(breaks) else quietest[0]
+        middle = (first + quietest[-1]) / 2
+        return round(min(earliest + (middle + span / 2) * window, latest), 3)
+
+    def rms_energy(self, audio_path, start, duration, window=0.05, sample_rate=8000):
+        """Root mean square of the samples of each `window` seconds of the
+        audio from `start`, decoded to mono at a low sample rate"""
+        try:
+            pcm, _ = (
+                ffmpeg
+                .input(audio_path, ss=start, t=duration)
+                .output("pipe:", format="s16le", acodec="pcm_s16le", ac=1, ar=sample_rate)
+                .run(capture_stdout=True, capture_stderr=True)
+            )
+        except ffmpeg.Error as e:
+            raise Exception(
+                f"Error decoding {audio_path}: {e.stderr.decode() if e.stderr else e}")
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+        size = max(1, int(sample_rate * window))
+        frames = samples[:len(samples) // size * size].reshape(-1, size)
+        return np.sqrt(np.mean(frames ** 2, axis=1))
+
+    def probe(self, media) -> MediaInfo:
+        """Duration, codec, sample rate and channel count of a media file or
+        URL, read from the container headers without decoding the audio.
+        Uses ffprobe, with soundfile as a fallback for local files"""
+        try:
+            self.initialize_ffmpeg()
+            info = ffmpeg.probe(media)
+            stream = next(
+                (s for s in info.get("streams", []) if s.get("codec_type") == "audio"), {})
+            duration = info["format"].get("duration") or stream.get("duration")
+            sample_rate = stream.get("sample_rate")
+            return {
+                "duration": float(duration),
+                "codec": stream.get("codec_name"),
+                "sample_rate": int(sample_rate) if sample_rate else None,
+                "channels": stream.get("channels"),
+            }
+        except Exception as e:
+            if not os.path.isfile(media):
+                raise Exception(f"Error probing {media}: {e}")
+            logger.debug(f"ffprobe failed for {media}, reading its headers with soundfile: {e}")
+        try:
+            info = sf.info(media)
+            return {
+                "duration": info.duration,
+                "codec": info.subtype.lower() if info.subtype else None,
+                "sample_rate": info.samplerate,
+                "channels": info.channels,
+            }
+        except Exception as e:
+            raise Exception(f"Error probing {media}: {e}")
+
+    def get_duration(self, media):
+        """Duration in seconds of a media file or URL"""
+        return self.probe(media)["duration"]
+
+    def split_audio(self, audio_path, output_dir=None, overlap=0, duration=None, boundaries=None):
+        """Split the audio file into chunks of `chunk_length` seconds, or at
+        the given (start, end) `boundaries`.
+        Chunks are cut by seeking and copying the audio stream, without
+        decoding and re-encoding the audio."""
         # Set default output directory if not provided
         if output_dir is None:
             output_dir = os.path.splitext(audio_path)[0] + "_chunks"
 
-        # Load the audio file
-        audio, sr = librosa.load(audio_path, sr=None)
-        duration = librosa.get_duration(y=audio, sr=sr)
-
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
+        if boundaries is None:
+            if duration is None:
+                duration = self.get_duration(audio_path)
+            boundaries = self.chunk_boundaries(duration, overlap)
+        # stream copy keeps the codec, so chunks keep the container as well
+        extension = os.path.splitext(audio_path)[1] or ".mp3"
+
         # Array to store paths of chunks
         chunk_paths = []
-
-        # Split the audio into chunks
-        chunk_start = 0
-        chunk_counter = 1
-
-        while chunk_start < duration:
-            chunk_end = min(chunk_start + self.chunk_length, duration)
-            chunk_audio = audio[int(chunk_start * sr):int(chunk_end * sr)]
-            chunk_path = os.path.join(output_dir, f"chunk_{chunk_counter}.mp3")
-            sf.write(chunk_path, chunk_audio, sr)
+        for chunk_counter, (chunk_start, chunk_end) in enumerate(boundaries, start=1):
+            chunk_path = os.path.join(
+                output_dir, f"chunk_{chunk_counter}{extension}")
+            try:
+                (
+                    ffmpeg
+                    .input(audio_path, ss=chunk_start, t=chunk_end - chunk_start)
+                    .output(chunk_path, acodec="copy", vn=None)
+                    .overwrite_output()
+                    .run(quiet=True)
+                )
+            except ffmpeg.Error as e:
+                raise Exception(
+                    f"Error splitting {audio_path} (chunk {chunk_counter}): {e.stderr.decode() if e.stderr else e}")
             logger.debug(
                 f"Saved chunk {chunk_counter} to {chunk_path} (start={chunk_start:.2f}s, end={chunk_end:.2f}s, duration={chunk_end - chunk_start:.2f}s)")
             chunk_paths.append(chunk_path)
-            chunk_counter += 1
-
-            if chunk_end == duration:
-                break
-
-            chunk_start = chunk_end - overlap  # Move start point back by overlap duration
 
         return chunk_paths
 
@@ -187,7 +305,18 @@ class MediaProcessor:
         try:
             logger.debug(f"Downloading video: {youtube_url}")
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info_dict = ydl.extract_info(youtube_url, download=True)
+                info_dict = None
+                if youtube_metadata.video_id(youtube_url) is not None:
+                    # reuse the metadata that was already extracted for this video
+                    try:
+                        info_dict = ydl.process_ie_result(
+                            youtube_metadata.extract_info(youtube_url), download=True)
+                    except Exception as e:
+                        logger.debug(
+                            f"Download with cached metadata failed, extracting again: {e}")
+                        youtube_metadata.invalidate(youtube_url)
+                if info_dict is None:
+                    info_dict = ydl.extract_info(youtube_url, download=True)
                 filename = ydl.prepare_filename(info_dict)
                 logger.info(f"Successfully downloaded {youtube_url} to {filename}")
                 return filename
@@ -0,0 +1,136 @@
+import queue
+import threading
+
+from app.exceptions import StageError
+from app.logging import get_logger
+
+logger = get_logger()
+
+# Marks the end of the work for a stage's worker
+_END = object()
+
+
+class Stage:
+    """A named step of the pipeline, executed by one or more workers"""
+
+    def __init__(self, name, func, workers=1):
+        if workers < 1:
+            raise Exception(f"Stage '{name}' needs at least one worker")
+        self.name = name
+        self.func = func
+        self.workers = workers
+
+    def __str__(self):
+        return f"Stage:{self.name}[workers={self.workers}]"
+
+
+class Pipeline:
+    """
+    Runs items through a sequence of stages, each stage in its own threads,
+    connected by bounded queues. While an item is in a later stage, the
+    earlier stages are already working on the next items, so a batch takes
+    about as long as its slowest stage instead of the sum of all stages.
+
+    The first failure stops the pipeline: items that are already queued are
+    drained without being processed and `run` raises a `StageError`.
+    """
+
+    def __init__(self, stages: list[Stage], queue_size=1):
+        if not stages:
+            raise Exception("A pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+        self._error: StageError | None = None
+        self._error_lock = threading.Lock()
+
+    def _fail(self, stage: Stage, item, e: Exception):
+        with self._error_lock:
+            if self._error is None:
+                self._error = StageError(stage.name, item, e)
+        self._stop.set()
+
+    def _feed(self, items, outbox: queue.Queue, workers):
+        try:
+            for item in items:
+                if self._stop.is_set():
+                    break
+                outbox.put(item)
+        finally:
+            for _ in range(workers):
+                outbox.put(_END)
+
+    def _work(self, stage: Stage, inbox: queue.Queue, outbox, state):
+        try:
+            while True:
+                item = inbox.get()
+                if item is _END:
+                    break
+                if self._stop.is_set():
+                    # drain the queue so that upstream stages never block
+                    continue
+                try:
+                    stage.func(item)
+                except Exception as e:
+                    logger.error(f"({stage.name}) {e}")
+                    self._fail(stage, item, e)
+                    continue
+                if outbox is not None:
+                    outbox.put(item)
+        finally:
+            with state["lock"]:
+                state["remaining"] -= 1
+                last_worker = state["remaining"] == 0
+            if last_worker and outbox is not None:
+                # let the workers of the next stage know that we are done
+                for _ in range(state["next_workers"]):
+                    outbox.put(_END)
+
+    def run(self, items):
+        self._stop.clear()
+        self._error = None
+        queues = [
+            queue.Queue(maxsize=self.queue_size) for _ in self.stages
+        ]
+        threads = [
+            threading.Thread(
+                target=self._feed,
+                args=(items, queues[0], self.stages[0].workers),
+                name="pipeline-feed",
+                daemon=True,
+            )
+        ]
+        for index, stage in enumerate(self.stages):
+            last_stage = index == len(self.stages) - 1
+            state = {
+                "lock": threading.Lock(),
+                "remaining": stage.workers,
+                "next_workers": 0
+                if last_stage
+                else self.stages[index + 1].workers,
+            }
+            for worker in range(stage.workers):
+                threads.append(
+                    threading.Thread(
+                        target=self._work,
+                        args=(
+                            stage,
+                            queues[index],
+                            None if last_stage else queues[index + 1],
+                            state,
+                        ),
+                        name=f"pipeline-{stage.name}-{worker}",
+                        daemon=True,
+                    )
+                )
+
+        logger.debug(
+            f"Starting pipeline: {' -> '.join(str(s) for s in self.stages)}"
+        )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,141 @@
+import threading
+from contextlib import contextmanager
+
+
+class LimiterSlot:
+    """A request admitted by an `AdaptiveLimiter`, to report its outcome"""
+
+    def __init__(self, epoch, saturated):
+        self.epoch = epoch  # the decreases of the limit before the request
+        self.saturated = saturated  # whether it used the last free slot
+        self.latency = None
+        self.throttled = False
+        self.cost = 1.0
+
+    def record(self, latency, throttled=False, cost=1.0):
+        """
+        Reports how long the request took, whether the service throttled
+        it (e.g. HTTP 429 or 5xx) and its size, in any unit that latency is
+        proportional to
+        """
+        self.latency = latency
+        self.throttled = throttled
+        self.cost = cost
+
+
+class AdaptiveLimiter:
+    """
+    Limits the requests in flight to a service, adjusting the limit with
+    additive-increase/multiplicative-decrease (AIMD).
+
+    A successful request that was sent with the limit fully used raises the
+    limit by `increase / limit`, about `increase` for each round of
+    requests. A throttled request multiplies the limit by `decrease`, and so
+    does a request that was sent with the limit fully used and was slower
+    than `latency_tolerance` times the usual latency (by unit of cost).
+    Requests sent before the limit was last lowered do not lower it again,
+    so a burst of throttled requests counts once.
+
+    The usual latency is a moving average, weighted by `smoothing`, of the
+    requests that did not slow down because of the load, so it follows the
+    service when it gets slower or faster on its own.
+    """
+
+    def __init__(
+        self,
+        initial_limit=4,
+        min_limit=1,
+        max_limit=10,
+        increase=1.0,
+        decrease=0.5,
+        latency_tolerance=2.0,
+        smoothing=0.1,
+    ):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise Exception(
+                f"Invalid concurrency limits: {min_limit} <= {initial_limit} <= {max_limit} does not hold"
+            )
+        if not 0 < decrease < 1:
+            raise Exception(f"Invalid decrease factor: {decrease}")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        # 0 disables the latency check
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self._limit = float(initial_limit)
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._epoch = 0
+        # the usual latency by unit of cost
+        self._baseline = None
+        self.stats = {"requests": 0, "throttled": 0, "slow": 0, "decreases": 0}
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @contextmanager
+    def slot(self):
+        """Waits for a free slot and yields a `LimiterSlot` to record the
+        outcome of the request on"""
+        with self._condition:
+            self._waiting += 1
+            try:
+                while self._in_flight >= self.limit:
+                    self._condition.wait()
+            finally:
+                self._waiting -= 1
+            self._in_flight += 1
+            slot = LimiterSlot(self._epoch, self._in_flight >= self.limit)
+        try:
+            yield slot
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                if slot.latency is not None:
+                    self._adjust(slot)
+                self._condition.notify_all()
+
+    def _adjust(self, slot: LimiterSlot):
+        self.stats["requests"] += 1
+        congested = slot.throttled
+        if congested:
+            self.stats["throttled"] += 1
+        else:
+            latency = slot.latency / max(slot.cost, 1e-9)
+            slow = (
+                self._baseline is not None
+                and self.latency_tolerance
+                and latency > self._baseline * self.latency_tolerance
+            )
+            if slow:
+                self.stats["slow"] += 1
+            # a slow request is only blamed on the load when it used the
+            # last free slot, it is the service that got slower otherwise
+            congested = slow and slot.saturated
+            if not congested:
+                if self._baseline is None:
+                    self._baseline = latency
+                else:
+                    self._baseline += self.smoothing * (latency - self._baseline)
+        if congested:
+            if slot.epoch == self._epoch:
+                self._limit = max(self.min_limit, self._limit * self.decrease)
+                self._epoch += 1
+                self.stats["decreases"] += 1
+        elif slot.saturated:
+            self._limit = min(self.max_limit, self._limit + self.increase / self._limit)
+
+    def metrics(self) -> dict:
+        """The current limit, the requests in flight and waiting for a slot,
+        and counters of the outcomes"""
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                **self.stats,
+            }
@@ -1,19 +1,21 @@
+import bisect
+import itertools
 import json
-import mimetypes
 import os
-import re
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import deepgram
-import librosa
 
 from app import (
     application,
     utils
 )
+from app.cache import ResultCache
 from app.config import settings
 from app.data_writer import DataWriter
 from app.logging import get_logger
 from app.media_processor import MediaProcessor
+from app.services.deepgram_client import DeepgramClient
 from app.transcript import Transcript
 from app.types import (
     Sentence,
@@ -23,54 +25,270 @@ from app.types import (
     SpeakerSegment,
     SpeakerSegmentWithSentences
 )
+from app.word_table import WordRange, WordTable
 
 logger = get_logger()
 
 
+class ChunkCombiner:
+    """
+    Combines the outputs of the chunks of a long audio into a single
+    Deepgram output, one chunk at a time.
+
+    Chunks must be added in order. Only the words of each chunk are kept,
+    along with the words in the overlap window of the last chunk and the
+    speaker mapping, so the rest of every chunk output can be released as
+    soon as it is added.
+
+    The (start, end) `boundaries` of the chunks in the audio are where the
+    chunks were actually cut. Without them, chunks are taken to be
+    `chunk_length` long and to overlap by `overlap` seconds.
+    """
+
+    def __init__(self, chunk_length, overlap, summarize, boundaries=None):
+        self.chunk_length = chunk_length
+        self.overlap = overlap
+        self.summarize = summarize
+        self.boundaries = boundaries
+        self.output = {
+            "results": {
+                "channels": [{
+                    "alternatives": [{
+                        "words": []
+                    }]
+                }]
+            },
+            "metadata": []
+        }
+        if self.summarize:
+            self.output["results"]["channels"][0]["alternatives"][0]["summaries"] = []
+        self.chunks = 0
+        self.speaker_mapping = {}
+        self.previous_words = []
+        self.total_offset = 0
+
+    @staticmethod
+    def match_overlap_speakers(previous_words, words, overlap, map_speaker):
+        """Remap the speaker of every word of the chunk once for each word of
+        the previous chunk that starts less than `overlap` seconds apart.
+
+        Words come sorted by start time, so the words matching a previous
+        word form a contiguous range that is found by binary search instead
+        of comparing every pair of words."""
+        starts = [word["start"] for word in words]
+        if any(later < earlier for earlier, later in zip(starts, starts[1:])):
+            # unsorted words, compare every pair
+            for prev_word in previous_words:
+                for curr_word in words:
+                    if abs(prev_word["start"] - curr_word["start"]) < overlap:
+                        curr_word["speaker"] = map_speaker(curr_word["speaker"])
+            return
+
+        def first_index(predicate):
+            # first word for which `predicate` holds, `predicate` being
+            # false up to some word and true from there on
+            low, high = 0, len(starts)
+            while low < high:
+                middle = (low + high) // 2
+                if predicate(starts[middle]):
+                    high = middle
+                else:
+                    low = middle + 1
+            return low
+
+        for prev_word in previous_words:
+            prev_start = prev_word["start"]
+            # same comparisons as `abs(prev_start - start) < overlap`
+            first = first_index(lambda start: prev_start - start < overlap)
+            last = first_index(lambda start: not prev_start - start > -overlap)
+            for curr_word in words[first:last]:
+                curr_word["speaker"] = map_speaker(curr_word["speaker"])
+
+    def boundary(self, chunk):
+        """(start, end) of the `chunk`-th chunk in the audio"""
+        if self.boundaries is not None:
+            if chunk >= len(self.boundaries):
+                return float('inf'), float('inf')
+            return tuple(self.boundaries[chunk])
+        start = chunk * (self.chunk_length - self.overlap)
+        return start, start + self.chunk_length
+
+    def map_speaker(self, speaker):
+        # speakers get a global id the first time they are seen
+        if speaker not in self.speaker_mapping:
+            self.speaker_mapping[speaker] = len(self.speaker_mapping)
+        return self.speaker_mapping[speaker]
+
+    def add(self, chunk_output):
+        alternative = chunk_output["results"]["channels"][0]["alternatives"][0]
+        words = alternative["words"]
+        combined = self.output["results"]["channels"][0]["alternatives"][0]
+
+        # Adjust word timestamps based on the total offset
+        self.total_offset = self.boundary(self.chunks)[0]
+        for word in words:
+            word["start"] += self.total_offset
+            word["end"] += self.total_offset
+
+        # Use overlap to match speakers between chunks
+        if self.previous_words:
+            self.match_overlap_speakers(
+                self.previous_words, words, self.overlap, self.map_speaker)
+
+        for word in words:
+            word["speaker"] = self.map_speaker(word["speaker"])
+
+        # Remove overlapping words from the current chunk's words list, the
+        # words that end before the previous chunk do
+        cutoff = self.boundary(self.chunks - 1)[1] if self.chunks else 0
+        combined["words"].extend(word for word in words if word["end"] >= cutoff)
+
+        self.output["metadata"].append(chunk_output.get("metadata", {}))
+        if self.summarize:
+            combined["summaries"].extend(alternative.get("summaries", []))
+
+        # Update the total offset for the next chunk
+        self.chunks += 1
+        self.total_offset = self.boundary(self.chunks)[0]
+
+        # Keep the last words of the current chunk within the overlap duration
+        self.previous_words = [
+            word for word in words if word["end"] > self.total_offset]
+
+
+class SentenceIndex:
+    """
+    The sentences of a transcript in order, indexed by start time.
+
+    Built once per transcript, so that chapters are resolved to sentences
+    by binary search instead of scanning every sentence for each chapter.
+    Sentences that are not sorted by start time are scanned in order.
+    """
+
+    def __init__(self, segments: list[SpeakerSegmentWithSentences]):
+        self.sentences: list[Sentence] = [
+            sentence for segment in segments for sentence in segment["sentences"]]
+        self.starts = [sentence["start"] for sentence in self.sentences]
+        self.is_sorted = all(
+            earlier <= later for earlier, later in zip(self.starts, self.starts[1:]))
+        # latest end among the sentences up to each position
+        self.max_ends = list(itertools.accumulate(
+            (sentence["end"] for sentence in self.sentences), max))
+
+    def find(self, timestamp) -> Sentence | None:
+        """The first sentence that contains `timestamp`"""
+        if not self.is_sorted:
+            for sentence in self.sentences:
+                if sentence["start"] <= timestamp <= sentence["end"]:
+                    return sentence
+            return None
+        # only the sentences that start before `timestamp` can contain it,
+        # the first of them to end after it is the one
+        candidates = bisect.bisect_right(self.starts, timestamp)
+        position = bisect.bisect_left(self.max_ends, timestamp, 0, candidates)
+        return self.sentences[position] if position < candidates else None
+
+    def place_chapters(self, chapters: list[list]) -> dict[int, list]:
+        """The position of the sentence that each chapter title goes before.
+
+        Chapters are placed in order, each before the first sentence that
+        starts at or after the chapter and comes after the previous chapter.
+        Chapters that start after the last sentence are left out."""
+        placements = {}
+        position = 0
+        for chapter in chapters or []:
+            chapter_start_time = chapter[1]
+            if self.is_sorted:
+                position = max(position, bisect.bisect_left(
+                    self.starts, chapter_start_time))
+            else:
+                while position < len(self.starts) and not chapter_start_time <= self.starts[position]:
+                    position += 1
+            if position >= len(self.sentences):
+                break
+            placements[position] = chapter
+            position += 1
+        return placements
+
+
 class Deepgram:
-    def __init__(self, summarize, diarize, upload, data_writer: DataWriter):
+    def __init__(self, summarize, diarize, upload, data_writer: DataWriter, result_cache: ResultCache = None):
         self.summarize = summarize
         self.diarize = diarize
         self.upload = upload
         self.data_writer = data_writer
         self.one_sentence_per_line = settings.config.getboolean('one_sentence_per_line', True)
         self.dpe_output = settings.config.getboolean('dpe_output', True)
+        self.dpe_compress = settings.config.getboolean('dpe_compress', False)
         self.dev_mode = False  # Extra capabilities during development mode
         self.max_audio_length = 3600.0  # 60 minutes in seconds
         self.processor = MediaProcessor(chunk_length=1200.0)
+        # How many chunks of a long audio are transcribed at the same time
+        self.chunk_workers = max(1, settings.config.getint('deepgram_chunk_workers', 4))
+        # Chunks end at the quietest point of the last seconds before
+        # `chunk_length` (0 cuts at `chunk_length`), and share a few seconds
+        # with the next chunk to match the speakers
+        self.chunk_search_window = settings.config.getfloat('deepgram_chunk_search_window', 30.0)
+        self.chunk_overlap = settings.config.getfloat('deepgram_chunk_overlap', 5.0)
         self.api_key = settings.DEEPGRAM_API_KEY
+        # keep-alive connections, shared by every transcript in the process
+        self.client = DeepgramClient.shared(self.api_key)
+        self.result_cache = result_cache
+        # Let Deepgram fetch publicly reachable remote audio by URL
+        self.remote_source = settings.config.getboolean('deepgram_remote_source', False)
+
+    def transcription_options(self):
+        return {
+            "punctuate": True,
+            "speaker_labels": True,
+            "diarize": self.diarize,
+            "smart_formatting": True,
+            "summarize": self.summarize,
+            "model": "whisper-large",
+            "language": settings.config.get('language', 'en'),
+        }
 
     def audio_to_text(self, audio_file, chunk=None):
-        language = settings.config.get('language','en')
+        options = self.transcription_options()
+        language = options["language"]
         logger.info(
             f"Transcribing audio {f'(chunk {chunk}) ' if chunk else ''}to text using deepgram[{language}]...")
         try:
-            dg_client = deepgram.Deepgram(self.api_key)
-
-            with open(audio_file, "rb") as audio:
-                mimeType = mimetypes.MimeTypes().guess_type(audio_file)[0]
-                source = {"buffer": audio, "mimetype": mimeType}
-                response = dg_client.transcription.sync_prerecorded(
-                    source,
-                    {
-                        "punctuate": True,
-                        "speaker_labels": True,
-                        "diarize": self.diarize,
-                        "smart_formatting": True,
-                        "summarize": self.summarize,
-                        "model": "whisper-large",
-                        "language": language,
-                    },
-                )
-                audio.close()
-            return response
+            return self.client.transcribe_file(audio_file, options)
+        except Exception as e:
+            raise Exception(f"(deepgram) Error transcribing audio to text: {e}")
+
+    def url_to_text(self, url):
+        options = self.transcription_options()
+        logger.info(
+            f"Transcribing remote audio to text using deepgram[{options['language']}]: {url}")
+        try:
+            return self.client.transcribe_url(url, options)
         except Exception as e:
             raise Exception(f"(deepgram) Error transcribing audio to text: {e}")
 
+    def can_fetch_remote(self, transcript: Transcript):
+        """Whether Deepgram can fetch the transcript's `remote_url` itself: it
+        must be publicly reachable and short enough to be transcribed in one
+        request. The probe of the media is kept by the transcript"""
+        url = transcript.remote_url
+        if not self.remote_source:
+            return False
+        if not self.processor.check_url(url):
+            logger.debug(f"(deepgram) Remote audio is not reachable: {url}")
+            return False
+        try:
+            duration = transcript.probe_audio()["duration"]
+        except Exception as e:
+            logger.debug(f"(deepgram) Unable to read the duration of {url}: {e}")
+            return False
+        return duration <= self.max_audio_length
+
     def write_to_json_file(self, transcription_service_output, transcript: Transcript):
         try:
+            # written in the background, the output is passed on in memory
             transcription_service_output_file = self.data_writer.write_json(
-                data=transcription_service_output, file_path=transcript.output_path_with_title, filename='deepgram')
+                data=transcription_service_output, file_path=transcript.output_path_with_title, filename='deepgram', background=True)
             logger.info(
                 f"(deepgram) Model output stored at: {transcription_service_output_file}")
 
@@ -92,11 +310,18 @@ class Deepgram:
                 f"(deepgram) Error writing JSON file for {transcript.title}: {e}")
             raise
 
-    def process_summary(self, transcript: Transcript):
-        if not transcript.outputs["transcription_service_output_file"]:
+    def load_transcription_service_output(self, transcript: Transcript):
+        output_file = transcript.outputs["transcription_service_output_file"]
+        if not output_file:
             raise Exception("No 'deepgram_output' found in JSON")
-        with open(transcript.outputs["transcription_service_output_file"], "r") as outfile:
-            transcription_service_output = json.load(outfile)
+        self.data_writer.wait(output_file)
+        with open(output_file, "r") as outfile:
+            return json.load(outfile)
+
+    def process_summary(self, transcript: Transcript, transcription_service_output=None):
+        if transcription_service_output is None:
+            transcription_service_output = self.load_transcription_service_output(
+                transcript)
 
         try:
             summaries = transcription_service_output["results"]["channels"][0]["alternatives"][0][
@@ -112,48 +337,76 @@ class Deepgram:
     def process_segments(self, transcription_service_output, diarization) -> list[SpeakerSegment]:
         try:
             words = transcription_service_output["results"]["channels"][0]["alternatives"][0]["words"]
-            segments = []
-            current_segment = None
-
-            for word in words:
-                speaker_id = word["speaker"] if diarization else "single_speaker"
-                speaker_text = word["punctuated_word"]
-                if speaker_id != current_segment:
-                    # change of speaker
-                    current_segment = speaker_id
-                    segments.append({
-                        "speaker": speaker_id,
-                        "start": word["start"],
-                        "end": word["end"],
-                        "transcript": "",
-                        "words": []
-                    })
-
-                segments[-1]["transcript"] += f"{speaker_text} "
-                segments[-1]["words"].append(word)
-                segments[-1]["end"] = word["end"]
+            # the words are stored once, segments and sentences are ranges of them
+            table = WordTable(words)
+            if diarization:
+                if not table.has_speakers():
+                    raise KeyError("speaker")
+                turns = table.speaker_turns()
+            else:
+                turns = [(0, len(table))] if len(table) else []
 
-            for segment in segments:
-                segment["transcript"] = segment["transcript"].strip()
+            segments = []
+            for first, last in turns:
+                segments.append({
+                    "speaker": int(table.speaker[first]) if diarization else "single_speaker",
+                    "start": float(table.start[first]),
+                    "end": float(table.end[last - 1]),
+                    "transcript": " ".join(table.texts(first, last)).strip(),
+                    "words": WordRange(table, first, last)
+                })
 
             return segments
         except Exception as e:
             raise Exception(
                 f"(deepgram) Error constructing speaker segments: {e}")
 
+    @staticmethod
+    def sentence_ranges(texts: list[str]) -> list[tuple[int, int]]:
+        """
+        Splits a list of punctuated words into sentences, returned as
+        (first, last) index ranges, `last` excluded.
+
+        A sentence ends with a word that ends in '.', '?', '…' or '-',
+        unless the text before it looks like an abbreviation: a capitalized
+        two letter word such as "Mr." or "Dr.", or letters separated by
+        dots such as "e.g." or "U.S.". Only the last few characters of the
+        text are looked at, the same as the look-behinds of a regular
+        expression over the joined words would.
+        """
+        def is_word_character(character):
+            return character.isalnum() or character == "_"
+
+        def tail_of(i):
+            # last characters of the words up to `i`, joined by spaces
+            tail = texts[i]
+            while len(tail) < 4 and i > 0:
+                i -= 1
+                tail = f'{texts[i]} {tail}'
+            return tail[-4:]
+
+        def is_abbreviation(tail):
+            # letters separated by dots, e.g. "e.g." or "U.S."
+            if len(tail) >= 4 and is_word_character(tail[-4]) and tail[-3] == "." and is_word_character(tail[-2]):
+                return True
+            # capitalized abbreviations, e.g. "Mr." or "Dr."
+            return len(tail) >= 3 and "A" <= tail[-3] <= "Z" and "a" <= tail[-2] <= "z" and tail[-1] == "."
+
+        ranges = []
+        first = 0
+        for i in range(len(texts) - 1):
+            text = texts[i]
+            if text and text[-1] in ".?…-" and not is_abbreviation(tail_of(i)):
+                ranges.append((first, i + 1))
+                first = i + 1
+        if texts:
+            ranges.append((first, len(texts)))
+        return ranges
+
     def break_segments_into_sentences(self, segments) -> list[SpeakerSegmentWithSentences]:
         result = []
-        # Define the sentence splitting pattern
-        abbreviation_pattern = r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)'
-        sentence_end_pattern = r'(?<=\.|\?|…|-)\s'
-        sentence_split_pattern = f'{abbreviation_pattern}{sentence_end_pattern}'
         try:
-
             for segment in segments:
-                # Split the segment into sentences
-                sentences = re.split(sentence_split_pattern,
-                                     segment["transcript"])
-
                 segment_data = {
                     "speaker": segment["speaker"],
                     "transcript": segment["transcript"],
@@ -162,18 +415,23 @@ class Deepgram:
                     "sentences": []
                 }
 
-                word_index = 0
-
-                for sentence in sentences:
-                    sentence_words = sentence.split()
+                words = segment["words"]
+                if isinstance(words, WordRange):
+                    # read the columns of the words, without building a dict per word
+                    texts = words.texts()
+                    starts = words.column("start")
+                    ends = words.column("end")
+                else:
+                    texts = [word["punctuated_word"] for word in words]
+                    starts = ends = None
+                for first, last in self.sentence_ranges(texts):
+                    sentence_words = words[first:last]
                     sentence_data = {
-                        "transcript": sentence,
-                        "start": segment["words"][word_index]["start"],
-                        "end": segment["words"][word_index + len(sentence_words) - 1]["end"],
-                        "words": segment["words"][word_index:word_index+len(sentence_words)]
+                        "transcript": " ".join(texts[first:last]),
+                        "start": starts[first] if starts is not None else sentence_words[0]["start"],
+                        "end": ends[last - 1] if ends is not None else sentence_words[-1]["end"],
+                        "words": sentence_words
                     }
-
-                    word_index += len(sentence_words)
                     segment_data["sentences"].append(sentence_data)
 
                 result.append(segment_data)
@@ -184,14 +442,10 @@ class Deepgram:
                 f"(deepgram) Error breaking segments into sentences: {e}")
             raise
 
-    def adjust_chapter_timestamps(self, speaker_segements_with_sentences, chapters):
+    def adjust_chapter_timestamps(self, speaker_segements_with_sentences, chapters, sentence_index: SentenceIndex = None):
         """Adjust the given chapter timestamps to prevent mid-sentence line break"""
-        def find_sentence_for_timestamp(speaker_segements_with_sentences, timestamp):
-            for speaker_data in speaker_segements_with_sentences:
-                for sentence_data in speaker_data["sentences"]:
-                    if sentence_data["start"] <= timestamp <= sentence_data["end"]:
-                        return sentence_data
-            return None
+        if sentence_index is None:
+            sentence_index = SentenceIndex(speaker_segements_with_sentences)
 
         def adjust_timestamp(original_timestamp, sentence_start, sentence_end):
             midpoint = (sentence_start + sentence_end) / 2
@@ -202,8 +456,7 @@ class Deepgram:
         try:
             for chapter in chapters:
                 chapter_start_time = chapter[1]
-                chapter_sentence = find_sentence_for_timestamp(
-                    speaker_segements_with_sentences, chapter_start_time)
+                chapter_sentence = sentence_index.find(chapter_start_time)
 
                 if chapter_sentence:
                     adjusted_start_time = adjust_timestamp(
@@ -274,11 +527,23 @@ class Deepgram:
             return band_aid_word
 
         try:
-            i = 0
-            while i < len(speaker_segments_with_sentences) - 1:
-                current_segment = speaker_segments_with_sentences[i]
-                next_segment = speaker_segments_with_sentences[i + 1]
-
+            def merge_same_speaker(merged_segments, segment):
+                """Appends the segment, merging it with the previous one if they have the same speaker"""
+                if merged_segments and merged_segments[-1]["speaker"] == segment["speaker"]:
+                    previous_segment = merged_segments[-1]
+                    previous_segment["transcript"] += " " + segment["transcript"]
+                    previous_segment["end"] = segment["end"]
+                    previous_segment["sentences"].extend(segment["sentences"])
+                else:
+                    merged_segments.append(segment)
+
+            # A single pass over the segments, comparing the current segment with
+            # the next one. Segments left without sentences are dropped, and the
+            # others are merged with the previous one when they have the same speaker.
+            result = []
+            segments = iter(speaker_segments_with_sentences)
+            current_segment = next(segments, None)
+            for next_segment in segments:
                 if current_segment["sentences"]:
                     last_sentence_current = current_segment["sentences"][-1]
                     first_sentence_next = next_segment["sentences"][0]
@@ -314,41 +579,54 @@ class Deepgram:
                         update_segment_attributes(current_segment)
                         update_segment_attributes(next_segment)
 
-                # Check if next_segment is empty and remove it if it is
-                if not next_segment["sentences"]:
-                    speaker_segments_with_sentences.pop(i + 1)
-                else:
-                    i += 1
-
-            # Remove any empty speaker segments from the list
-            speaker_segments_with_sentences = [
-                segment for segment in speaker_segments_with_sentences if segment["sentences"]]
-
-            # Merge consecutive segments with the same speaker
-            i = 0
-            while i < len(speaker_segments_with_sentences) - 1:
-                current_segment = speaker_segments_with_sentences[i]
-                next_segment = speaker_segments_with_sentences[i + 1]
-                if current_segment["speaker"] == next_segment["speaker"]:
-                    current_segment["transcript"] += " " + \
-                        next_segment["transcript"]
-                    current_segment["end"] = next_segment["end"]
-                    current_segment["sentences"].extend(
-                        next_segment["sentences"])
-                    speaker_segments_with_sentences.pop(i + 1)
-                else:
-                    i += 1
+                # An emptied next segment is skipped, the current segment
+                # is then compared with the one after it
+                if next_segment["sentences"]:
+                    if current_segment["sentences"]:
+                        merge_same_speaker(result, current_segment)
+                    current_segment = next_segment
 
-            return speaker_segments_with_sentences
+            if current_segment is not None and current_segment["sentences"]:
+                merge_same_speaker(result, current_segment)
+
+            return result
         except Exception as e:
             logger.error(f"(deepgram) Error fixing broken sentences: {e}")
             raise
 
-    def transform_to_digital_paper_edit_format(self, segments: list[SpeakerSegmentWithSentences], chapters: list[list]) -> DigitalPaperEditFormat:
-        words: list[DigitalPaperEditWord] = []
-        paragraphs: list[DigitalPaperEditParagraph] = []
+    def transform_to_digital_paper_edit_format(self, segments: list[SpeakerSegmentWithSentences], chapters: list[list], sentence_index: SentenceIndex = None) -> DigitalPaperEditFormat:
+        return DigitalPaperEditFormat(
+            words=list(self.iter_digital_paper_edit_words(segments)),
+            paragraphs=self.digital_paper_edit_paragraphs(segments, chapters, sentence_index))
 
+    def iter_digital_paper_edit_words(self, segments: list[SpeakerSegmentWithSentences]) -> Iterator[DigitalPaperEditWord]:
+        """The words of the DPE format, one at a time, so that they can be
+        written without holding all of them in memory"""
         word_id = 0  # Unique identifier for each word
+        for segment in segments:
+            for sentence in segment['sentences']:
+                sentence_words = sentence['words']
+                if isinstance(sentence_words, WordRange):
+                    # read the columns of the words, without building a dict per word
+                    word_values = zip(sentence_words.column('start'), sentence_words.column('end'), sentence_words.texts())
+                else:
+                    word_values = ((word['start'], word['end'], word['punctuated_word']) for word in sentence_words)
+                for word_start, word_end, word_text in word_values:
+                    yield DigitalPaperEditWord(
+                        id=word_id,
+                        start=word_start,
+                        end=word_end,
+                        text=word_text
+                    )
+                    word_id += 1
+
+    def digital_paper_edit_paragraphs(self, segments: list[SpeakerSegmentWithSentences], chapters: list[list], sentence_index: SentenceIndex = None) -> list[DigitalPaperEditParagraph]:
+        paragraphs: list[DigitalPaperEditParagraph] = []
+        if sentence_index is None:
+            sentence_index = SentenceIndex(segments)
+        chapter_placements = sentence_index.place_chapters(chapters)
+        position = 0  # Position of the sentence in the whole transcript
+
         chapter_index = 0 if chapters else None
         next_chapter_title = None
         next_chapter_start_time = float('inf')
@@ -362,17 +640,12 @@ class Deepgram:
             segment_speaker = f"Speaker {segment['speaker']}"
             sentences = segment['sentences']
 
-            current_sentence_index = 0
             paragraph_start = segment_start
             chapter_title = None
 
-            while current_sentence_index < len(sentences):
-                sentence = sentences[current_sentence_index]
-                sentence_start = sentence['start']
-                sentence_end = sentence['end']
-
+            for _ in sentences:
                 # Check if a new chapter starts before this sentence
-                if chapter_index is not None and next_chapter_start_time <= sentence_start:
+                if position in chapter_placements:
                     if paragraph_start < next_chapter_start_time:
                         # Prepare paragraph data
                         paragraph_data = {
@@ -400,17 +673,7 @@ class Deepgram:
                         next_chapter_title = None
                         next_chapter_start_time = float('inf')
 
-                for word in sentence['words']:
-                    digital_paper_edit_word = DigitalPaperEditWord(
-                        id=word_id,
-                        start=word['start'],
-                        end=word['end'],
-                        text=word['punctuated_word']
-                    )
-                    words.append(digital_paper_edit_word)
-                    word_id += 1
-
-                current_sentence_index += 1
+                position += 1
 
             # Add remaining part of the segment as a paragraph
             paragraphs.append(DigitalPaperEditParagraph(
@@ -421,9 +684,9 @@ class Deepgram:
                 chapter=chapter_title if paragraph_start < next_chapter_start_time else None
             ))
 
-        return DigitalPaperEditFormat(words=words, paragraphs=paragraphs)
+        return paragraphs
 
-    def construct_transcript(self, speaker_segments: list[SpeakerSegmentWithSentences], chapters):
+    def construct_transcript(self, speaker_segments: list[SpeakerSegmentWithSentences], chapters, sentence_index: SentenceIndex = None):
         def add_timestamp(speaker, timestamp):
             return f"Speaker {speaker}: {utils.decimal_to_sexagesimal(timestamp)}\n\n"
 
@@ -470,8 +733,12 @@ class Deepgram:
                 return " ".join(word["punctuated_word"] for word in sentence["words"])
 
         try:
-            final_transcript = ""
-            chapter_index = 0 if chapters else None
+            # pieces of the transcript, joined once at the end
+            final_transcript = []
+            if sentence_index is None:
+                sentence_index = SentenceIndex(speaker_segments)
+            chapter_placements = sentence_index.place_chapters(chapters)
+            position = 0  # Position of the sentence in the whole transcript
 
             for speaker_data in speaker_segments:
                 speaker_id = speaker_data["speaker"]
@@ -483,51 +750,50 @@ class Deepgram:
                     last_sentence = i == len(speaker_data["sentences"]) - 1
                     chapter_splits_segment = False
 
-                    if chapter_index is not None and chapter_index < len(chapters):
-                        chapter_id, chapter_start_time, chapter_title = chapters[chapter_index]
-
-                        if chapter_start_time <= sentence_start:
-                            # Chapter starts at this sentence
-                            # Add Chapter title
-                            if not first_sentence:
-                                final_transcript += "\n"
-                                if not self.one_sentence_per_line:
-                                    final_transcript += "\n"
-                            final_transcript += f"## {chapter_title}\n\n"
-                            # Add speaker timestamp for the rest of the speaker's
-                            # segment that comes after the chapter title
-                            if not single_speaker and not first_sentence:
-                                final_transcript += add_timestamp(
-                                    speaker_id, chapter_start_time)
-                                chapter_splits_segment = True
-                            chapter_index += 1
+                    if position in chapter_placements:
+                        chapter_id, chapter_start_time, chapter_title = chapter_placements[position]
+
+                        # Chapter starts at this sentence
+                        # Add Chapter title
+                        if not first_sentence:
+                            final_transcript.append("\n")
+                            if not self.one_sentence_per_line:
+                                final_transcript.append("\n")
+                        final_transcript.append(f"## {chapter_title}\n\n")
+                        # Add speaker timestamp for the rest of the speaker's
+                        # segment that comes after the chapter title
+                        if not single_speaker and not first_sentence:
+                            final_transcript.append(add_timestamp(
+                                speaker_id, chapter_start_time))
+                            chapter_splits_segment = True
+                    position += 1
 
                     if not single_speaker and first_sentence:
-                        final_transcript += add_timestamp(
-                            speaker_id, sentence_start)
+                        final_transcript.append(add_timestamp(
+                            speaker_id, sentence_start))
 
                     # Add the band-aid word if in dev mode
                     if self.dev_mode:
-                        final_transcript += f'{construct_sentence(sentence_data)}\n'
+                        final_transcript.append(f'{construct_sentence(sentence_data)}\n')
                     else:
                         if self.one_sentence_per_line:
-                            final_transcript += f'{sentence_data["transcript"]}\n'
+                            final_transcript.append(f'{sentence_data["transcript"]}\n')
                         else:
-                            final_transcript += f'{" " if not first_sentence and not chapter_splits_segment else ""}{sentence_data["transcript"]}'
-                            final_transcript += "\n" if last_sentence else ""
+                            final_transcript.append(f'{" " if not first_sentence and not chapter_splits_segment else ""}{sentence_data["transcript"]}')
+                            if last_sentence:
+                                final_transcript.append("\n")
 
-                final_transcript += "\n"
+                final_transcript.append("\n")
 
-            return final_transcript.strip()
+            return "".join(final_transcript).strip()
         except Exception as e:
             raise Exception(f"Error creating output format: {e}")
 
-    def finalize_transcript(self, transcript: Transcript) -> None:
+    def finalize_transcript(self, transcript: Transcript, transcription_service_output=None) -> None:
         try:
-            if not transcript.outputs["transcription_service_output_file"]:
-                raise Exception("No 'deepgram_output' found in JSON")
-            with open(transcript.outputs["transcription_service_output_file"], "r") as outfile:
-                transcription_service_output = json.load(outfile)
+            if transcription_service_output is None:
+                transcription_service_output = self.load_transcription_service_output(
+                    transcript)
 
             has_diarization = any(
                 'speaker' in word for word in transcription_service_output['results']['channels'][0]['alternatives'][0]['words'])
@@ -536,162 +802,144 @@ class Deepgram:
                 f"(deepgram) Finalizing transcript [diarization={has_diarization}, chapters={len(transcript.source.chapters)> 0}]...")
             speaker_segments = self.process_segments(
                 transcription_service_output, has_diarization)
+            # the segments keep the words in a table of their own, the
+            # output can be released if the caller does not hold it
+            del transcription_service_output
             speaker_segements_with_sentences = self.break_segments_into_sentences(
                 speaker_segments)
             speaker_segements_with_sentences = self.fix_broken_sentences(
                 speaker_segements_with_sentences)
+            # the sentences do not change anymore, index them once
+            sentence_index = SentenceIndex(speaker_segements_with_sentences)
             adjusted_chapters = self.adjust_chapter_timestamps(
-                speaker_segements_with_sentences, transcript.source.chapters)
+                speaker_segements_with_sentences, transcript.source.chapters, sentence_index)
             if self.dpe_output:
-                dpe_format = self.transform_to_digital_paper_edit_format(
-                    speaker_segements_with_sentences, adjusted_chapters)
-                transcript.outputs["dpe_file"] = self.data_writer.write_json(
-                    data=dpe_format, file_path=transcript.output_path_with_title, filename="dpe", include_timestamp=False)
+                # the words are streamed to the file instead of held in a list
+                dpe_format = {
+                    "words": self.iter_digital_paper_edit_words(speaker_segements_with_sentences),
+                    "paragraphs": self.digital_paper_edit_paragraphs(
+                        speaker_segements_with_sentences, adjusted_chapters, sentence_index)
+                }
+                transcript.outputs["dpe_file"] = self.data_writer.write_json_stream(
+                    data=dpe_format, file_path=transcript.output_path_with_title, filename="dpe", include_timestamp=False, compress=self.dpe_compress)
             
             transcript.outputs["raw"] = self.construct_transcript(
-                speaker_segements_with_sentences, adjusted_chapters)
+                speaker_segements_with_sentences, adjusted_chapters, sentence_index)
         except Exception as e:
             raise Exception(f"(deepgram) Error finalizing transcript: {e}")
 
-    def combine_chunk_outputs(self, all_chunks_output, overlap):
-        combined_output = {
-            "results": {
-                "channels": [{
-                    "alternatives": [{
-                        "words": []
-                    }]
-                }]
-            },
-            "metadata": []  # Initialize metadata as an empty array
-        }
-
-        # Add summaries field if self.summarize is True
-        if self.summarize:
-            combined_output["results"]["channels"][0]["alternatives"][0]["summaries"] = [
-            ]
-
-        global_speaker_mapping = {}
-        global_speaker_counter = 0
-        previous_words = []
-        total_offset = 0
-
-        for chunk_index, chunk_output in enumerate(all_chunks_output):
-            words = chunk_output["results"]["channels"][0]["alternatives"][0]["words"]
-            metadata = chunk_output.get("metadata", {})
-
-            # Adjust word timestamps based on the total offset
-            for word in words:
-                word["start"] += total_offset
-                word["end"] += total_offset
-
-            # Calculate chunk_end based on the last word's end time
-            chunk_end = words[-1]["end"] if words else 0
-
-            # Create a local to global speaker mapping for the current chunk
-            local_to_global_speaker_mapping = {}
-
-            # Use overlap to match speakers between chunks
-            if previous_words:
-                for prev_word in previous_words:
-                    for curr_word in words:
-                        if abs(prev_word["start"] - curr_word["start"]) < overlap:
-                            local_speaker = curr_word["speaker"]
-                            if local_speaker not in local_to_global_speaker_mapping:
-                                if local_speaker not in global_speaker_mapping:
-                                    global_speaker_mapping[local_speaker] = global_speaker_counter
-                                    global_speaker_counter += 1
-                                local_to_global_speaker_mapping[local_speaker] = global_speaker_mapping[local_speaker]
-                            curr_word["speaker"] = local_to_global_speaker_mapping[local_speaker]
-
-            for word in words:
-                local_speaker = word["speaker"]
-                if local_speaker not in local_to_global_speaker_mapping:
-                    if local_speaker not in global_speaker_mapping:
-                        global_speaker_mapping[local_speaker] = global_speaker_counter
-                        global_speaker_counter += 1
-                    local_to_global_speaker_mapping[local_speaker] = global_speaker_mapping[local_speaker]
-
-                global_speaker = local_to_global_speaker_mapping[local_speaker]
-                word["speaker"] = global_speaker
-
-            # Remove overlapping words from the current chunk's words list
-            non_overlap_words = [
-                word for word in words if word["end"] >= (total_offset + overlap if chunk_index != 0 else 0)]
-            combined_output["results"]["channels"][0]["alternatives"][0]["words"].extend(
-                non_overlap_words)
-
-            # Append the metadata of the current chunk
-            combined_output["metadata"].append(metadata)
-
-            if self.summarize:
-                summaries = chunk_output["results"]["channels"][0]["alternatives"][0].get(
-                    "summaries", [])
-                combined_output["results"]["channels"][0]["alternatives"][0]["summaries"].extend(
-                    summaries)
-
-            # Update the total offset for the next chunk
-            total_offset += self.processor.chunk_length - overlap
-
-            # Update previous_words to the last words of the current chunk within the overlap duration
-            previous_words = [
-                word for word in words if word["end"] > total_offset]
-
-        return combined_output
+    def combine_chunk_outputs(self, all_chunks_output, overlap, boundaries=None):
+        combiner = ChunkCombiner(
+            self.processor.chunk_length, overlap, self.summarize, boundaries)
+        for chunk_output in all_chunks_output:
+            combiner.add(chunk_output)
+        return combiner.output
 
     def transcribe_in_chunks(self, transcript: Transcript):
         # Split audio into chunks
-        overlap_between_chunks = 30.0
+        overlap_between_chunks = self.chunk_overlap
+        duration = transcript.probe_audio()["duration"]
+        if self.chunk_search_window > 0:
+            boundaries = self.processor.quiet_chunk_boundaries(
+                transcript.audio_file, duration, overlap_between_chunks, self.chunk_search_window)
+        else:
+            boundaries = self.processor.chunk_boundaries(
+                duration, overlap_between_chunks)
+        logger.info(
+            f"(deepgram) Splitting audio into {len(boundaries)} chunks at {', '.join(f'{end:.2f}s' for _, end in boundaries[:-1])}")
         chunk_files = self.processor.split_audio(
-            transcript.audio_file, overlap=overlap_between_chunks)
-        # TODO print information about the chunking
-        all_chunks_output = []
-        deepgram_chunks = []
-        for i, chunk_file in enumerate(chunk_files):
-            chunk_output = self.audio_to_text(chunk_file, i+1)
-            all_chunks_output.append(chunk_output)
-
-            # Write intermediate deepgram output to JSON file
-            filename = f"deepgram_chunk_{i + 1}_of_{len(chunk_files)}"
-            result = self.data_writer.write_json(
-                data=chunk_output, file_path=transcript.output_path_with_title, filename=filename)
-            deepgram_chunks.append(os.path.basename(result))
-
-        # Combine all chunk outputs into a single output
-        transcription_service_output = self.combine_chunk_outputs(
-            all_chunks_output, overlap=overlap_between_chunks)
+            transcript.audio_file, overlap=overlap_between_chunks, boundaries=boundaries)
+        # words are placed with the offsets the chunks were actually cut at
+        combiner = ChunkCombiner(
+            self.processor.chunk_length, overlap_between_chunks, self.summarize, boundaries)
+        # outputs of chunks that finished before the chunks preceding them
+        pending_outputs = {}
+        deepgram_chunks = [None] * len(chunk_files)
+        with ThreadPoolExecutor(max_workers=self.chunk_workers) as executor:
+            futures = {
+                executor.submit(self.audio_to_text, chunk_file, i + 1): i
+                for i, chunk_file in enumerate(chunk_files)
+            }
+            for future in as_completed(futures):
+                # the future holds the whole chunk output, don't keep it
+                i = futures.pop(future)
+                try:
+                    chunk_output = future.result()
+                except Exception:
+                    # no need to transcribe the remaining chunks
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                del future
+                # Write intermediate deepgram output to JSON file
+                filename = f"deepgram_chunk_{i + 1}_of_{len(chunk_files)}"
+                result = self.data_writer.write_json(
+                    data=chunk_output, file_path=transcript.output_path_with_title, filename=filename)
+                deepgram_chunks[i] = os.path.basename(result)
+
+                # Combine the chunks in order, as soon as they are available
+                pending_outputs[i] = chunk_output
+                del chunk_output
+                while combiner.chunks in pending_outputs:
+                    combiner.add(pending_outputs.pop(combiner.chunks))
+
+        transcription_service_output = combiner.output
 
         # Update transcript's metadata file with chunk filenames
         if transcript.metadata_file is not None:
             with open(transcript.metadata_file, 'r') as file:
                 data = json.load(file)
             data['deepgram_chunks'] = deepgram_chunks
+            data['deepgram_chunk_boundaries'] = boundaries
             with open(transcript.metadata_file, 'w') as file:
                 json.dump(data, file, indent=4)
 
         return transcription_service_output
 
+    def transcribe_audio(self, transcript: Transcript):
+        if transcript.remote_url is not None:
+            try:
+                return self.url_to_text(transcript.remote_url)
+            except Exception as e:
+                # e.g. the URL expired, or no longer serves the media to Deepgram
+                logger.warning(
+                    f"{e}. Downloading {transcript.remote_url} to upload it instead")
+                transcript.fetch_locally()
+        audio_duration = transcript.probe_audio()["duration"]
+        if audio_duration > self.max_audio_length:
+            logger.info(
+                f"Audio file is longer than {self.max_audio_length / 60} minutes. Splitting into {self.processor.chunk_length / 60} min chunks.")
+            return self.transcribe_in_chunks(transcript)
+        return self.audio_to_text(transcript.audio_file)
+
     def transcribe(self, transcript: Transcript) -> None:
         try:
-            audio_duration = librosa.get_duration(
-                path=transcript.audio_file)
-            transcription_service_output = {}
-
-            if audio_duration > self.max_audio_length:
+            cache_key = None
+            transcription_service_output = None
+            # remote audio is never downloaded, so it has no digest to be cached by
+            if self.result_cache is not None and transcript.remote_url is None:
+                cache_key = ResultCache.key_for(
+                    transcript.audio_file, "deepgram", self.transcription_options())
+                transcription_service_output = self.result_cache.get(cache_key)
+            if transcription_service_output is not None:
                 logger.info(
-                    f"Audio file is longer than {self.max_audio_length / 60} minutes. Splitting into {self.processor.chunk_length / 60} min chunks.")
-                transcription_service_output = self.transcribe_in_chunks(
-                    transcript)
+                    f"(deepgram) Using cached transcription for {transcript.title}")
             else:
-                transcription_service_output = self.audio_to_text(
-                    transcript.audio_file)
+                transcription_service_output = self.transcribe_audio(transcript)
+                if cache_key is not None:
+                    self.result_cache.put(
+                        cache_key, transcription_service_output)
 
             transcript.outputs["transcription_service_output_file"] = self.write_to_json_file(
                 transcription_service_output, transcript)
+            if self.summarize:
+                transcript.summary = self.process_summary(
+                    transcript, transcription_service_output)
+            self.finalize_transcript(transcript, transcription_service_output)
             if self.upload:
+                self.data_writer.wait(
+                    transcript.outputs["transcription_service_output_file"])
                 application.upload_file_to_s3(
                     transcript.outputs["transcription_service_output_file"])
-            if self.summarize:
-                transcript.summary = self.process_summary(transcript)
-            self.finalize_transcript(transcript)
         except Exception as e:
             raise Exception(f"(deepgram) Error while transcribing: {e}")
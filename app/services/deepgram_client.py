@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+
+import deepgram
+import httpx
+
+from app.config import settings
+from app.logging import get_logger
+from app.services.adaptive_limiter import AdaptiveLimiter
+
+logger = get_logger()
+
+DEEPGRAM_API_URL = "https://api.deepgram.com/v1"
+
+
+class PooledTransport(httpx.HTTPTransport):
+    """
+    An HTTP transport whose connection pool outlives the httpx clients it is
+    given to.
+
+    The SDK opens and closes an httpx client for every request, and closing
+    the client closes its transport. This transport stays open when a client
+    closes it, so that the requests share its keep-alive connections, until
+    `close_pool` is called.
+    """
+
+    def __exit__(self, *args):
+        pass
+
+    def close_pool(self):
+        super().close()
+
+
+class DeepgramClient:
+    """
+    A long-lived client for Deepgram's pre-recorded transcription API.
+
+    Requests are made with the official SDK, over a pool of keep-alive
+    connections that is shared by all the transcripts (and chunks)
+    transcribed in the process. The latency of every request is logged.
+
+    The requests in flight are limited by an `AdaptiveLimiter`, that backs
+    off when Deepgram throttles (HTTP 429 or 5xx) or slows down. Throttled
+    requests are retried up to `max_retries` times.
+    """
+
+    _shared: dict[str, "DeepgramClient"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        api_key,
+        api_url=DEEPGRAM_API_URL,
+        pool_size=10,
+        connect_timeout=10.0,
+        read_timeout=600.0,
+        limiter: AdaptiveLimiter = None,
+        max_retries=3,
+        retry_backoff=1.0,
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limiter = limiter or AdaptiveLimiter(
+            initial_limit=min(4, pool_size), max_limit=pool_size
+        )
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.transport = PooledTransport(
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            )
+        )
+        # the SDK adds the endpoint ("v1/listen") to the URL of the host
+        self._listen_client = deepgram.DeepgramClient(
+            api_key,
+            deepgram.DeepgramClientOptions(url=self.api_url.removesuffix("/v1")),
+        ).listen.rest.v("1")
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "total_latency": 0.0, "max_latency": 0.0}
+
+    @classmethod
+    def shared(cls, api_key):
+        """The process-wide client for `api_key`, configured from config.ini"""
+        with cls._shared_lock:
+            if api_key not in cls._shared:
+                pool_size = settings.config.getint("deepgram_pool_size", 10)
+                max_concurrency = min(
+                    pool_size,
+                    settings.config.getint("deepgram_max_concurrency", pool_size),
+                )
+                cls._shared[api_key] = cls(
+                    api_key,
+                    api_url=settings.config.get("deepgram_api_url", DEEPGRAM_API_URL),
+                    pool_size=pool_size,
+                    connect_timeout=settings.config.getfloat(
+                        "deepgram_connect_timeout", 10.0
+                    ),
+                    read_timeout=settings.config.getfloat(
+                        "deepgram_read_timeout", 600.0
+                    ),
+                    limiter=AdaptiveLimiter(
+                        initial_limit=min(
+                            max_concurrency,
+                            settings.config.getint("deepgram_initial_concurrency", 4),
+                        ),
+                        max_limit=max_concurrency,
+                        latency_tolerance=settings.config.getfloat(
+                            "deepgram_latency_tolerance", 2.0
+                        ),
+                    ),
+                    max_retries=settings.config.getint("deepgram_max_retries", 3),
+                )
+            return cls._shared[api_key]
+
+    @classmethod
+    def shared_metrics(cls) -> list[dict]:
+        """The metrics of the process-wide clients"""
+        with cls._shared_lock:
+            clients = list(cls._shared.values())
+        return [client.metrics() for client in clients]
+
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {**stats, "limiter": self.limiter.metrics()}
+
+    @staticmethod
+    def _status(error):
+        """HTTP status of a failed request, None if there was no response"""
+        try:
+            return int(getattr(error, "status", None))
+        except (TypeError, ValueError):
+            return None
+
+    def _listen(self, transcribe, source, options: dict, description, cost=1.0):
+        attempt = 0
+        while True:
+            status = 200
+            with self.limiter.slot() as slot:
+                if hasattr(source.get("buffer"), "seek"):
+                    # the file is sent again on retries
+                    source["buffer"].seek(0)
+                started = time.monotonic()
+                try:
+                    response = transcribe(
+                        source, options, timeout=self.timeout, transport=self.transport
+                    )
+                    error = None
+                except httpx.HTTPError as e:
+                    slot.record(time.monotonic() - started, throttled=True, cost=cost)
+                    raise Exception(f"DG: {e}")
+                except deepgram.DeepgramApiError as e:
+                    error = e
+                    status = self._status(e)
+                latency = time.monotonic() - started
+                throttled = status is not None and (status == 429 or status >= 500)
+                slot.record(latency, throttled=throttled, cost=cost)
+            with self._stats_lock:
+                self.stats["requests"] += 1
+                self.stats["total_latency"] += latency
+                self.stats["max_latency"] = max(self.stats["max_latency"], latency)
+            logger.debug(
+                f"(deepgram) {description}: HTTP {status} in {latency:.2f}s"
+                f" (concurrency limit {self.limiter.limit})"
+            )
+            if not throttled or attempt >= self.max_retries:
+                break
+            delay = min(self.retry_backoff * 2**attempt, 60.0)
+            attempt += 1
+            logger.info(
+                f"(deepgram) {description}: HTTP {status}, retrying in"
+                f" {delay:.1f}s ({attempt}/{self.max_retries})"
+            )
+            time.sleep(delay)
+        if error is not None:
+            raise Exception(f"DG: {status} {error.original_error or error}")
+        return response.to_dict()
+
+    def transcribe_file(self, file_path, options: dict):
+        # latency grows with the size of the audio, compared by MB
+        cost = max(os.path.getsize(file_path) / 2**20, 1.0)
+        with open(file_path, "rb") as audio:
+            return self._listen(
+                self._listen_client.transcribe_file,
+                {"buffer": audio},
+                options,
+                file_path,
+                cost,
+            )
+
+    def transcribe_url(self, url, options: dict):
+        """Let Deepgram fetch the media from `url` itself"""
+        return self._listen(
+            self._listen_client.transcribe_url, {"url": url}, options, url
+        )
+
+    def close(self):
+        self.transport.close_pool()
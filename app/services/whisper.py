@@ -1,10 +1,12 @@
 import json
 import os
+import threading
 
 from app import (
     application,
     utils
 )
+from app.cache import ResultCache
 from app.data_writer import DataWriter
 from app.logging import get_logger
 from app.transcript import Transcript
@@ -13,11 +15,16 @@ logger = get_logger()
 
 
 class Whisper:
-    def __init__(self, model, upload, data_writer: DataWriter):
+    def __init__(self, model, upload, data_writer: DataWriter, result_cache: ResultCache = None):
         self.model = model
         self.upload = upload
         self.data_writer = data_writer
+        self.result_cache = result_cache
         self._whisper = None
+        self._model = None
+        # transcripts are transcribed by concurrent pipeline workers, but the
+        # model is loaded once and can't run two transcriptions at a time
+        self._model_lock = threading.Lock()
 
     def _load_whisper(self):
         if self._whisper is None:
@@ -27,14 +34,21 @@ class Whisper:
             except ImportError:
                 raise Exception("Whisper is not installed. Install with 'pip install .[whisper]'")
 
+    def _load_model(self):
+        """The model of this service, loaded on first use. Must be called
+        with `_model_lock` held"""
+        if self._model is None:
+            self._model = self._whisper.load_model(self.model)
+        return self._model
+
     def audio_to_text(self, audio_file):
         logger.info(
             f"Transcribing audio to text using whisper ({self.model}) ...")
         self._load_whisper()
 
         try:
-            my_model = self._whisper.load_model(self.model)
-            result = my_model.transcribe(audio_file)
+            with self._model_lock:
+                result = self._load_model().transcribe(audio_file)
 
             return result
         except Exception as e:
@@ -43,8 +57,9 @@ class Whisper:
             return
 
     def write_to_json_file(self, transcription_service_output, transcript: Transcript):
+        # written in the background, the output is passed on in memory
         transcription_service_output_file = self.data_writer.write_json(
-            data=transcription_service_output, file_path=transcript.output_path_with_title, filename='whisper')
+            data=transcription_service_output, file_path=transcript.output_path_with_title, filename='whisper', background=True)
         logger.info(
             f"(whisper) Model output stored at: {transcription_service_output_file}")
 
@@ -86,7 +101,8 @@ class Whisper:
         try:
             chapters_pointer = 0
             transcript_pointer = 0
-            result = ""
+            # pieces of the transcript, joined once at the end
+            result = []
             segments = transcription_service_output["segments"]
             # chapters index, start time, name
 
@@ -97,30 +113,32 @@ class Whisper:
                     chapters[chapters_pointer][1]
                     <= segments[transcript_pointer]["start"]
                 ):
-                    result = (
-                        result + "\n\n## " +
-                        chapters[chapters_pointer][2] + "\n\n"
+                    result.append(
+                        "\n\n## " + chapters[chapters_pointer][2] + "\n\n"
                     )
                     chapters_pointer += 1
                 else:
-                    result = result + segments[transcript_pointer]["text"]
+                    result.append(segments[transcript_pointer]["text"])
                     transcript_pointer += 1
 
             while transcript_pointer < len(segments):
-                result = result + segments[transcript_pointer]["text"]
+                result.append(segments[transcript_pointer]["text"])
                 transcript_pointer += 1
 
-            return result
+            return "".join(result)
         except Exception as e:
             logger.error("Error combining chapters")
             logger.error(e)
 
-    def finalize_transcript(self, transcript: Transcript) -> None:
+    def finalize_transcript(self, transcript: Transcript, transcription_service_output=None) -> None:
         try:
-            if not transcript.outputs["transcription_service_output_file"]:
-                raise Exception("No 'whisper_output' found in JSON")
-            with open(transcript.outputs["transcription_service_output_file"], "r") as outfile:
-                transcription_service_output = json.load(outfile)
+            if transcription_service_output is None:
+                output_file = transcript.outputs["transcription_service_output_file"]
+                if not output_file:
+                    raise Exception("No 'whisper_output' found in JSON")
+                self.data_writer.wait(output_file)
+                with open(output_file, "r") as outfile:
+                    transcription_service_output = json.load(outfile)
 
             has_chapters = len(transcript.source.chapters) > 0
             if has_chapters:
@@ -133,14 +151,27 @@ class Whisper:
 
     def transcribe(self, transcript: Transcript) -> None:
         try:
-            transcription_service_output = self.audio_to_text(
-                transcript.audio_file)
+            cache_key = None
+            transcription_service_output = None
+            if self.result_cache is not None:
+                cache_key = ResultCache.key_for(
+                    transcript.audio_file, "whisper", {"model": self.model})
+                transcription_service_output = self.result_cache.get(cache_key)
+            if transcription_service_output is not None:
+                logger.info(
+                    f"(whisper) Using cached transcription for {transcript.title}")
+            else:
+                transcription_service_output = self.audio_to_text(
+                    transcript.audio_file)
+                if cache_key is not None and transcription_service_output is not None:
+                    self.result_cache.put(
+                        cache_key, transcription_service_output)
             transcript.outputs["transcription_service_output_file"] = self.write_to_json_file(
                 transcription_service_output, transcript)
             transcript.outputs["srt_file"] = self.generate_srt(
                 transcription_service_output, transcript)
             if self.upload:
                 application.upload_file_to_s3(transcript.outputs["srt_file"])
-            self.finalize_transcript(transcript)
+            self.finalize_transcript(transcript, transcription_service_output)
         except Exception as e:
             raise Exception(f"(whisper) Error while transcribing: {e}")
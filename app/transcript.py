@@ -1,9 +1,11 @@
 import logging
 import os
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import (
     datetime,
-    date
+    date,
+    timezone
 )
 from typing import (
     Optional,
@@ -22,7 +24,10 @@ from app import (
     logging,
     utils
 )
+from app.config import settings
 from app.media_processor import MediaProcessor
+from app.types import MediaInfo
+from app.youtube_metadata import youtube_metadata
 
 logger = logging.get_logger()
 
@@ -45,6 +50,15 @@ class Transcript:
         self.metadata_file = metadata_file
         self.test_mode = test_mode
         self.logger = logging.get_logger()
+        # Stage bookkeeping, also used to resume from a persisted job queue
+        self.job_id = None
+        self.stage = "queued"
+        self.tmp_dir = None
+        self.media_file = None
+        self.audio_file = None
+        self.media_key = None  # key of the converted audio in the media cache
+        self.remote_url = None  # set when the service fetches the audio itself
+        self.media_info: Optional[MediaInfo] = None
         self.outputs: Output = {
             "markdown": None,
             "json": None,
@@ -57,9 +71,37 @@ class Transcript:
 
     def process_source(self, tmp_dir=None):
         tmp_dir = tmp_dir if tmp_dir is not None else tempfile.mkdtemp()
-        self.audio_file = self.source.process(tmp_dir)
+        self.acquire_source(tmp_dir)
+        self.convert_source(tmp_dir)
         return self.audio_file, tmp_dir
 
+    def acquire_source(self, tmp_dir):
+        """Download the source's media (first half of `process_source`)"""
+        self.media_file = self.source.download(tmp_dir)
+        return self.media_file
+
+    def convert_source(self, tmp_dir):
+        """Convert the acquired media to audio that is ready for transcription"""
+        self.audio_file = self.source.convert(self.media_file, tmp_dir)
+        return self.audio_file
+
+    def fetch_locally(self):
+        """Download and convert the media that the transcription service
+        failed to fetch by URL itself"""
+        tmp_dir = self.tmp_dir if self.tmp_dir is not None else tempfile.mkdtemp()
+        self.remote_url = None
+        self.media_info = None  # probed from the remote URL
+        self.acquire_source(tmp_dir)
+        return self.convert_source(tmp_dir)
+
+    def probe_audio(self) -> MediaInfo:
+        """Duration, codec, sample rate and channels of the audio to
+        transcribe. Probed once, then reused by every stage"""
+        if self.media_info is None:
+            self.media_info = MediaProcessor().probe(
+                self.remote_url or self.audio_file)
+        return self.media_info
+
     @property
     def output_path_with_title(self):
         return self.source.output_path_with_title
@@ -218,6 +260,10 @@ class Audio(Source):
 
     def process(self, working_dir):
         """Process audio"""
+        return self.convert(self.download(working_dir), working_dir)
+
+    def download(self, working_dir):
+        """Download the audio file, or locate it when it is a local file"""
 
         def download_audio():
             """Helper method to download an audio file and return its absolute path"""
@@ -255,6 +301,14 @@ class Audio(Source):
             else:
                 # calculate the absolute path of the local audio file
                 audio_file_path = os.path.abspath(self.source_file)
+            return audio_file_path
+
+        except Exception as e:
+            raise Exception(f"Error processing audio file: {e}")
+
+    def convert(self, audio_file_path, working_dir):
+        """Convert the downloaded audio file to mp3 when needed"""
+        try:
             if not audio_file_path.endswith(".mp3"):
                 media_processor = MediaProcessor()
                 audio_file_path = media_processor.convert_to_mp3(
@@ -306,39 +360,39 @@ class Video(Source):
 
     def download_video_metadata(self):
         self.logger.debug(f"Downloading metadata from: {self.source_file}")
-        ydl_opts = {
-            'quiet': True,  # Suppress console output
-            'extract_flat': True,  # Extract only metadata without downloading
-        }
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                yt_info = ydl.extract_info(self.source_file, download=False)
-                if self.title is None:
-                    self.title = yt_info.get('title', 'N/A')
-                self.youtube_metadata = {
-                    "description": yt_info.get('description', 'N/A'),
-                    "tags": yt_info.get('tags', 'N/A'),
-                    "categories": yt_info.get('categories', 'N/A')
-                }
-                if self.event_date is None and yt_info.get('upload_date', None):
-                    self.event_date = datetime.strptime(
-                        yt_info.get('upload_date', None), "%Y%m%d").date()
-                # Extract chapters from video's metadata
-                self.chapters = []
-                has_chapters = yt_info.get('chapters', None)
-                if has_chapters:
-                    # YouTube adds an extra chapter when a starting chapter is not defined
-                    if yt_info["chapters"][0]["title"] == '<Untitled Chapter 1>':
-                        yt_info["chapters"].pop(0)
-                    for index, x in enumerate(yt_info["chapters"]):
-                        name = x["title"]
-                        start = x["start_time"]
-                        self.chapters.append([str(index), start, str(name)])
+            # the metadata is shared with source detection and download
+            yt_info = youtube_metadata.extract_info(self.source_file)
+            if self.title is None:
+                self.title = yt_info.get('title', 'N/A')
+            self.youtube_metadata = {
+                "description": yt_info.get('description', 'N/A'),
+                "tags": yt_info.get('tags', 'N/A'),
+                "categories": yt_info.get('categories', 'N/A')
+            }
+            if self.event_date is None and yt_info.get('upload_date', None):
+                self.event_date = datetime.strptime(
+                    yt_info.get('upload_date', None), "%Y%m%d").date()
+            # Extract chapters from video's metadata
+            self.chapters = []
+            has_chapters = yt_info.get('chapters', None)
+            if has_chapters:
+                # YouTube adds an extra chapter when a starting chapter is not defined
+                if yt_info["chapters"][0]["title"] == '<Untitled Chapter 1>':
+                    yt_info["chapters"].pop(0)
+                for index, x in enumerate(yt_info["chapters"]):
+                    name = x["title"]
+                    start = x["start_time"]
+                    self.chapters.append([str(index), start, str(name)])
         except yt_dlp.DownloadError as e:
             raise Exception(f"Error with downloading YouTube metadata: {e}")
 
     def process(self, working_dir):
         """Process video"""
+        return self.convert(self.download(working_dir), working_dir)
+
+    def download(self, working_dir):
+        """Download the video, or locate it when it is a local file"""
         try:
             self.logger.debug(f"Video processing: '{self.source_file}'")
             media_processor = MediaProcessor()
@@ -354,7 +408,15 @@ class Video(Source):
                 )
             else:
                 video_file_path = os.path.abspath(self.source_file)
+            return video_file_path
+
+        except Exception as e:
+            raise Exception(f"Error processing video file: {e}")
 
+    def convert(self, video_file_path, working_dir):
+        """Extract the audio of the downloaded video as mp3"""
+        try:
+            media_processor = MediaProcessor()
             audio_file = media_processor.convert_to_mp3(
                 video_file_path, working_dir)
             return audio_file
@@ -376,23 +438,90 @@ class Video(Source):
 
 
 class Playlist(Source):
-    def __init__(self, source, entries):
+    def __init__(self, source, entries, excluded_media=None, cutoff_date=None, newest_first=False):
         try:
             # initialize source using a base Source
             super().__init__(source_file=source.source_file, link=source.link, loc=source.loc, local=source.local, title=source.title, summary=source.summary,
                              episode=source.episode, date=source.event_date, tags=source.tags, category=source.category, speakers=source.speakers, preprocess=source.preprocess)
+            self.excluded_media = excluded_media if excluded_media is not None else {}
+            self.cutoff_date = cutoff_date
+            # only then can the entries after the cutoff date be skipped at once
+            self.newest_first = newest_first
             self.__config_source(entries)
         except Exception as e:
             raise Exception(f"Error during Playlist creation: {e}")
 
     def __config_source(self, entries):
         self.type = "playlist"
-        self.videos: Video = []
+        self.videos: list[Video] = []
+        self.failed_entries = []
+        # entries that were skipped without fetching their metadata
+        self.skipped_entries = []
+        entries = self.__candidate_entries(
+            entry for entry in entries if entry["title"] != '[Private video]')
+        # Each video requests its own metadata, resolve them concurrently
+        workers = max(1, settings.config.getint("playlist_metadata_workers", 4))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self.__create_video, entry) for entry in entries]
+            # collect the results in playlist order
+            for entry, future in zip(entries, futures):
+                try:
+                    self.videos.append(future.result())
+                except Exception as e:
+                    self.logger.warning(f"Skipping playlist entry '{entry['title']}': {e}")
+                    # URLs, like the added and skipped entries
+                    self.failed_entries.append(entry["url"])
+
+    @staticmethod
+    def is_newest_first(info_dict):
+        """Whether yt-dlp's flat playlist data lists the uploads of a
+        channel, that are sorted from the newest to the oldest. Curated
+        playlists can be in any order"""
+        playlist_id = info_dict.get("id") or ""
+        url = (info_dict.get("webpage_url") or "").rstrip("/")
+        # "UU..." is the playlist of a channel's uploads
+        return playlist_id.startswith("UU") or url.endswith(("/videos", "/streams"))
+
+    def __entry_date(self, entry):
+        """The date the entry's video will have, when it is known before
+        fetching the video's metadata"""
+        if self.date is not None:
+            # the playlist's date is given to all of its videos
+            return self.date
+        if entry.get("upload_date"):
+            return datetime.strptime(entry["upload_date"], "%Y%m%d").date()
+        if entry.get("timestamp"):
+            return datetime.fromtimestamp(entry["timestamp"], timezone.utc).date()
+        return None
+
+    def __candidate_entries(self, entries):
+        """Filter out the entries that are excluded or published before the
+        cutoff date, using the flat playlist data, so that metadata is only
+        fetched for entries that could still be transcribed"""
+        candidates = []
         for entry in entries:
-            if entry["title"] != '[Private video]':
-                source = Video(source=Source(source_file=entry["url"], loc=self.loc, local=self.local, title=entry["title"], date=self.event_date,
-                                             tags=self.tags, category=self.category, speakers=self.speakers, preprocess=self.preprocess))
-                self.videos.append(source)
+            if entry["url"] in self.excluded_media:
+                self.skipped_entries.append(entry["url"])
+                continue
+            entry_date = self.__entry_date(entry)
+            if self.cutoff_date is None or entry_date is None:
+                candidates.append(entry)
+                continue
+            if entry_date > self.cutoff_date:
+                candidates.append(entry)
+                continue
+            self.skipped_entries.append(entry["url"])
+            if self.newest_first:
+                # every remaining entry is older than this one
+                self.logger.debug(
+                    f"{self.title}: reached the cutoff date, skipping the remaining entries")
+                self.skipped_entries.extend(entry["url"] for entry in entries)
+                break
+        return candidates
+
+    def __create_video(self, entry):
+        return Video(source=Source(source_file=entry["url"], loc=self.loc, local=self.local, title=entry["title"], date=self.event_date,
+                                   tags=self.tags, category=self.category, speakers=self.speakers, preprocess=self.preprocess))
 
 
 class RSS(Source):
@@ -0,0 +1,83 @@
+import threading
+
+from app.transcript import Transcript
+
+
+class TranscriptQueue:
+    """
+    The transcription queue.
+
+    Behaves like the list of queued transcripts (iteration, `len`,
+    `append`, `remove`) but also keeps indexes on (loc, title) and on the
+    media URL, so that finding duplicates and removing sources take constant
+    time even for very large batches. Look transcripts up with `find` rather
+    than by position.
+
+    The queue is shared with the pipeline threads, so every access holds a
+    lock and iteration walks a snapshot taken under it.
+    """
+
+    def __init__(self, transcripts: list[Transcript] = None):
+        # insertion-ordered, keyed by the identity of the transcript
+        self._transcripts: dict[int, Transcript] = {}
+        self._by_location: dict[tuple, dict[int, Transcript]] = {}
+        self._by_media: dict[str, dict[int, Transcript]] = {}
+        self._lock = threading.Lock()
+        for transcript in transcripts or []:
+            self.append(transcript)
+
+    @staticmethod
+    def _index_add(index, key, transcript):
+        index.setdefault(key, {})[id(transcript)] = transcript
+
+    @staticmethod
+    def _index_remove(index, key, transcript):
+        entries = index.get(key)
+        if entries is None:
+            return
+        entries.pop(id(transcript), None)
+        if not entries:
+            del index[key]
+
+    def append(self, transcript: Transcript):
+        source = transcript.source
+        with self._lock:
+            self._transcripts[id(transcript)] = transcript
+            self._index_add(
+                self._by_location, (source.loc, source.title), transcript)
+            self._index_add(self._by_media, source.media, transcript)
+
+    def remove(self, transcript: Transcript):
+        source = transcript.source
+        with self._lock:
+            if self._transcripts.pop(id(transcript), None) is None:
+                raise ValueError(
+                    f"Transcript not in queue: {transcript.title}")
+            self._index_remove(
+                self._by_location, (source.loc, source.title), transcript)
+            self._index_remove(self._by_media, source.media, transcript)
+
+    def find(self, loc, title) -> Transcript | None:
+        """The first queued transcript with the given location and title"""
+        # sources store their location without surrounding slashes
+        with self._lock:
+            entries = self._by_location.get((loc.strip("/"), title))
+            return next(iter(entries.values())) if entries else None
+
+    def has_media(self, media) -> bool:
+        with self._lock:
+            return media in self._by_media
+
+    def __iter__(self):
+        # iterate over a snapshot, so the queue can change meanwhile
+        with self._lock:
+            snapshot = list(self._transcripts.values())
+        return iter(snapshot)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._transcripts)
+
+    def __contains__(self, transcript):
+        with self._lock:
+            return id(transcript) in self._transcripts
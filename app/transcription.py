@@ -4,16 +4,21 @@ import tempfile
 import yt_dlp
 
 from app.config import settings
-from app.exceptions import DuplicateSourceError
+from app.exceptions import DuplicateSourceError, StageError
 
 # from app.metadata_parser import MetadataParser
 from app.transcript import Transcript, Source, Audio, Video, Playlist, RSS
+from app.transcript_queue import TranscriptQueue
 from app import __app_name__, __version__, application, services, utils
 from app.logging import get_logger
 from app.data_writer import DataWriter
 from app.data_fetcher import DataFetcher
 from app.github_api_handler import GitHubAPIHandler
+from app.job_store import JobStore, STAGES, stage_reached
 from app.exporters import ExporterFactory, TranscriptExporter
+from app.pipeline import Pipeline, Stage
+from app.youtube_metadata import youtube_metadata as youtube_metadata_cache
+from app.cache import MediaCache, ResultCache
 
 
 class Transcription:
@@ -36,11 +41,18 @@ class Transcription:
         batch_preprocessing_output=False,
         needs_review=False,
         include_metadata=True,
+        max_concurrent_transcripts=None,
+        job_store: JobStore = None,
     ):
         self.nocleanup = nocleanup
         self.status = "idle"  # Can be "idle", "in_progress", or "completed"
         self.test_mode = test_mode
         self.logger = get_logger()
+        self.job_store = job_store
+        if working_dir is None and self.job_store is not None:
+            # downloads and conversions need to survive a restart
+            working_dir = self.job_store.working_dir
+            os.makedirs(working_dir, exist_ok=True)
         self.tmp_dir = (
             working_dir if working_dir is not None else tempfile.mkdtemp()
         )
@@ -76,14 +88,26 @@ class Transcription:
 
         # @TODO: use ExporterFactory instead of `metadata_writer` for
         #        services metadata output
+        result_cache = (
+            None
+            if test_mode
+            else ResultCache.from_settings()
+        )
         if deepgram:
             self.service = services.Deepgram(
-                summarize, diarize, upload, self.metadata_writer
+                summarize, diarize, upload, self.metadata_writer, result_cache
             )
         else:
-            self.service = services.Whisper(model, upload, self.metadata_writer)
+            self.service = services.Whisper(
+                model, upload, self.metadata_writer, result_cache
+            )
+
+        self.max_concurrent_transcripts = self.__configure_concurrency(
+            max_concurrent_transcripts
+        )
+        self.media_cache = None if test_mode else MediaCache.from_settings()
 
-        self.transcripts: list[Transcript] = []
+        self.transcripts = TranscriptQueue()
         self.existing_media = None
         self.preprocessing_output = [] if batch_preprocessing_output else None
         self.data_fetcher = DataFetcher(settings.BTC_TRANSCRIPTS_URL)
@@ -91,10 +115,10 @@ class Transcription:
         self.logger.debug(f"Temp directory: {self.tmp_dir}")
 
     def _create_subdirectory(self, subdir_name):
-        """Helper method to create subdirectories within the central temp director"""
-        subdir_path = os.path.join(self.tmp_dir, subdir_name)
-        os.makedirs(subdir_path)
-        return subdir_path
+        """Helper method to create subdirectories within the central temp director.
+        The directory is unique, as the central directory may be the job
+        store's, that keeps the directories of earlier batches"""
+        return tempfile.mkdtemp(prefix=f"{subdir_name}-", dir=self.tmp_dir)
 
     def __configure_tstbtc_metadata_dir(self):
         metadata_dir = settings.TSTBTC_METADATA_DIR
@@ -118,6 +142,31 @@ class Transcription:
         else:
             return ""
 
+    def __configure_concurrency(self, max_concurrent_transcripts):
+        if max_concurrent_transcripts is None:
+            max_concurrent_transcripts = settings.config.getint(
+                "max_concurrent_transcripts", 1
+            )
+        if max_concurrent_transcripts < 1:
+            raise Exception("`max_concurrent_transcripts` must be at least 1")
+        return max_concurrent_transcripts
+
+    def set_max_concurrent_transcripts(self, max_concurrent_transcripts):
+        """Change how many transcripts are processed at once. The pipeline
+        is built when the batch starts, so a batch that is already running
+        keeps its limit and the new one applies from the next `start`"""
+        self.max_concurrent_transcripts = self.__configure_concurrency(
+            max_concurrent_transcripts
+        )
+
+    def _stage_workers(self, setting):
+        """Number of workers for a pipeline stage. Each stage can have its own
+        limit in config.ini, but never more than `max_concurrent_transcripts`"""
+        workers = settings.config.getint(
+            setting, self.max_concurrent_transcripts
+        )
+        return max(1, min(workers, self.max_concurrent_transcripts))
+
     def __configure_username(self, username: str | None):
         if self.test_mode:
             return "username"
@@ -128,7 +177,14 @@ class Transcription:
                 "You need to provide a username for transcription attribution"
             )
 
-    def _initialize_source(self, source: Source, youtube_metadata, chapters):
+    def _initialize_source(
+        self,
+        source: Source,
+        youtube_metadata,
+        chapters,
+        excluded_media=None,
+        cutoff_date=None,
+    ):
         """Initialize transcription source based on metadata
         Returns the initialized source (Audio, Video, Playlist)"""
 
@@ -137,6 +193,10 @@ class Transcription:
             a YouTube playlist or YouTube video by requesting its metadata
             Does not support video-ids, only urls"""
             try:
+                if youtube_metadata_cache.video_id(source.source_file) is not None:
+                    # Single video URL, the metadata is cached for `Video`
+                    youtube_metadata_cache.extract_info(source.source_file)
+                    return Video(source=source)
                 ydl_opts = {
                     "quiet": False,  # Suppress console output
                     "extract_flat": True,  # Extract only metadata without downloading
@@ -149,7 +209,11 @@ class Transcription:
                         # Playlist URL, not a single video
                         # source.title = info_dict["title"]
                         return Playlist(
-                            source=source, entries=info_dict["entries"]
+                            source=source,
+                            entries=info_dict["entries"],
+                            excluded_media=excluded_media,
+                            cutoff_date=cutoff_date,
+                            newest_first=Playlist.is_newest_first(info_dict),
                         )
                     elif "title" in info_dict:
                         # Single video URL
@@ -204,12 +268,72 @@ class Transcription:
                 # Keep preprocessing outputs for later use
                 self.preprocessing_output.append(source.to_json())
         # Initialize new transcript from source
-        self.transcripts.append(
-            Transcript(
+        transcript = Transcript(
+            source=source,
+            test_mode=self.test_mode,
+            metadata_file=metadata_file,
+        )
+        if self.job_store is not None:
+            transcript.job_id = self.job_store.add_job(
+                loc=source.loc,
+                title=source.title,
+                source=source.to_json(),
+                state={"metadata_file": metadata_file},
+            )
+        self.transcripts.append(transcript)
+
+    def restore_queue(self):
+        """Rebuild the transcription queue from the job store, e.g. after
+        a restart. Transcripts keep the stage they had reached, so that
+        `start` resumes them from their last finished stage."""
+        if self.job_store is None:
+            return []
+        restored = []
+        for job in self.job_store.pending_jobs():
+            metadata = utils.configure_metadata_given_from_JSON(job["source"])
+            source = self._initialize_source(
+                source=Source(
+                    source_file=metadata["source_file"],
+                    loc=metadata["loc"],
+                    local=os.path.isfile(metadata["source_file"]),
+                    title=metadata["title"],
+                    date=metadata["date"],
+                    summary=metadata["summary"],
+                    episode=metadata["episode"],
+                    tags=metadata["tags"],
+                    category=metadata["category"],
+                    speakers=metadata["speakers"],
+                    preprocess=False,
+                    link=metadata["media"],
+                ),
+                youtube_metadata=metadata["youtube_metadata"],
+                chapters=metadata["chapters"],
+            )
+            source.additional_resources = metadata["additional_resources"] or []
+            state = job["state"]
+            transcript = Transcript(
                 source=source,
                 test_mode=self.test_mode,
-                metadata_file=metadata_file,
+                metadata_file=state.get("metadata_file"),
+            )
+            transcript.job_id = job["id"]
+            transcript.stage = job["stage"]
+            transcript.tmp_dir = state.get("tmp_dir")
+            transcript.media_file = state.get("media_file")
+            transcript.audio_file = state.get("audio_file")
+            transcript.remote_url = state.get("remote_url")
+            transcript.outputs.update(state.get("outputs", {}))
+            self.transcripts.append(transcript)
+            restored.append(transcript)
+            self.logger.info(
+                f"Restored source from job store: {transcript.title} [{transcript.stage}]"
             )
+        return restored
+
+    def _is_new_media(self, media, excluded_media):
+        """Whether the media is neither excluded nor already queued"""
+        return media not in excluded_media and not self.transcripts.has_media(
+            media
         )
 
     def add_transcription_source(
@@ -236,13 +360,13 @@ class Transcription:
         """Add a source for transcription"""
         if cutoff_date:
             cutoff_date = utils.validate_and_parse_date(cutoff_date)
-            # Even with a cutoff date, for YouTube playlists we still need to download the metadata
-            # for each video in order to obtain the `upload_date` and use it for filtering
+            # For YouTube playlists, entries are filtered using the flat playlist data when it
+            # includes their `upload_date`, otherwise their metadata is needed for filtering
             self.logger.debug(
                 f"A cutoff date of '{cutoff_date}' is given. Processing sources published after this date."
             )
         preprocess = False if self.test_mode else preprocess
-        transcription_sources = {"added": [], "exist": []}
+        transcription_sources = {"added": [], "exist": [], "failed": []}
         # check if source is a local file
         local = False
         if os.path.isfile(source_file):
@@ -280,24 +404,26 @@ class Transcription:
             ),
             youtube_metadata=youtube_metadata,
             chapters=chapters,
+            excluded_media=excluded_media,
+            cutoff_date=cutoff_date,
         )
         source.additional_resources = additional_resources
         self.logger.debug(f"Detected source: {source}")
 
         # Check if source is already in the transcription queue
-        for transcript in self.transcripts:
-            if (
-                transcript.source.loc == loc
-                and transcript.source.title == title
-            ):
-                self.logger.warning(f"Source already exists in queue: {title}")
-                raise DuplicateSourceError(loc, title)
+        if self.transcripts.find(loc, title) is not None:
+            self.logger.warning(f"Source already exists in queue: {title}")
+            raise DuplicateSourceError(loc, title)
 
         if source.type == "playlist":
+            # entries filtered out before their metadata was fetched
+            transcription_sources["exist"].extend(source.skipped_entries)
+            # entries whose metadata could not be resolved
+            transcription_sources["failed"].extend(source.failed_entries)
             # add a transcript for each source/video in the playlist
             for video in source.videos:
                 is_eligible = video.date > cutoff_date if cutoff_date else True
-                if video.media not in excluded_media and is_eligible:
+                if self._is_new_media(video.media, excluded_media) and is_eligible:
                     transcription_sources["added"].append(video.source_file)
                     self._new_transcript_from_source(video)
                 else:
@@ -306,13 +432,18 @@ class Transcription:
             # add a transcript for each source/audio in the rss feed
             for entry in source.entries:
                 is_eligible = entry.date > cutoff_date if cutoff_date else True
-                if entry.media not in excluded_media and is_eligible:
+                if self._is_new_media(entry.media, excluded_media) and is_eligible:
                     transcription_sources["added"].append(entry.source_file)
                     self._new_transcript_from_source(entry)
                 else:
                     transcription_sources["exist"].append(entry.source_file)
         elif source.type in ["audio", "video"]:
-            if source.media not in excluded_media:
+            if self.transcripts.has_media(source.media):
+                transcription_sources["exist"].append(source.source_file)
+                self.logger.info(
+                    f"Source media already exists in queue: {source.title}"
+                )
+            elif source.media not in excluded_media:
                 transcription_sources["added"].append(source.source_file)
                 self._new_transcript_from_source(source)
                 self.logger.info(
@@ -327,7 +458,7 @@ class Transcription:
             raise Exception(f"Invalid source: {source_file}")
         if source.type in ["playlist", "rss"]:
             self.logger.info(
-                f"{source.title}: sources added for transcription: {len(transcription_sources['added'])} (Ignored: {len(transcription_sources['exist'])} sources)"
+                f"{source.title}: sources added for transcription: {len(transcription_sources['added'])} (Ignored: {len(transcription_sources['exist'])} sources, Failed: {len(transcription_sources['failed'])} sources)"
             )
         return transcription_sources
 
@@ -381,56 +512,239 @@ class Transcription:
             loc = metadata["loc"]
             title = metadata["title"]
 
-            for transcript in self.transcripts:
-                if (
-                    transcript.source.loc == loc
-                    and transcript.source.title == title
-                ):
-                    self.transcripts.remove(transcript)
-                    removed_sources.append(transcript)
-                    self.logger.info(f"Removed source from queue: {title}")
-                    break
+            transcript = self.transcripts.find(loc, title)
+            if transcript is not None:
+                self.transcripts.remove(transcript)
+                if self.job_store is not None:
+                    self.job_store.remove_job(transcript.job_id)
+                removed_sources.append(transcript)
+                self.logger.info(f"Removed source from queue: {title}")
             else:
                 self.logger.warning(f"Source not found in queue: {title}")
 
         return removed_sources
 
+    def _checkpoint(self, transcript: Transcript, stage=None, **state):
+        """Record the progress of a transcript in the job store"""
+        if stage is not None:
+            transcript.stage = stage
+        if self.job_store is not None and transcript.job_id is not None:
+            self.job_store.checkpoint(
+                transcript.job_id,
+                stage,
+                finished=stage == self._final_stage,
+                **state,
+            )
+
+    @property
+    def _final_stage(self):
+        return "pushed" if self.github else "exported"
+
+    def _validate_stage(self, transcript: Transcript):
+        """Step back to the last finished stage whose artifacts still exist"""
+        artifacts = {
+            "downloaded": transcript.media_file,
+            "converted": transcript.audio_file,
+            "transcribed": transcript.outputs[
+                "transcription_service_output_file"
+            ],
+        }
+        if transcript.remote_url is not None:
+            # the service fetches the audio itself, there is no audio file
+            artifacts.pop("converted")
+        stage = transcript.stage
+        while stage in artifacts and not (
+            artifacts[stage] and os.path.exists(artifacts[stage])
+        ):
+            stage = STAGES[STAGES.index(stage) - 1]
+        if stage != transcript.stage:
+            self.logger.debug(
+                f"{transcript.title}: artifacts of stage '{transcript.stage}' are missing, resuming after '{stage}'"
+            )
+        transcript.stage = stage
+
+    def _media_key(self, transcript: Transcript):
+        """Key of the transcript's audio in the media cache, None when the
+        audio should not be cached"""
+        source = transcript.source
+        if self.media_cache is None:
+            return None
+        if source.local and source.source_file.endswith(".mp3"):
+            # nothing to download or convert, caching would only copy the file
+            return None
+        if transcript.media_key is None:
+            transcript.media_key = MediaCache.key_for(
+                source.source_file, source.local
+            )
+        return transcript.media_key
+
+    def _cached_audio(self, transcript: Transcript):
+        """The cached audio of the transcript, linked into its temporary
+        directory, or None"""
+        key = self._media_key(transcript)
+        if key is None or self.media_cache.get(key) is None:
+            return None
+        self._ensure_tmp_dir(transcript)
+        return self.media_cache.checkout(key, transcript.tmp_dir)
+
+    def _ensure_tmp_dir(self, transcript: Transcript):
+        if transcript.tmp_dir is None or not os.path.isdir(transcript.tmp_dir):
+            transcript.tmp_dir = self._create_subdirectory(
+                f"transcript-{utils.slugify(transcript.title)}"
+            )
+            self._checkpoint(transcript, tmp_dir=transcript.tmp_dir)
+
+    def _fetched_by_service(self, transcript: Transcript):
+        """Whether the transcription service can fetch the remote audio
+        itself, in which case there is nothing to download"""
+        source = transcript.source
+        if self.test_mode or source.local or source.type != "audio":
+            return False
+        if not getattr(self.service, "remote_source", False):
+            return False
+        transcript.remote_url = source.source_file
+        if self.service.can_fetch_remote(transcript):
+            return True
+        # the remote media was probed, not the audio that will be converted
+        transcript.remote_url = None
+        transcript.media_info = None
+        return False
+
+    def _acquire(self, transcript: Transcript):
+        """Pipeline stage: download the source's media"""
+        transcript.status = "in_progress"
+        self._validate_stage(transcript)
+        if stage_reached(transcript.stage, "downloaded"):
+            self.logger.info(
+                f"Resuming source after stage '{transcript.stage}': {transcript.source.source_file}"
+            )
+            return
+        self.logger.info(f"Processing source: {transcript.source.source_file}")
+        cached_audio = self._cached_audio(transcript)
+        if cached_audio:
+            # the same media was converted before, skip download and conversion.
+            # The audio is a link in the transcript's own directory, that
+            # the cache can't evict and that chunks are written next to
+            transcript.audio_file = cached_audio
+            self._checkpoint(transcript, "converted", audio_file=cached_audio)
+            return
+        # also where the service downloads the audio if it can't fetch it
+        self._ensure_tmp_dir(transcript)
+        if self._fetched_by_service(transcript):
+            # the service fetches the audio by URL, skip download and conversion
+            self._checkpoint(
+                transcript, "converted", remote_url=transcript.remote_url
+            )
+            return
+        transcript.acquire_source(transcript.tmp_dir)
+        self._checkpoint(
+            transcript, "downloaded", media_file=transcript.media_file
+        )
+
+    def _convert(self, transcript: Transcript):
+        """Pipeline stage: convert the downloaded media to audio"""
+        if stage_reached(transcript.stage, "converted"):
+            return
+        transcript.convert_source(transcript.tmp_dir)
+        key = self._media_key(transcript)
+        if key is not None:
+            self.media_cache.put(key, transcript.audio_file)
+        self._checkpoint(
+            transcript, "converted", audio_file=transcript.audio_file
+        )
+
+    def _transcribe(self, transcript: Transcript, test_transcript=None):
+        """Pipeline stage: transcribe the audio with the configured service"""
+        if self.test_mode:
+            transcript.outputs["raw"] = (
+                test_transcript if test_transcript is not None else "test-mode"
+            )
+        elif stage_reached(transcript.stage, "exported"):
+            # outputs were restored from the job store
+            pass
+        elif stage_reached(transcript.stage, "transcribed"):
+            # the service output is already stored, no need to pay for it again
+            self.service.finalize_transcript(transcript)
+        else:
+            self.service.transcribe(transcript)
+            self._checkpoint(
+                transcript,
+                "transcribed",
+                outputs=transcript.outputs,
+            )
+        transcript.status = "completed"
+
+    def _export(self, transcript: Transcript):
+        """Pipeline stage: write the configured output formats"""
+        if not stage_reached(transcript.stage, "exported"):
+            self.postprocess(transcript)
+        self._checkpoint(transcript, "exported", outputs=transcript.outputs)
+
     def start(self, test_transcript=None):
         self.status = "in_progress"
+        pipeline = Pipeline(
+            [
+                Stage(
+                    "acquire",
+                    self._acquire,
+                    workers=self._stage_workers("download_workers"),
+                ),
+                Stage(
+                    "convert",
+                    self._convert,
+                    workers=self._stage_workers("ffmpeg_workers"),
+                ),
+                Stage(
+                    "transcribe",
+                    lambda transcript: self._transcribe(
+                        transcript, test_transcript
+                    ),
+                    workers=self._stage_workers("transcription_workers"),
+                ),
+                Stage("export", self._export),
+            ],
+            queue_size=self.max_concurrent_transcripts,
+        )
         try:
-            for transcript in self.transcripts:
-                transcript.status = "in_progress"
-                output_dir = f"{self.model_output_dir}/{transcript.source.loc}"
-                self.logger.info(
-                    f"Processing source: {transcript.source.source_file}"
-                )
-                transcript.tmp_dir = self._create_subdirectory(
-                    f"transcript-{utils.slugify(transcript.title)}"
-                )
-                transcript.process_source(transcript.tmp_dir)
-                if self.test_mode:
-                    transcript.outputs["raw"] = (
-                        test_transcript
-                        if test_transcript is not None
-                        else "test-mode"
-                    )
-                else:
-                    self.service.transcribe(transcript)
-                transcript.status = "completed"
-                self.postprocess(transcript)
+            if self.job_store is not None:
+                self.job_store.set_status("in_progress")
+            transcripts = list(self.transcripts)
+            pipeline.run(transcripts)
+            # outputs of the services are written in the background
+            self.metadata_writer.wait()
 
             self.status = "completed"
             if self.github:
-                self.push_to_github(self.transcripts)
-            return self.transcripts
+                self.push_to_github(transcripts)
+                for transcript in transcripts:
+                    self._checkpoint(transcript, "pushed")
+            if self.job_store is not None:
+                # sources added while the batch was running stay queued
+                for transcript in transcripts:
+                    self.job_store.remove_job(transcript.job_id)
+                if self.job_store.pending_jobs():
+                    self.job_store.set_status("completed")
+                else:
+                    self.job_store.clear()
+            return transcripts
+        except StageError as e:
+            e.item.status = "failed"
+            self._fail()
+            raise Exception(f"Error with the transcription: {e}") from e
         except Exception as e:
-            self.status = "failed"
+            self._fail()
             raise Exception(f"Error with the transcription: {e}") from e
 
+    def _fail(self):
+        self.status = "failed"
+        if self.job_store is not None:
+            self.job_store.set_status("failed")
+
     def push_to_github(self, transcripts: list[Transcript]):
         if not self.github_handler:
             return
 
+        self.metadata_writer.wait()
         pr_url_transcripts = self.github_handler.push_transcripts(transcripts)
         if pr_url_transcripts:
             self.logger.info(
@@ -508,6 +822,11 @@ class Transcription:
             raise Exception(f"Error with postprocessing: {e}") from e
 
     def clean_up(self):
+        if self.job_store is not None and self.job_store.pending_jobs():
+            self.logger.info(
+                "Not cleaning up temp files, the job store has unfinished jobs"
+            )
+            return
         self.logger.debug("Cleaning up...")
         application.clean_up(self.tmp_dir)
 
@@ -518,7 +837,12 @@ class Transcription:
             self.clean_up()
 
     def __str__(self):
-        excluded_fields = ["logger", "existing_media"]
+        excluded_fields = [
+            "logger",
+            "existing_media",
+            "job_store",
+            "media_cache",
+        ]
         fields = {
             key: value
             for key, value in self.__dict__.items()
@@ -1,3 +1,4 @@
+from collections.abc import Sequence
 from typing import (
     Literal,
     TypedDict,
@@ -9,6 +10,13 @@ from typing import (
 TranscriptionCoverage = Optional[Literal["full", "none"]]
 
 
+class MediaInfo(TypedDict):
+    duration: float  # in seconds
+    codec: Optional[str]
+    sample_rate: Optional[int]
+    channels: Optional[int]
+
+
 class TranscriptType(TypedDict):
     title: str
     media: Optional[Union[str, list[str]]]
@@ -40,14 +48,14 @@ class SpeakerSegment(TypedDict):
     transcript: str
     start: float
     end: float
-    words: list[Word]
+    words: Sequence[Word]  # a `WordRange`, or a list
 
 
 class Sentence(TypedDict):
     transcript: str
     start: float
     end: float
-    words: list[Word]
+    words: Sequence[Word]  # a `WordRange`, or a list
 
 
 class SpeakerSegmentWithSentences(TypedDict):
@@ -95,6 +95,9 @@ def configure_metadata_given_from_JSON(source, from_json=None):
             ]
             for chunk_file in metadata["deepgram_chunks"]:
                 check_if_valid_file_path(chunk_file)
+        # where the chunks were cut in the audio
+        metadata["deepgram_chunk_boundaries"] = source.get(
+            "deepgram_chunk_boundaries")
 
         return metadata
     except KeyError as e:
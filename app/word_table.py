@@ -0,0 +1,165 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+from app.types import Word
+
+# the columns of a `Word`, in the order of `WordTable.rows`
+NUMERIC_FIELDS = ("start", "end", "confidence", "speaker", "speaker_confidence")
+TEXT_FIELDS = ("word", "punctuated_word")
+
+
+class WordTable:
+    """
+    The words of a transcript, stored by column.
+
+    Times and confidences are NumPy arrays, speakers an array of integers
+    and the texts indexes into a pool of interned strings, instead of a dict
+    per word. Segments and sentences refer to the words through `WordRange`
+    views, so the words are never copied.
+
+    Fields that a word does not have (e.g. the speaker, without diarization)
+    are stored as NaN, or -1 for speakers and texts, and left out of the
+    rows built back from the table.
+    """
+
+    def __init__(self, words: list[Word]):
+        def column(field, missing):
+            try:
+                return [word[field] for word in words]
+            except KeyError:
+                return [word.get(field, missing) for word in words]
+
+        # the interned strings, with their position in the pool
+        string_ids: dict[str, int] = {None: -1}
+
+        def string_column(field):
+            return [
+                string_ids.setdefault(text, len(string_ids) - 1)
+                for text in column(field, None)
+            ]
+
+        nan = float("nan")
+        self.start = np.array(column("start", nan), dtype=np.float64)
+        self.end = np.array(column("end", nan), dtype=np.float64)
+        self.confidence = np.array(column("confidence", nan), dtype=np.float64)
+        self.speaker = np.array(column("speaker", -1), dtype=np.int64)
+        self.speaker_confidence = np.array(column("speaker_confidence", nan), dtype=np.float64)
+        self.word = np.array(string_column("word"), dtype=np.int32)
+        self.punctuated_word = np.array(string_column("punctuated_word"), dtype=np.int32)
+        del string_ids[None]
+        self.strings: list[str] = list(string_ids)
+
+    def __len__(self):
+        return len(self.start)
+
+    def column(self, field, first, last) -> list:
+        """The values of a numeric field from `first` to `last` (excluded)"""
+        return getattr(self, field)[first:last].tolist()
+
+    def texts(self, first, last) -> list[str]:
+        """The punctuated words from `first` to `last` (excluded)"""
+        ids = self.punctuated_word[first:last]
+        if (ids == -1).any():
+            raise KeyError("punctuated_word")
+        strings = self.strings
+        return [strings[i] for i in ids.tolist()]
+
+    def rows(self, first, last) -> list[Word]:
+        """The words from `first` to `last` (excluded), as dicts"""
+        columns = [getattr(self, field)[first:last].tolist() for field in NUMERIC_FIELDS]
+        texts = [getattr(self, field)[first:last].tolist() for field in TEXT_FIELDS]
+        strings = self.strings
+        rows = []
+        for values in zip(*columns, *texts):
+            row = {}
+            for field, value in zip(NUMERIC_FIELDS, values):
+                # missing fields are NaN, or -1 for speakers
+                if value == value and not (field == "speaker" and value == -1):
+                    row[field] = value
+            for field, value in zip(TEXT_FIELDS, values[len(NUMERIC_FIELDS):]):
+                if value != -1:
+                    row[field] = strings[value]
+            rows.append(row)
+        return rows
+
+    def row(self, index) -> Word:
+        """The word at `index`, as a dict"""
+        row = {}
+        for field in NUMERIC_FIELDS:
+            value = getattr(self, field)[index].item()
+            # missing fields are NaN, or -1 for speakers
+            if value == value and not (field == "speaker" and value == -1):
+                row[field] = value
+        for field in TEXT_FIELDS:
+            value = getattr(self, field)[index].item()
+            if value != -1:
+                row[field] = self.strings[value]
+        return row
+
+    def has_speakers(self, first=0, last=None) -> bool:
+        """Whether every word from `first` to `last` has a speaker"""
+        return bool((self.speaker[first:last] != -1).all())
+
+    def speaker_turns(self) -> list[tuple[int, int]]:
+        """Ranges of consecutive words of the same speaker"""
+        changes = np.flatnonzero(self.speaker[1:] != self.speaker[:-1]) + 1
+        bounds = [0, *changes.tolist(), len(self)]
+        return list(zip(bounds[:-1], bounds[1:])) if len(self) else []
+
+
+class WordRange(Sequence):
+    """
+    A read-only view of the words of a `WordTable` from `first` to `last`
+    (excluded), that behaves like a list of `Word` dicts.
+
+    Adding two adjacent ranges of the same table gives a range, anything
+    else gives a list.
+    """
+
+    def __init__(self, table: WordTable, first, last):
+        self.table = table
+        self.first = first
+        self.last = last
+
+    def __len__(self):
+        return self.last - self.first
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            first, last, step = index.indices(len(self))
+            if step != 1:
+                return self.table.rows(self.first, self.last)[index]
+            return WordRange(self.table, self.first + first, self.first + max(first, last))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("word index out of range")
+        return self.table.row(self.first + index)
+
+    def column(self, field) -> list:
+        """The values of a numeric field for the words of the range"""
+        return self.table.column(field, self.first, self.last)
+
+    def __iter__(self):
+        return iter(self.table.rows(self.first, self.last))
+
+    def __add__(self, other):
+        if isinstance(other, WordRange) and other.table is self.table and other.first == self.last:
+            return WordRange(self.table, self.first, other.last)
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __eq__(self, other):
+        if isinstance(other, (WordRange, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def texts(self) -> list[str]:
+        """The punctuated words of the range"""
+        return self.table.texts(self.first, self.last)
+
+    def __repr__(self):
+        return f"WordRange({self.first}, {self.last})"
@@ -0,0 +1,100 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+import yt_dlp
+from yt_dlp.extractor.youtube import YoutubeIE
+
+from app.config import settings
+from app.logging import get_logger
+
+logger = get_logger()
+
+
+class YouTubeMetadataCache:
+    """
+    A per-process cache of the metadata that yt-dlp extracts for YouTube
+    videos, keyed by video ID.
+
+    Detecting the source type, reading the video's metadata and downloading
+    the video all need the same `extract_info` result. Sharing it through
+    this cache makes a single network round trip per video. Entries expire
+    after `ttl` seconds, because the stream URLs in the metadata expire too.
+    Each entry holds the full metadata of a video (formats, captions), so
+    expired entries are purged and at most `max_entries` are kept, the least
+    recently used are evicted first.
+    """
+
+    def __init__(self, ttl, max_entries=128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # least recently used first
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, video_id):
+        with self._lock:
+            expires, info = self._entries.get(video_id, (0, None))
+            if info is None:
+                return None
+            if expires <= time.monotonic():
+                del self._entries[video_id]
+                return None
+            self._entries.move_to_end(video_id)
+            return info
+
+    def _put(self, video_id, info):
+        with self._lock:
+            now = time.monotonic()
+            for key in [
+                key for key, (expires, _) in self._entries.items()
+                if expires <= now
+            ]:
+                del self._entries[key]
+            self._entries[video_id] = (now + self.ttl, info)
+            self._entries.move_to_end(video_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def video_id(url):
+        """The ID of a YouTube video URL, None for any other URL"""
+        if YoutubeIE.suitable(url):
+            return YoutubeIE._match_id(url)
+        return None
+
+    def extract_info(self, url):
+        """yt-dlp's metadata for `url`, cached when it is a YouTube video.
+        Returns a copy that the caller is free to modify."""
+        video_id = self.video_id(url)
+        if video_id is not None:
+            info = self._get(video_id)
+            if info is not None:
+                logger.debug(f"(cache) YouTube metadata found in cache: {video_id}")
+                return copy.deepcopy(info)
+
+        ydl_opts = {
+            "quiet": True,
+            "no_warnings": True,
+        }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+        if video_id is not None:
+            self._put(video_id, info)
+        return copy.deepcopy(info)
+
+    def invalidate(self, url):
+        video_id = self.video_id(url)
+        with self._lock:
+            self._entries.pop(video_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+youtube_metadata = YouTubeMetadataCache(
+    ttl=settings.config.getint("youtube_metadata_ttl", 3600),
+    max_entries=settings.config.getint("youtube_metadata_max_entries", 128),
+)
@@ -1,6 +1,7 @@
 import tempfile
 import shutil
 import os
+import threading
 import traceback
 
 from fastapi import (
@@ -13,26 +14,147 @@ from fastapi import (
 )
 from typing import Optional
 
+from app.config import settings
+from app.job_store import JobStore
 from app.logging import get_logger
+from app.services.deepgram_client import DeepgramClient
 from app.transcription import Transcription
 
 logger = get_logger()
 router = APIRouter(tags=["Transcription"])
 
 transcription_instance = None
+job_store = None
+# why the persisted queue could not be restored; its jobs are kept in the
+# store until a restore succeeds or the queue is reset
+restore_error = None
+
+
+def get_job_store() -> JobStore | None:
+    """The queue is persisted in a SQLite file, unless `job_store` is
+    set to an empty value in config.ini"""
+    global job_store
+    if job_store is None:
+        path = settings.config.get(
+            "job_store",
+            os.path.join(settings.TSTBTC_DATA_DIR, "jobs", "queue.sqlite"),
+        )
+        if path:
+            job_store = JobStore(path)
+    return job_store
 
 
-def get_transcription_instance(**kwargs) -> Transcription:
+def get_transcription_instance(**kwargs) -> Transcription | None:
+    """The current batch. A persisted queue is restored before a new batch
+    is started, so that it is never cleared while it still has jobs.
+    Returns None when the persisted queue could not be restored."""
     global transcription_instance
     if transcription_instance is None:
-        transcription_instance = Transcription(**kwargs)
+        restore_transcription_instance()
+        if restore_error is not None:
+            return None
+    if transcription_instance is None:
+        store = get_job_store()
+        if store is not None:
+            store.clear()
+            store.save_config(kwargs)
+        transcription_instance = Transcription(**kwargs, job_store=store)
         logger.debug(transcription_instance)
+    else:
+        update_concurrency(
+            transcription_instance, kwargs.get("max_concurrent_transcripts")
+        )
     return transcription_instance
 
 
+def update_concurrency(
+    transcription: Transcription, max_concurrent_transcripts
+):
+    """The other arguments only apply to a new batch, but the concurrency of
+    the existing one can change before it starts"""
+    current = transcription.max_concurrent_transcripts
+    if max_concurrent_transcripts in (None, current):
+        return
+    transcription.set_max_concurrent_transcripts(max_concurrent_transcripts)
+    logger.info(
+        f"max_concurrent_transcripts changed from {current} to "
+        f"{max_concurrent_transcripts}"
+    )
+    store = transcription.job_store
+    if store is not None:
+        config = store.load_config() or {}
+        config["max_concurrent_transcripts"] = max_concurrent_transcripts
+        store.save_config(config)
+
+
 def reset_transcription_instance():
-    global transcription_instance
+    global transcription_instance, restore_error
     transcription_instance = None
+    restore_error = None
+    if job_store is not None:
+        job_store.clear()
+
+
+def run_and_reset_transcription(transcription: Transcription):
+    global transcription_instance
+    try:
+        batch = transcription.start()
+    except Exception:
+        # keep the failed batch in the job store and queue it again, so that
+        # starting it resumes each source from its last finished stage
+        transcription_instance = None
+        restore_transcription_instance()
+        raise
+    for transcript in batch:
+        if transcript in transcription.transcripts:
+            transcription.transcripts.remove(transcript)
+    if transcription.transcripts:
+        # sources added while the batch was running are still queued
+        return
+    reset_transcription_instance()
+
+
+def restore_transcription_instance():
+    """Restore the queue that was persisted before the server stopped.
+    A batch that was running when the server stopped is resumed."""
+    global transcription_instance, restore_error
+    store = get_job_store()
+    if store is None or transcription_instance is not None:
+        return
+    if not store.pending_jobs():
+        store.clear()
+        restore_error = None
+        return
+    config = store.load_config()
+    try:
+        if config is None:
+            raise ValueError("the configuration of the batch is missing")
+        restored_instance = Transcription(**config, job_store=store)
+        restored = restored_instance.restore_queue()
+    except Exception as e:
+        restore_error = f"Could not restore the transcription queue: {e}"
+        logger.error(restore_error)
+        return
+    transcription_instance = restored_instance
+    restore_error = None
+    logger.info(f"Restored {len(restored)} sources from the job store")
+    if store.get_status() == "in_progress":
+        logger.info("Resuming the interrupted transcription...")
+        threading.Thread(
+            target=run_and_reset_transcription,
+            args=(transcription_instance,),
+            daemon=True,
+        ).start()
+
+
+def restore_error_response():
+    return {
+        "status": "restore_failed",
+        "message": (
+            f"{restore_error}. The persisted queue is kept; "
+            "reset the queue to discard it."
+        ),
+    }
 
 
 @router.post("/preprocess/")
@@ -49,7 +171,7 @@ async def preprocess(
     source_file: Optional[UploadFile] = File(None),
 ):
     try:
-        logger.info(f"Preprocessing sources...")
+        logger.info("Preprocessing sources...")
         transcription = Transcription(
             username="not-needed", batch_preprocessing_output=True
         )
@@ -110,6 +232,7 @@ async def add_to_queue(
     needs_review: bool = Form(False),
     nocheck: bool = Form(False),
     cutoff_date: Optional[str] = Form(None),
+    max_concurrent_transcripts: Optional[int] = Form(None),
     source: Optional[str] = Form(None),
     source_file: Optional[UploadFile] = File(None),
 ):
@@ -130,7 +253,10 @@ async def add_to_queue(
             include_metadata=not no_metadata,
             text_output=text,
             needs_review=needs_review,
+            max_concurrent_transcripts=max_concurrent_transcripts,
         )
+        if transcription is None:
+            return restore_error_response()
         if source_file:
             with tempfile.NamedTemporaryFile(delete=False) as tmp:
                 shutil.copyfileobj(source_file.file, tmp)
@@ -198,7 +324,9 @@ async def remove_from_queue(
 
         return {
             "status": "success",
-            "message": f"Removed {len(removed_sources)} sources from the queue.",
+            "message": (
+                f"Removed {len(removed_sources)} sources from the queue."
+            ),
         }
     except Exception as e:
         logger.error(e)
@@ -210,9 +338,13 @@ async def remove_from_queue(
 
 @router.post("/start/")
 async def start(background_tasks: BackgroundTasks):
-    transcription = get_transcription_instance()
+    if transcription_instance is None:
+        restore_transcription_instance()
+    if restore_error is not None:
+        return restore_error_response()
+    transcription = transcription_instance
 
-    if not transcription.transcripts:
+    if transcription is None or not transcription.transcripts:
         return {
             "status": "empty",
             "message": "No items in the transcription queue.",
@@ -224,13 +356,7 @@ async def start(background_tasks: BackgroundTasks):
             "message": "Transcription process is already running.",
         }
 
-    def run_and_reset_transcription():
-        try:
-            transcription.start()
-        finally:
-            reset_transcription_instance()
-
-    background_tasks.add_task(run_and_reset_transcription)
+    background_tasks.add_task(run_and_reset_transcription, transcription)
 
     return {
         "status": "started",
@@ -240,6 +366,20 @@ async def start(background_tasks: BackgroundTasks):
 
 @router.get("/queue/")
 async def get_queue():
+    if restore_error is not None:
+        # the jobs that were kept in the store, as they were persisted
+        queue = [
+            {
+                **job["source"],
+                "loc": job["loc"],
+                "title": job["title"],
+                "status": "not restored",
+                "stage": job["stage"],
+            }
+            for job in get_job_store().pending_jobs()
+        ]
+        return {**restore_error_response(), "data": queue}
+
     if transcription_instance is None:
         return {"data": []}
 
@@ -248,3 +388,27 @@ async def get_queue():
         for transcript in transcription_instance.transcripts
     ]
     return {"data": queue}
+
+
+@router.post("/reset_queue/")
+async def reset_queue():
+    """Discard the queue, including a persisted queue that could not be
+    restored"""
+    if transcription_instance is not None and (
+        transcription_instance.status == "in_progress"
+    ):
+        return {
+            "status": "in_progress",
+            "message": "Transcription process is already running.",
+        }
+    reset_transcription_instance()
+    return {
+        "status": "success",
+        "message": "The transcription queue has been reset.",
+    }
+
+
+@router.get("/metrics/")
+async def get_metrics():
+    """Concurrency limit, queue depth and latency of the Deepgram requests"""
+    return {"data": {"deepgram": DeepgramClient.shared_metrics()}}
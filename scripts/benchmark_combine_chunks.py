@@ -0,0 +1,110 @@
+"""
+Benchmark for `Deepgram.combine_chunk_outputs` on synthetic inputs.
+
+Generates the chunk outputs of a long recording with several speakers,
+combines them with the previous quadratic speaker matching and with the
+current implementation, checks that both outputs are identical and
+prints the timings.
+
+Usage: python scripts/benchmark_combine_chunks.py [--hours 3] [--speakers 6]
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.deepgram import ChunkCombiner, Deepgram  # noqa: E402
+
+CHUNK_LENGTH = 1200.0
+OVERLAP = 30.0
+
+
+def synthetic_chunks(hours, speakers, words_per_second=3.0, seed=0):
+    """Deepgram-like chunk outputs for a recording of `hours` hours"""
+    rng = random.Random(seed)
+    duration = hours * 3600
+    chunks = []
+    chunk_start = 0.0
+    while chunk_start < duration:
+        chunk_end = min(chunk_start + CHUNK_LENGTH, duration)
+        words = []
+        t = 0.0
+        speaker = rng.randrange(speakers)
+        while t < chunk_end - chunk_start:
+            if rng.random() < 0.02:
+                speaker = rng.randrange(speakers)
+            length = rng.uniform(0.1, 0.6)
+            words.append({
+                "word": "word",
+                "punctuated_word": "word",
+                "start": t,
+                "end": t + length,
+                "confidence": 0.9,
+                "speaker": speaker,
+                "speaker_confidence": 0.8,
+            })
+            t += 1 / words_per_second
+        chunks.append({
+            "metadata": {"chunk": len(chunks)},
+            "results": {"channels": [{"alternatives": [{"words": words}]}]},
+        })
+        if chunk_end == duration:
+            break
+        chunk_start = chunk_end - OVERLAP
+    return chunks
+
+
+def quadratic_match_overlap_speakers(
+    previous_words, words, overlap, map_speaker
+):
+    """The speaker matching before it was made linear, for comparison"""
+    for prev_word in previous_words:
+        for curr_word in words:
+            if abs(prev_word["start"] - curr_word["start"]) < overlap:
+                curr_word["speaker"] = map_speaker(curr_word["speaker"])
+
+
+def timed(service, chunks):
+    chunks = copy.deepcopy(chunks)
+    started = time.perf_counter()
+    output = service.combine_chunk_outputs(chunks, overlap=OVERLAP)
+    return output, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0]
+    )
+    parser.add_argument("--hours", type=float, default=3.0)
+    parser.add_argument("--speakers", type=int, default=6)
+    args = parser.parse_args()
+
+    with mock.patch("app.services.deepgram.DeepgramClient"):
+        service = Deepgram(False, True, False, data_writer=None)
+    chunks = synthetic_chunks(args.hours, args.speakers)
+    words = sum(
+        len(chunk["results"]["channels"][0]["alternatives"][0]["words"])
+        for chunk in chunks
+    )
+    print(f"{len(chunks)} chunks, {words} words, {args.speakers} speakers")
+
+    current, current_time = timed(service, chunks)
+    with mock.patch.object(
+        ChunkCombiner, "match_overlap_speakers",
+        staticmethod(quadratic_match_overlap_speakers),
+    ):
+        previous, previous_time = timed(service, chunks)
+
+    assert current == previous, "outputs differ"
+    print(f"quadratic: {previous_time:.3f}s")
+    speedup = previous_time / current_time
+    print(f"current:   {current_time:.3f}s ({speedup:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
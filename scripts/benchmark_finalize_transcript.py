@@ -0,0 +1,112 @@
+"""
+Benchmark for the post-processing of a long Deepgram transcript.
+
+Generates the Deepgram output of a long recording with several speakers,
+stores it, then loads it and runs the stages of
+`Deepgram.finalize_transcript` on it, as when resuming a job. Prints the
+runtime, the peak memory allocated and the size of the DPE file.
+
+Usage:
+    python scripts/benchmark_finalize_transcript.py [--hours 3] [--speakers 6]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.data_writer import DataWriter  # noqa: E402
+from app.services.deepgram import Deepgram  # noqa: E402
+
+TEXTS = ["so", "the", "block", "size", "is", "fine.", "Mr.", "Dr.", "e.g.",
+         "right?", "well-", "mempool", "fees", "and", "transactions,", "yes."]
+
+
+def synthetic_output(hours, speakers, words_per_second=2.5, seed=0):
+    """Deepgram-like output for a recording of `hours` hours"""
+    rng = random.Random(seed)
+    words = []
+    speaker = 0
+    for i in range(int(hours * 3600 * words_per_second)):
+        if rng.random() < 0.01:
+            speaker = rng.randrange(speakers)
+        text = rng.choice(TEXTS)
+        start = i / words_per_second
+        words.append({
+            "word": text.lower().strip(".,?-"),
+            "start": start,
+            "end": start + 0.3,
+            "confidence": rng.random(),
+            "speaker": speaker,
+            "speaker_confidence": rng.random(),
+            "punctuated_word": text,
+        })
+    return {"results": {"channels": [{"alternatives": [{"words": words}]}]}}
+
+
+def finalize(service, output_file, chapters, data_writer):
+    with open(output_file) as f:
+        output = json.load(f)
+    segments = service.process_segments(output, True)
+    # same as `finalize_transcript`, the output is not needed anymore
+    del output
+    segments = service.break_segments_into_sentences(segments)
+    segments = service.fix_broken_sentences(segments)
+    chapters = service.adjust_chapter_timestamps(segments, chapters)
+    dpe = {
+        "words": service.iter_digital_paper_edit_words(segments),
+        "paragraphs": service.digital_paper_edit_paragraphs(segments, chapters),
+    }
+    dpe_file = data_writer.write_json_stream(
+        dpe, "benchmark", "dpe", include_timestamp=False)
+    return segments, dpe_file, service.construct_transcript(segments, chapters)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0]
+    )
+    parser.add_argument("--hours", type=float, default=3.0)
+    parser.add_argument("--speakers", type=int, default=6)
+    args = parser.parse_args()
+
+    with mock.patch("app.services.deepgram.DeepgramClient"):
+        service = Deepgram(False, True, False, data_writer=None)
+    output = synthetic_output(args.hours, args.speakers)
+    chapters = [
+        [i, i * 600.0, f"Chapter {i}"] for i in range(int(args.hours * 6))
+    ]
+    words = output["results"]["channels"][0]["alternatives"][0]["words"]
+    print(
+        f"{len(words)} words, {args.speakers} speakers, "
+        f"{len(chapters)} chapters"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_file = os.path.join(tmp_dir, "deepgram.json")
+        with open(output_file, "w") as f:
+            json.dump(output, f)
+        del output, words
+
+        data_writer = DataWriter(tmp_dir)
+        started = time.perf_counter()
+        _, dpe_file, _ = finalize(service, output_file, chapters, data_writer)
+        print(f"runtime: {time.perf_counter() - started:.2f}s")
+        print(f"DPE file: {os.path.getsize(dpe_file) / 2**20:.1f} MiB")
+
+        tracemalloc.start()
+        result = finalize(service, output_file, chapters, data_writer)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+    print(f"peak memory allocated: {peak / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,10 @@ from fastapi.responses import JSONResponse
 
 from app.exceptions import DuplicateSourceError
 from routes.curator import router as curator_router
-from routes.transcription import router as transcription_router
+from routes.transcription import (
+    router as transcription_router,
+    restore_transcription_instance,
+)
 from routes.media import router as media_router
 
 app = FastAPI()
@@ -23,17 +26,27 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+
+@app.on_event("startup")
+async def restore_queue():
+    restore_transcription_instance()
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+
 @app.exception_handler(DuplicateSourceError)
-async def duplicate_source_exception_handler(request, exc: DuplicateSourceError):
+async def duplicate_source_exception_handler(
+    request, exc: DuplicateSourceError
+):
     return JSONResponse(
         status_code=409,
         content={"status": "warning", "message": str(exc)},
     )
 
+
 app.include_router(transcription_router, prefix="/transcription")
 app.include_router(curator_router, prefix="/curator")
 app.include_router(media_router, prefix="/media")
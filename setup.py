@@ -4,9 +4,15 @@ from setuptools import find_packages, setup
 with open("README.md", "r", encoding="utf-8") as fh:
     long_description = fh.read()
 
+
 # Function to read requirements from a file
 def read_requirements(filename):
-    return [line.strip() for line in open(filename) if line.strip() and not line.startswith("#")]
+    return [
+        line.strip()
+        for line in open(filename)
+        if line.strip() and not line.startswith("#")
+    ]
+
 
 # Read core requirements
 install_requires = read_requirements("requirements.txt")
@@ -17,7 +23,9 @@ extras_require = {
 }
 
 # Add an "all" extra that includes all optional dependencies
-extras_require["all"] = [req for reqs in extras_require.values() for req in reqs]
+extras_require["all"] = [
+    req for reqs in extras_require.values() for req in reqs
+]
 
 setup(
     name="tstbtc",
@@ -29,11 +37,11 @@ setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/bitcointranscripts/tstbtc",
-    py_modules=["transcriber","server","transcriber_server"],
+    py_modules=["transcriber", "server", "transcriber_server"],
     packages=find_packages(),
     install_requires=[install_requires],
     extras_require=extras_require,
-    python_requires=">=3.10",
+    python_requires=">=3.10,<3.14",
     classifiers=[
         "Programming Language :: Python :: 3.10",
         "License :: OSI Approved :: MIT License",
@@ -2,13 +2,11 @@
 Common pytest fixtures for the entire test suite.
 """
 
-import os
 import tempfile
 import pytest
 from unittest import mock
 import shutil
 
-from app import __version__
 from app.transcript import Transcript, Source
 from app.exporters import MarkdownExporter, JsonExporter, TextExporter
 
@@ -133,6 +131,11 @@ def mock_transcription_deps():
 
     # Configure settings
     deps["settings"].TSTBTC_METADATA_DIR = "metadata/"
+    # config.ini lookups fall back to their defaults
+    for getter in ["get", "getint", "getfloat", "getboolean"]:
+        getattr(deps["settings"].config, getter).side_effect = (
+            lambda key, fallback=None: fallback
+        )
 
     # Configure mock factory to return mock exporters
     deps["ExporterFactory"].create_exporters.return_value = {
@@ -0,0 +1,134 @@
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+import pytest
+
+from app.services.adaptive_limiter import AdaptiveLimiter
+
+
+def run_request(limiter, latency=1.0, throttled=False, cost=1.0):
+    with limiter.slot() as slot:
+        slot.record(latency, throttled=throttled, cost=cost)
+
+
+def run_round(limiter, latencies, cost=1.0):
+    """Sends `latencies` requests at once, the last one filling the limit"""
+    with ExitStack() as stack:
+        slots = [stack.enter_context(limiter.slot()) for _ in latencies]
+        for slot, latency in zip(slots, latencies):
+            slot.record(latency, cost=cost)
+
+
+@pytest.mark.unit
+class TestAdaptiveLimiter:
+    """Tests for the AIMD concurrency limiter"""
+
+    def test_limit_grows_only_when_used(self):
+        limiter = AdaptiveLimiter(initial_limit=1, max_limit=3)
+
+        # each request fills the only slot
+        run_request(limiter)
+        assert limiter.limit == 2
+        # one request at a time does not use a limit of 2
+        for _ in range(10):
+            run_request(limiter)
+        assert limiter.limit == 2
+
+    def test_limit_is_capped(self):
+        limiter = AdaptiveLimiter(initial_limit=1, max_limit=3)
+
+        for _ in range(20):
+            # fill every slot
+            with ExitStack() as stack:
+                slots = [
+                    stack.enter_context(limiter.slot())
+                    for _ in range(limiter.limit)
+                ]
+                for slot in slots:
+                    slot.record(1.0)
+        assert limiter.limit == 3
+
+    def test_throttled_burst_decreases_once(self):
+        limiter = AdaptiveLimiter(initial_limit=8, max_limit=8)
+
+        with limiter.slot() as first, limiter.slot() as second:
+            first.record(1.0, throttled=True)
+            second.record(1.0, throttled=True)
+        assert limiter.limit == 4
+        # requests sent after the decrease lower it again
+        run_request(limiter, throttled=True)
+        assert limiter.limit == 2
+        run_request(limiter, throttled=True)
+        assert limiter.limit == 1
+        assert limiter.metrics()["throttled"] == 4
+        assert limiter.metrics()["decreases"] == 3
+
+    def test_slow_requests_decrease(self):
+        limiter = AdaptiveLimiter(
+            initial_limit=4, max_limit=4, latency_tolerance=2.0
+        )
+
+        run_round(limiter, [10.0] * 4, cost=10.0)
+        # as fast by unit of cost
+        run_round(limiter, [2.0] * 4, cost=2.0)
+        assert limiter.limit == 4
+        # slow, but not sent with the limit fully used
+        run_request(limiter, latency=5.0, cost=2.0)
+        assert limiter.limit == 4
+        run_round(limiter, [2.0, 2.0, 2.0, 5.0], cost=2.0)
+        assert limiter.limit == 2
+        assert limiter.metrics()["slow"] == 2
+
+        limiter = AdaptiveLimiter(
+            initial_limit=4, max_limit=4, latency_tolerance=0
+        )
+        run_round(limiter, [1.0] * 4)
+        run_round(limiter, [100.0] * 4)
+        assert limiter.limit == 4
+
+    def test_jittered_latency_does_not_collapse_the_limit(self):
+        rng = random.Random(0)
+        limiter = AdaptiveLimiter(initial_limit=4, max_limit=10)
+
+        for _ in range(100):
+            latencies = [
+                rng.lognormvariate(0, 0.4) for _ in range(limiter.limit)
+            ]
+            run_round(limiter, latencies)
+
+        assert limiter.limit >= 4
+        assert limiter.metrics()["decreases"] <= 10
+
+    def test_queue_depth(self):
+        limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+        release = threading.Event()
+
+        def hold():
+            with limiter.slot() as slot:
+                release.wait()
+                slot.record(1.0)
+
+        threads = [threading.Thread(target=hold) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while (
+            limiter.metrics()["queue_depth"] < 2
+            and time.monotonic() < deadline
+        ):
+            time.sleep(0.01)
+
+        assert limiter.metrics()["in_flight"] == 1
+        assert limiter.metrics()["queue_depth"] == 2
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert limiter.metrics()["in_flight"] == 0
+        assert limiter.metrics()["queue_depth"] == 0
+        assert limiter.metrics()["requests"] == 3
+
+    def test_invalid_limits(self):
+        with pytest.raises(Exception, match="Invalid concurrency limits"):
+            AdaptiveLimiter(initial_limit=5, max_limit=4)
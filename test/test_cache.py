@@ -0,0 +1,176 @@
+import os
+import time
+from unittest import mock
+
+import pytest
+
+from app.cache import MediaCache, ResultCache
+
+
+def write_file(path, size):
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    return path
+
+
+@pytest.fixture
+def media_cache(temp_dir):
+    return MediaCache(os.path.join(temp_dir, "cache"), max_size=250)
+
+
+@pytest.mark.unit
+class TestMediaCache:
+    """Tests for the persistent cache of converted audio"""
+
+    def test_put_and_get(self, temp_dir, media_cache):
+        audio = write_file(os.path.join(temp_dir, "talk.mp3"), 100)
+        key = MediaCache.key_for("https://example.com/talk.m4a", local=False)
+
+        assert media_cache.get(key) is None
+        cached = media_cache.put(key, audio)
+        assert media_cache.get(key) == cached
+        assert os.path.getsize(cached) == 100
+
+    def test_local_files_are_keyed_by_content(self, temp_dir):
+        first = write_file(os.path.join(temp_dir, "a.wav"), 10)
+        renamed = write_file(os.path.join(temp_dir, "b.wav"), 10)
+        changed = write_file(os.path.join(temp_dir, "c.wav"), 11)
+
+        key = MediaCache.key_for(first, True)
+        assert key == MediaCache.key_for(renamed, True)
+        assert key != MediaCache.key_for(changed, True)
+
+    def test_least_recently_used_entries_are_evicted(
+        self, temp_dir, media_cache
+    ):
+        audio = write_file(os.path.join(temp_dir, "talk.mp3"), 100)
+        media_cache.put("first", audio)
+        media_cache.put("second", audio)
+        # make sure the modification times differ
+        time.sleep(0.01)
+        media_cache.get("first")
+
+        media_cache.put("third", audio)
+
+        assert media_cache.get("second") is None
+        assert media_cache.get("first") is not None
+        assert media_cache.get("third") is not None
+        assert media_cache.size() <= 250
+
+    def test_checked_out_audio_outlives_eviction(self, temp_dir, media_cache):
+        audio = write_file(os.path.join(temp_dir, "talk.mp3"), 100)
+        target_dir = os.path.join(temp_dir, "transcript")
+        os.makedirs(target_dir)
+        media_cache.put("first", audio)
+
+        checked_out = media_cache.checkout("first", target_dir)
+        assert os.path.dirname(checked_out) == target_dir
+        media_cache.put("second", audio)
+        media_cache.put("third", audio)
+
+        assert media_cache.get("first") is None
+        assert os.path.getsize(checked_out) == 100
+        assert media_cache.checkout("first", target_dir) is None
+
+
+@pytest.mark.integration
+class TestTranscriptionMediaCache:
+    """Tests for reusing cached audio across transcription runs"""
+
+    def test_second_run_skips_download_and_conversion(
+        self, patched_transcription, temp_dir, media_cache
+    ):
+        from app.transcription import Transcription
+
+        video = write_file(os.path.join(temp_dir, "talk.mp4"), 10)
+
+        def convert(transcript, tmp_dir):
+            transcript.audio_file = write_file(
+                os.path.join(tmp_dir, "talk.mp3"), 10
+            )
+            return transcript.audio_file
+
+        def run():
+            transcription = Transcription(test_mode=True)
+            transcription.media_cache = media_cache
+            transcription.add_transcription_source(
+                source_file=video, title="talk"
+            )
+            with mock.patch(
+                "app.transcription.Transcript.convert_source",
+                autospec=True,
+                side_effect=convert,
+            ) as converted:
+                [transcript] = transcription.start()
+            return transcript, converted
+
+        transcript, converted = run()
+        assert converted.call_count == 1
+        assert not transcript.audio_file.startswith(media_cache.cache_dir)
+
+        transcript, converted = run()
+        converted.assert_not_called()
+        assert transcript.media_file is None
+        # a link to the cached audio in the transcript's own directory, which
+        # is removed once the transcript is done
+        assert not transcript.audio_file.startswith(media_cache.cache_dir)
+        assert os.path.basename(transcript.audio_file) == os.path.basename(
+            media_cache.get(transcript.media_key))
+
+
+@pytest.mark.unit
+class TestResultCache:
+    """Tests for the cache of transcription service outputs"""
+
+    def test_key_depends_on_audio_and_options(self, temp_dir):
+        audio = write_file(os.path.join(temp_dir, "talk.mp3"), 10)
+        other_audio = write_file(os.path.join(temp_dir, "other.mp3"), 11)
+        diarize = {"diarize": True}
+        key = ResultCache.key_for(audio, "deepgram", diarize)
+
+        assert key == ResultCache.key_for(audio, "deepgram", diarize)
+        assert key != ResultCache.key_for(audio, "deepgram", {"diarize": False})
+        assert key != ResultCache.key_for(audio, "whisper", diarize)
+        assert key != ResultCache.key_for(other_audio, "deepgram", diarize)
+
+    def test_put_and_get(self, temp_dir):
+        result_cache = ResultCache(os.path.join(temp_dir, "asr_cache"))
+        assert result_cache.get("key") is None
+        result_cache.put("key", {"text": "hello"})
+        assert result_cache.get("key") == {"text": "hello"}
+
+    def test_service_is_not_called_again(self, temp_dir):
+        from app.data_writer import DataWriter
+        from app.services.whisper import Whisper
+
+        audio = write_file(os.path.join(temp_dir, "talk.mp3"), 10)
+        output = {
+            "text": "hello",
+            "segments": [{"start": 0.0, "end": 1.0, "text": "hello"}],
+        }
+        whisper = Whisper(
+            "tiny",
+            upload=False,
+            data_writer=DataWriter(os.path.join(temp_dir, "metadata")),
+            result_cache=ResultCache(os.path.join(temp_dir, "asr_cache")),
+        )
+
+        def transcribe():
+            transcript = mock.MagicMock(
+                audio_file=audio,
+                output_path_with_title="misc/talk",
+                metadata_file=None,
+                outputs={"transcription_service_output_file": None},
+            )
+            transcript.source.chapters = []
+            whisper.transcribe(transcript)
+            return transcript
+
+        with mock.patch.object(
+            whisper, "audio_to_text", return_value=output
+        ) as engine:
+            transcribe()
+            transcript = transcribe()
+
+        engine.assert_called_once()
+        assert transcript.outputs["raw"] == "hello"
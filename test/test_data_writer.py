@@ -0,0 +1,82 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from app.data_writer import DataWriter
+
+
+@pytest.mark.unit
+class TestDataWriter:
+    """Tests for writing JSON files"""
+
+    def test_background_write(self, temp_dir):
+        data_writer = DataWriter(temp_dir)
+        data = {"results": list(range(1000))}
+
+        output_file = data_writer.write_json(
+            data, "misc/talk", "deepgram", background=True
+        )
+        data_writer.wait(output_file)
+
+        with open(output_file) as f:
+            assert json.load(f) == data
+        assert os.listdir(os.path.dirname(output_file)) == [
+            os.path.basename(output_file)
+        ]
+
+    def test_failed_background_write(self, temp_dir):
+        data_writer = DataWriter(temp_dir)
+
+        output_file = data_writer.write_json(
+            {"not serializable": object()}, "misc", "talk", background=True
+        )
+        with pytest.raises(TypeError):
+            data_writer.wait()
+
+        assert os.listdir(os.path.join(temp_dir, "misc")) == []
+        assert not os.path.exists(output_file)
+        # the error is reported once
+        data_writer.wait()
+
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_stream_write(self, temp_dir, compress):
+        data_writer = DataWriter(temp_dir)
+        words = ({"id": i, "text": f"word {i}"} for i in range(1000))
+
+        output_file = data_writer.write_json_stream(
+            {"words": words, "paragraphs": [], "title": "talk"},
+            "misc/talk",
+            "dpe",
+            include_timestamp=False,
+            compress=compress,
+        )
+
+        if compress:
+            assert output_file.endswith("dpe.json.gz")
+            with gzip.open(output_file, "rt") as f:
+                content = f.read()
+        else:
+            assert output_file.endswith("dpe.json")
+            with open(output_file) as f:
+                content = f.read()
+        assert json.loads(content) == {
+            "words": [{"id": i, "text": f"word {i}"} for i in range(1000)],
+            "paragraphs": [],
+            "title": "talk",
+        }
+        # compact, without indentation
+        assert "\n" not in content and '"id":0,' in content
+
+    def test_failed_stream_write(self, temp_dir):
+        data_writer = DataWriter(temp_dir)
+
+        def words():
+            yield {"id": 0}
+            raise ValueError("broken transcript")
+
+        with pytest.raises(ValueError):
+            data_writer.write_json_stream({"words": words()}, "misc", "dpe")
+
+        assert os.listdir(os.path.join(temp_dir, "misc")) == []
@@ -0,0 +1,844 @@
+import copy
+import gc
+import gzip
+import json
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import pytest
+
+from app.data_writer import DataWriter
+from app.services.adaptive_limiter import AdaptiveLimiter
+from app.services.deepgram import ChunkCombiner, Deepgram, SentenceIndex
+from app.services.deepgram_client import DeepgramClient
+
+
+@pytest.fixture
+def deepgram_service(temp_dir, monkeypatch):
+    monkeypatch.setenv("DEEPGRAM_API_KEY", "test-key")
+    return Deepgram(
+        summarize=False,
+        diarize=False,
+        upload=False,
+        data_writer=DataWriter(os.path.join(temp_dir, "metadata")),
+    )
+
+
+@pytest.fixture
+def transcript(temp_dir):
+    transcript = mock.MagicMock(
+        audio_file=os.path.join(temp_dir, "talk.mp3"),
+        output_path_with_title="misc/talk",
+        metadata_file=None,
+        remote_url=None,
+    )
+    return transcript
+
+
+def quadratic_match_overlap_speakers(
+    previous_words, words, overlap, map_speaker
+):
+    for prev_word in previous_words:
+        for curr_word in words:
+            if abs(prev_word["start"] - curr_word["start"]) < overlap:
+                curr_word["speaker"] = map_speaker(curr_word["speaker"])
+
+
+def make_chunks(n_chunks, shuffle=False, seed=0):
+    rng = random.Random(seed)
+    chunks = []
+    for chunk in range(n_chunks):
+        words = [
+            {
+                "word": "word",
+                "punctuated_word": "word",
+                "start": i * 5.0,
+                "end": i * 5.0 + 0.4,
+                "speaker": rng.randrange(4),
+                "speaker_confidence": 0.5,
+            }
+            for i in range(240)
+        ]
+        if shuffle:
+            rng.shuffle(words)
+        chunks.append(
+            {
+                "metadata": {"chunk": chunk},
+                "results": {"channels": [{"alternatives": [{"words": words}]}]},
+            }
+        )
+    return chunks
+
+
+def asset_path(name):
+    return os.path.join(os.path.dirname(__file__), "testAssets", name)
+
+
+def recorded_response():
+    """A response of Deepgram's /listen endpoint, as the API returns it"""
+    with open(asset_path("deepgram_response.json"), "rb") as f:
+        return f.read()
+
+
+def transcript_segments(deepgram_service):
+    """Speaker segments with sentences, made from the words of the test
+    transcript with speaker turns that often break sentences"""
+    rng = random.Random(0)
+    with open(asset_path("transcript.txt")) as f:
+        texts = f.read().split()[:2000]
+    words = []
+    speaker = 0
+    for i, text in enumerate(texts):
+        if rng.random() < 0.08:
+            speaker = (speaker + rng.randrange(1, 3)) % 3
+        words.append(
+            {
+                "word": text.lower(),
+                "punctuated_word": text,
+                "start": i * 0.4,
+                "end": i * 0.4 + rng.uniform(0.1, 0.39),
+                "speaker": speaker,
+                "speaker_confidence": round(rng.random(), 3),
+            }
+        )
+    output = {"results": {"channels": [{"alternatives": [{"words": words}]}]}}
+    segments = deepgram_service.process_segments(output, diarization=True)
+    return deepgram_service.break_segments_into_sentences(segments)
+
+
+def summarize_segments(segments):
+    """The parts of the segments that golden files compare"""
+    return [
+        {
+            "speaker": segment["speaker"],
+            "start": segment["start"],
+            "end": segment["end"],
+            "transcript": segment["transcript"],
+            "sentences": [
+                [
+                    sentence["transcript"],
+                    sentence["start"],
+                    sentence["end"],
+                    len(sentence["words"]),
+                    sentence.get("fixed_by_heuristic"),
+                ]
+                for sentence in segment["sentences"]
+            ],
+        }
+        for segment in segments
+    ]
+
+
+@pytest.mark.unit
+class TestTranscribeInChunks:
+    """Tests for transcribing long audio in chunks"""
+
+    def test_chunks_are_transcribed_concurrently(
+        self, deepgram_service, transcript, temp_dir
+    ):
+        chunk_files = [f"chunk_{i}.mp3" for i in range(1, 5)]
+        chunk_outputs = make_chunks(4)
+        active = 0
+        max_active = 0
+        lock = threading.Lock()
+
+        def audio_to_text(chunk_file, chunk):
+            nonlocal active, max_active
+            with lock:
+                active += 1
+                max_active = max(max_active, active)
+            # later chunks finish first
+            time.sleep(0.01 * (5 - chunk))
+            with lock:
+                active -= 1
+            return chunk_outputs[chunk - 1]
+
+        boundaries = [
+            (0, 1200.0), (1195.0, 2400.0), (2395.0, 3600.0), (3595.0, 4000.0)
+        ]
+        deepgram_service.chunk_workers = 4
+        with mock.patch.object(
+            deepgram_service.processor, "quiet_chunk_boundaries",
+            return_value=boundaries,
+        ), mock.patch.object(
+            deepgram_service.processor, "split_audio", return_value=chunk_files
+        ) as split_audio, mock.patch.object(
+            deepgram_service, "audio_to_text", side_effect=audio_to_text
+        ):
+            output = deepgram_service.transcribe_in_chunks(transcript)
+
+        assert split_audio.call_args.kwargs["boundaries"] == boundaries
+        assert max_active > 1
+        # chunks are combined in order, whatever order they finish in
+        assert output["metadata"] == [{"chunk": i} for i in range(4)]
+        written = os.listdir(os.path.join(temp_dir, "metadata", "misc", "talk"))
+        assert len(written) == 4
+
+    def test_chunk_outputs_are_released(self, deepgram_service, transcript):
+        class ChunkOutput(dict):
+            """A chunk output that can be weakly referenced"""
+
+        chunk_outputs = [ChunkOutput(chunk) for chunk in make_chunks(4)]
+        released = [weakref.ref(chunk_output) for chunk_output in chunk_outputs]
+        released_before_last_chunk = None
+
+        def audio_to_text(chunk_file, chunk):
+            nonlocal chunk_outputs, released_before_last_chunk
+            if chunk < 4:
+                return chunk_outputs[chunk - 1]
+            # the last chunk finishes once the others have been combined
+            last_output = chunk_outputs[3]
+            chunk_outputs = None
+            deadline = time.monotonic() + 2
+            while time.monotonic() < deadline:
+                gc.collect()
+                if all(ref() is None for ref in released[:3]):
+                    break
+                time.sleep(0.01)
+            released_before_last_chunk = [ref() is None for ref in released[:3]]
+            return last_output
+
+        deepgram_service.chunk_workers = 4
+        with mock.patch.object(
+            deepgram_service.processor, "quiet_chunk_boundaries",
+            return_value=[
+                (0, 1200.0), (1195.0, 2400.0),
+                (2395.0, 3600.0), (3595.0, 4000.0),
+            ],
+        ), mock.patch.object(
+            deepgram_service.processor, "split_audio",
+            return_value=[f"chunk_{i}.mp3" for i in range(1, 5)],
+        ), mock.patch.object(
+            deepgram_service, "audio_to_text", side_effect=audio_to_text
+        ):
+            output = deepgram_service.transcribe_in_chunks(transcript)
+
+        assert released_before_last_chunk == [True, True, True]
+        assert output["metadata"] == [{"chunk": i} for i in range(4)]
+
+    def test_failed_chunk(self, deepgram_service, transcript):
+        def audio_to_text(chunk_file, chunk):
+            if chunk == 2:
+                raise Exception("(deepgram) Error transcribing audio to text")
+            return {"chunk": chunk}
+
+        with mock.patch.object(
+            deepgram_service.processor, "quiet_chunk_boundaries",
+            return_value=[(0, 1200.0), (1195.0, 2400.0), (2395.0, 3000.0)],
+        ), mock.patch.object(
+            deepgram_service.processor, "split_audio",
+            return_value=["chunk_1.mp3", "chunk_2.mp3", "chunk_3.mp3"],
+        ), mock.patch.object(
+            deepgram_service, "audio_to_text", side_effect=audio_to_text
+        ), mock.patch.object(ChunkCombiner, "add", autospec=True) as add:
+            with pytest.raises(Exception, match="Error transcribing"):
+                deepgram_service.transcribe_in_chunks(transcript)
+
+        added = [call.args[1] for call in add.call_args_list]
+        assert {"chunk": 2} not in added and {"chunk": 3} not in added
+
+
+@pytest.fixture
+def deepgram_stub():
+    """A local stand-in for Deepgram's /listen endpoint"""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            requests_seen.append(
+                {
+                    "client": self.client_address,
+                    "path": self.path,
+                    "headers": dict(self.headers),
+                    "size": len(body),
+                    "body": body,
+                }
+            )
+            status = 400 if b"bad" in body else 200
+            if status == 200:
+                payload = recorded_response()
+            else:
+                payload = json.dumps(
+                    {
+                        "err_code": "REMOTE_CONTENT_ERROR",
+                        "err_msg": "Could not determine if URL for media "
+                        "download is publicly routable.",
+                        "request_id": "0a1c2e3f-4b5d-6e7f-8091-a2b3c4d5e6f7",
+                    }
+                ).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_HEAD(self):
+            # also serves as the host of remote media
+            self.send_response(200 if self.path.endswith("talk.mp3") else 404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1", requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.unit
+class TestDeepgramClient:
+    """Tests for the pooled Deepgram HTTP client"""
+
+    def test_connections_are_reused(self, deepgram_stub, temp_dir):
+        api_url, requests_seen = deepgram_stub
+        audio_file = os.path.join(temp_dir, "talk.mp3")
+        with open(audio_file, "wb") as f:
+            f.write(b"audio")
+        client = DeepgramClient("test-key", api_url=api_url)
+
+        for _ in range(3):
+            response = client.transcribe_file(
+                audio_file,
+                {"diarize": False, "model": "whisper-large", "tier": None},
+            )
+
+        assert response == json.loads(recorded_response())
+        assert len({seen["client"] for seen in requests_seen}) == 1
+        assert requests_seen[0]["path"] == (
+            "/v1/listen?diarize=false&model=whisper-large"
+        )
+        assert requests_seen[0]["headers"]["Authorization"] == "Token test-key"
+        assert requests_seen[0]["body"] == b"audio"
+        assert client.stats["requests"] == 3
+        client.close()
+
+    def test_errors_are_raised(self, deepgram_stub, temp_dir):
+        api_url, _ = deepgram_stub
+        audio_file = os.path.join(temp_dir, "bad.mp3")
+        with open(audio_file, "wb") as f:
+            f.write(b"bad audio")
+        client = DeepgramClient("test-key", api_url=api_url)
+
+        with pytest.raises(Exception, match="DG: 400"):
+            client.transcribe_file(audio_file, {})
+        client.close()
+
+    def test_recorded_response_is_post_processed(
+        self, deepgram_service, deepgram_stub, temp_dir
+    ):
+        api_url, _ = deepgram_stub
+        audio_file = os.path.join(temp_dir, "talk.mp3")
+        with open(audio_file, "wb") as f:
+            f.write(b"audio")
+        client = DeepgramClient("test-key", api_url=api_url)
+
+        output = client.transcribe_file(audio_file, {"diarize": True})
+        segments = deepgram_service.process_segments(output, diarization=True)
+
+        assert [(s["speaker"], s["transcript"]) for s in segments] == [
+            (0, "Welcome to the podcast."),
+            (1, "Today we talk about the mempool."),
+        ]
+        client.close()
+
+
+@pytest.fixture
+def throttling_stub():
+    """A stand-in for Deepgram that throttles (HTTP 429) the requests beyond
+    `capacity` at the same time"""
+    state = {"capacity": 2, "in_flight": 0, "max_in_flight": 0, "throttled": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            with lock:
+                throttled = state["in_flight"] >= state["capacity"]
+                if throttled:
+                    state["throttled"] += 1
+                else:
+                    state["in_flight"] += 1
+                    state["max_in_flight"] = max(
+                        state["max_in_flight"], state["in_flight"])
+            if throttled:
+                payload = (
+                    b'{"err_code": "TOO_MANY_REQUESTS", "err_msg": "Too many'
+                    b' requests. Please try again later"}'
+                )
+                self.send_response(429)
+            else:
+                time.sleep(0.05)
+                with lock:
+                    state["in_flight"] -= 1
+                payload = recorded_response()
+                self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1", state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.unit
+class TestAdaptiveConcurrency:
+    """Tests for limiting the requests in flight to Deepgram"""
+
+    def test_limit_backs_off_when_throttled(self, throttling_stub, temp_dir):
+        api_url, state = throttling_stub
+        audio_file = os.path.join(temp_dir, "talk.mp3")
+        with open(audio_file, "wb") as f:
+            f.write(b"audio")
+        client = DeepgramClient(
+            "test-key",
+            api_url=api_url,
+            pool_size=8,
+            limiter=AdaptiveLimiter(
+                initial_limit=8, max_limit=8, latency_tolerance=0
+            ),
+            max_retries=50,
+            retry_backoff=0,
+        )
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(executor.map(
+                lambda _: client.transcribe_file(audio_file, {}), range(24)))
+
+        assert responses == [json.loads(recorded_response())] * 24
+        assert state["throttled"] > 0
+        metrics = client.metrics()
+        assert metrics["requests"] == 24 + state["throttled"]
+        assert metrics["limiter"]["decreases"] > 0
+        assert metrics["limiter"]["limit"] < 8
+        assert metrics["limiter"]["in_flight"] == 0
+        assert metrics["limiter"]["queue_depth"] == 0
+        client.close()
+
+    def test_retries_are_limited(self, throttling_stub, temp_dir):
+        api_url, state = throttling_stub
+        state["capacity"] = 0
+        audio_file = os.path.join(temp_dir, "talk.mp3")
+        with open(audio_file, "wb") as f:
+            f.write(b"audio")
+        client = DeepgramClient(
+            "test-key", api_url=api_url, max_retries=2, retry_backoff=0
+        )
+
+        with pytest.raises(Exception, match="DG: 429"):
+            client.transcribe_file(audio_file, {})
+
+        assert state["throttled"] == 3
+        assert client.metrics()["limiter"]["limit"] == 1
+        client.close()
+
+
+@pytest.mark.unit
+class TestRemoteSource:
+    """Tests for letting Deepgram fetch remote audio by URL"""
+
+    def test_only_reachable_and_short_audio_is_fetched_remotely(
+        self, deepgram_service, deepgram_stub, transcript
+    ):
+        api_url, _ = deepgram_stub
+        host = api_url[: -len("/v1")]
+        deepgram_service.remote_source = True
+        transcript.probe_audio.return_value = {"duration": 600.0}
+
+        with mock.patch.object(
+            deepgram_service.processor, "get_duration"
+        ) as get_duration:
+            transcript.remote_url = f"{host}/talk.mp3"
+            assert deepgram_service.can_fetch_remote(transcript)
+            transcript.remote_url = f"{host}/missing.mp3"
+            assert not deepgram_service.can_fetch_remote(transcript)
+            transcript.remote_url = f"{host}/talk.mp3"
+            transcript.probe_audio.return_value = {"duration": 7200.0}
+            assert not deepgram_service.can_fetch_remote(transcript)
+
+            deepgram_service.remote_source = False
+            assert not deepgram_service.can_fetch_remote(transcript)
+
+        # the duration comes from the transcript's probe, that is reused
+        get_duration.assert_not_called()
+        assert transcript.probe_audio.call_count == 2
+
+    def test_url_is_sent_to_deepgram(
+        self, deepgram_service, deepgram_stub, transcript
+    ):
+        api_url, requests_seen = deepgram_stub
+        deepgram_service.client = DeepgramClient("test-key", api_url=api_url)
+        transcript.remote_url = "https://example.com/talk.mp3"
+
+        deepgram_service.transcribe_audio(transcript)
+
+        [request] = requests_seen
+        assert json.loads(request["body"]) == {
+            "url": "https://example.com/talk.mp3"
+        }
+        assert request["headers"]["Content-Type"] == "application/json"
+        deepgram_service.client.close()
+
+    def test_failed_remote_fetch_falls_back_to_upload(
+        self, deepgram_service, deepgram_stub, transcript, temp_dir
+    ):
+        api_url, requests_seen = deepgram_stub
+        deepgram_service.client = DeepgramClient("test-key", api_url=api_url)
+        # the stub rejects the request, like Deepgram when the URL expired
+        transcript.remote_url = "https://example.com/bad-talk.mp3"
+
+        def fetch_locally():
+            transcript.remote_url = None
+            with open(transcript.audio_file, "wb") as f:
+                f.write(b"\x00" * 1024)
+            return transcript.audio_file
+
+        transcript.fetch_locally.side_effect = fetch_locally
+        transcript.probe_audio.return_value = {"duration": 600.0}
+
+        output = deepgram_service.transcribe_audio(transcript)
+
+        assert output == json.loads(recorded_response())
+        transcript.fetch_locally.assert_called_once()
+        remote, upload = requests_seen
+        assert remote["headers"]["Content-Type"] == "application/json"
+        assert upload["size"] == 1024
+        deepgram_service.client.close()
+
+
+@pytest.mark.unit
+class TestCombineChunkOutputs:
+    """Tests for stitching the outputs of the chunks together"""
+
+    @pytest.mark.parametrize("shuffle", [False, True])
+    def test_same_output_as_comparing_every_pair(
+        self, deepgram_service, shuffle
+    ):
+        chunks = make_chunks(4, shuffle=shuffle)
+
+        combined = deepgram_service.combine_chunk_outputs(
+            copy.deepcopy(chunks), overlap=30
+        )
+        with mock.patch.object(
+            ChunkCombiner,
+            "match_overlap_speakers",
+            staticmethod(quadratic_match_overlap_speakers),
+        ):
+            expected = deepgram_service.combine_chunk_outputs(
+                copy.deepcopy(chunks), overlap=30
+            )
+
+        assert combined == expected
+
+    def test_chunks_are_combined_one_at_a_time(self, deepgram_service):
+        chunks = make_chunks(3)
+        combined = deepgram_service.combine_chunk_outputs(
+            copy.deepcopy(chunks), overlap=30
+        )
+
+        combiner = ChunkCombiner(
+            deepgram_service.processor.chunk_length, 30, summarize=False
+        )
+        for chunk in copy.deepcopy(chunks):
+            # the combiner keeps the words, not the rest of the chunk output
+            [alternative] = chunk["results"]["channels"][0]["alternatives"]
+            alternative["transcript"] = "..."
+            combiner.add(chunk)
+
+        assert combiner.output == combined
+        assert combiner.previous_words
+        assert all(
+            word["end"] > combiner.total_offset
+            for word in combiner.previous_words
+        )
+
+    def test_chunks_are_placed_at_their_cuts(self, deepgram_service):
+        # cut in a pause at 1187.3s, the second chunk starts 5s earlier
+        boundaries = [(0, 1187.3), (1182.3, 2000.0)]
+        starts = [i * 5.0 for i in range(400)]
+        chunks = []
+        for chunk_start, chunk_end in boundaries:
+            words = [
+                {
+                    "word": "word",
+                    "punctuated_word": "word",
+                    "start": start - chunk_start,
+                    "end": start - chunk_start + 0.4,
+                    "speaker": 0,
+                }
+                for start in starts
+                if chunk_start <= start and start + 0.4 <= chunk_end
+            ]
+            alternatives = [{"words": words}]
+            chunks.append(
+                {"results": {"channels": [{"alternatives": alternatives}]}}
+            )
+
+        combined = deepgram_service.combine_chunk_outputs(
+            chunks, overlap=5.0, boundaries=boundaries
+        )
+
+        words = combined["results"]["channels"][0]["alternatives"][0]["words"]
+        # every word once, the word in the overlap from the first chunk
+        assert [word["start"] for word in words] == pytest.approx(starts)
+
+
+@pytest.mark.unit
+class TestFinalizeTranscript:
+    """Tests for handing the service output over to `finalize_transcript`"""
+
+    def test_output_is_not_read_back_from_disk(
+        self, deepgram_service, transcript
+    ):
+        [output] = make_chunks(1)
+        transcript.outputs = {"transcription_service_output_file": None}
+        transcript.source.chapters = []
+
+        with mock.patch.object(
+            deepgram_service, "transcribe_audio", return_value=output
+        ), mock.patch.object(
+            deepgram_service, "load_transcription_service_output"
+        ) as load:
+            deepgram_service.transcribe(transcript)
+
+        load.assert_not_called()
+        assert transcript.outputs["raw"].startswith("Speaker 3: 00:00:00")
+        output_file = transcript.outputs["transcription_service_output_file"]
+        deepgram_service.data_writer.wait(output_file)
+        with open(output_file) as f:
+            assert json.load(f) == output
+
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_dpe_file_is_streamed(self, deepgram_service, transcript, compress):
+        [output] = make_chunks(1)
+        transcript.outputs = {}
+        transcript.source.chapters = [[0, 30.0, "Second half"]]
+        deepgram_service.dpe_output = True
+        deepgram_service.dpe_compress = compress
+
+        with mock.patch.object(
+            deepgram_service, "transform_to_digital_paper_edit_format",
+            wraps=deepgram_service.transform_to_digital_paper_edit_format
+        ) as transform:
+            deepgram_service.finalize_transcript(
+                transcript, copy.deepcopy(output)
+            )
+            # the words are never all built up in a list
+            transform.assert_not_called()
+
+        segments = deepgram_service.fix_broken_sentences(
+            deepgram_service.break_segments_into_sentences(
+                deepgram_service.process_segments(output, True)))
+        expected = deepgram_service.transform_to_digital_paper_edit_format(
+            segments, deepgram_service.adjust_chapter_timestamps(
+                segments, transcript.source.chapters))
+        dpe_file = transcript.outputs["dpe_file"]
+        opener = gzip.open if compress else open
+        with opener(dpe_file, "rt") as f:
+            assert json.load(f) == json.loads(json.dumps(expected))
+        assert dpe_file.endswith(".json.gz" if compress else ".json")
+
+
+def make_segments(sentence_times):
+    """Speaker segments with one sentence per (start, end) pair, alternating
+    between two speakers"""
+    segments = []
+    for i, (start, end) in enumerate(sentence_times):
+        sentence = {
+            "transcript": f"Sentence {i}.",
+            "start": start,
+            "end": end,
+            "words": [],
+        }
+        segments.append(
+            {
+                "speaker": i % 2,
+                "transcript": sentence["transcript"],
+                "start": start,
+                "end": end,
+                "sentences": [sentence],
+            }
+        )
+    return segments
+
+
+@pytest.mark.unit
+class TestSentenceIndex:
+    """Tests for resolving chapters to sentences"""
+
+    @pytest.mark.parametrize("shuffle", [False, True])
+    def test_find_returns_the_first_containing_sentence(self, shuffle):
+        rng = random.Random(1)
+        times = []
+        start = 0.0
+        for _ in range(200):
+            # some sentences overlap the next one
+            end = start + rng.uniform(1, 5)
+            times.append((start, end))
+            start = end - rng.choice([0, 0, 0.5])
+        if shuffle:
+            rng.shuffle(times)
+        segments = make_segments(times)
+        index = SentenceIndex(segments)
+
+        for _ in range(500):
+            timestamp = rng.uniform(-5, start + 5)
+            expected = next(
+                (
+                    segment["sentences"][0]
+                    for segment in segments
+                    if segment["start"] <= timestamp <= segment["end"]
+                ),
+                None,
+            )
+            assert index.find(timestamp) is expected
+
+    def test_chapters_are_placed_in_order(self):
+        index = SentenceIndex(make_segments([(0, 10), (10, 20), (20, 30)]))
+        chapters = [
+            [0, 0.0, "Intro"], [1, 0.0, "Also intro"], [2, 40.0, "Late"]
+        ]
+
+        # a sentence gets at most one chapter title
+        assert index.place_chapters(chapters) == {
+            0: chapters[0], 1: chapters[1]
+        }
+        assert index.place_chapters([]) == {}
+
+    def test_chapters_in_transcript(self, deepgram_service):
+        segments = make_segments([(0, 10), (10, 20), (20, 30)])
+        # "Main" moves to the end of the sentence it starts in
+        chapters = deepgram_service.adjust_chapter_timestamps(
+            segments, [[0, 0.0, "Intro"], [1, 17.0, "Main"]]
+        )
+
+        assert deepgram_service.construct_transcript(segments, chapters) == (
+            "## Intro\n\nSpeaker 0: 00:00:00\n\nSentence 0.\n\n"
+            "Speaker 1: 00:00:10\n\nSentence 1.\n\n"
+            "## Main\n\nSpeaker 0: 00:00:20\n\nSentence 2."
+        )
+
+    def test_paragraphs_in_transcript(self, deepgram_service):
+        segments = make_segments([(0, 10), (10, 20), (20, 30)])
+        segments[0]["sentences"].append(segments.pop(1)["sentences"][0])
+        deepgram_service.one_sentence_per_line = False
+
+        assert deepgram_service.construct_transcript(
+            segments, [[0, 5.0, "Main"]]
+        ) == (
+            "Speaker 0: 00:00:00\n\nSentence 0.\n\n## Main\n\n"
+            "Speaker 0: 00:00:05\n\nSentence 1.\n\n"
+            "Speaker 0: 00:00:20\n\nSentence 2."
+        )
+
+
+def regex_sentence_ranges(words):
+    """Sentence ranges found by splitting the joined words with the
+    regular expression the segmenter replaces"""
+    pattern = r"(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|…|-)\s"
+    ranges = []
+    first = 0
+    for sentence in re.split(pattern, " ".join(words)):
+        last = first + len(sentence.split())
+        ranges.append((first, last))
+        first = last
+    return ranges
+
+
+@pytest.mark.unit
+class TestSentenceRanges:
+    """Tests for splitting the words of a segment into sentences"""
+
+    TOKENS = [
+        "word", "Word", "end.", "end?", "end…", "well-", "-", ".", "a.", "A.",
+        "Mr.", "Dr.", "Ms.", "MR.", "e.g.", "i.e.", "U.S.", "3.5.", "v1.2.",
+        "é.", "x_y.", "ok,", "why?", "So-",
+    ]
+
+    def test_same_sentences_as_the_regular_expression(self):
+        rng = random.Random(2)
+        for _ in range(2000):
+            length = rng.randrange(1, 12)
+            tokens = [rng.choice(self.TOKENS) for _ in range(length)]
+            expected = regex_sentence_ranges(tokens)
+            assert Deepgram.sentence_ranges(tokens) == expected
+
+    def test_words_with_spaces(self, deepgram_service):
+        words = [
+            {"punctuated_word": text, "start": float(i), "end": i + 0.5}
+            for i, text in enumerate(
+                ["We", "met", "in", "New York.", "It", "rained."]
+            )
+        ]
+        segment = {
+            "speaker": 0,
+            "transcript": " ".join(word["punctuated_word"] for word in words),
+            "start": 0.0,
+            "end": 5.5,
+            "words": words,
+        }
+
+        [result] = deepgram_service.break_segments_into_sentences([segment])
+
+        assert [s["transcript"] for s in result["sentences"]] == [
+            "We met in New York.",
+            "It rained.",
+        ]
+        sentences = result["sentences"]
+        assert [s["words"] for s in sentences] == [words[:4], words[4:]]
+        assert result["sentences"][1]["start"] == 4.0
+
+
+@pytest.mark.unit
+class TestFixBrokenSentences:
+    """Tests for repairing sentences broken by a change of speaker"""
+
+    @pytest.mark.parametrize("dev_mode", [False, True])
+    def test_golden_output(self, deepgram_service, dev_mode):
+        with open(asset_path("fix_broken_sentences.json")) as f:
+            expected = json.load(f)["dev_mode" if dev_mode else "default"]
+        deepgram_service.dev_mode = dev_mode
+        segments = transcript_segments(deepgram_service)
+
+        fixed = deepgram_service.fix_broken_sentences(segments)
+
+        assert summarize_segments(fixed) == expected
+
+    def test_emptied_segments_are_dropped(self, deepgram_service):
+        segments = make_segments([(0, 10), (10, 11), (11, 20)])
+        for segment, speaker in zip(segments, [0, 1, 0]):
+            segment["speaker"] = speaker
+            for sentence in segment["sentences"]:
+                sentence["transcript"] = sentence["transcript"].rstrip(".")
+                sentence["words"] = [{"speaker_confidence": speaker / 2}]
+
+        [fixed] = deepgram_service.fix_broken_sentences(segments)
+
+        # no sentence is finished, so all of them are joined into the
+        # longest one and the emptied segments are dropped
+        assert fixed["speaker"] == 0
+        assert fixed["transcript"] == "Sentence 0 Sentence 1 Sentence 2"
+        assert (fixed["start"], fixed["end"]) == (0, 20)
@@ -0,0 +1,293 @@
+import gc
+import os
+from unittest import mock
+
+import pytest
+
+from app.job_store import JobStore, stage_reached
+from app.transcript import Transcript
+
+
+@pytest.fixture
+def job_store(temp_dir):
+    store = JobStore(os.path.join(temp_dir, "queue.sqlite"))
+    yield store
+    # transcriptions kept alive by a failure's traceback read the store
+    # when they are cleaned up
+    gc.collect()
+    store.close()
+
+
+@pytest.fixture
+def audio_file(temp_dir):
+    path = os.path.join(temp_dir, "talk.mp3")
+    with open(path, "wb") as f:
+        f.write(b"not really an mp3")
+    return path
+
+
+@pytest.mark.unit
+class TestJobStore:
+    """Tests for the SQLite-backed transcription queue"""
+
+    def test_jobs_survive_reopening(self, temp_dir, job_store):
+        job_store.save_config({"deepgram": True})
+        job_id = job_store.add_job("misc", "title", {"source_file": "a.mp3"})
+        job_store.checkpoint(job_id, "downloaded", media_file="/tmp/a.mp3")
+        job_store.close()
+
+        reopened = JobStore(os.path.join(temp_dir, "queue.sqlite"))
+        assert reopened.load_config() == {"deepgram": True}
+        [job] = reopened.pending_jobs()
+        assert job["stage"] == "downloaded"
+        assert job["state"] == {"media_file": "/tmp/a.mp3"}
+        assert job["source"] == {"source_file": "a.mp3"}
+        reopened.close()
+
+    def test_finished_jobs_are_not_pending(self, job_store):
+        first = job_store.add_job("misc", "first", {})
+        second = job_store.add_job("misc", "second", {})
+        job_store.checkpoint(first, "exported", finished=True)
+
+        assert [job["id"] for job in job_store.pending_jobs()] == [second]
+
+    def test_remove_and_clear(self, job_store):
+        job_id = job_store.add_job("misc", "title", {})
+        job_store.add_job("misc", "other", {})
+        job_store.remove_job(job_id)
+        assert len(job_store.pending_jobs()) == 1
+
+        job_store.set_status("in_progress")
+        job_store.clear()
+        assert job_store.pending_jobs() == []
+        assert job_store.get_status() is None
+
+    def test_store_is_locked_by_one_process(self, temp_dir, job_store):
+        with pytest.raises(RuntimeError, match="in use"):
+            JobStore(os.path.join(temp_dir, "queue.sqlite"))
+
+    def test_stage_order(self):
+        assert stage_reached("converted", "downloaded")
+        assert stage_reached("converted", "converted")
+        assert not stage_reached("downloaded", "transcribed")
+
+
+@pytest.mark.integration
+class TestTranscriptionResume:
+    """Tests for resuming a persisted queue from its last finished stage"""
+
+    def test_queue_is_persisted(
+        self, patched_transcription, job_store, audio_file
+    ):
+        from app.transcription import Transcription
+
+        transcription = Transcription(test_mode=True, job_store=job_store)
+        transcription.add_transcription_source(
+            source_file=audio_file, title="talk"
+        )
+
+        [job] = job_store.pending_jobs()
+        assert job["title"] == "talk"
+        assert job["source"]["source_file"] == audio_file
+        transcript = transcription.transcripts.find("misc", "talk")
+        assert transcript.job_id == job["id"]
+
+    def test_resume_skips_finished_stages(
+        self, patched_transcription, job_store, audio_file
+    ):
+        from app.transcription import Transcription
+
+        transcription = Transcription(test_mode=True, job_store=job_store)
+        transcription.add_transcription_source(
+            source_file=audio_file, title="talk"
+        )
+        [job] = job_store.pending_jobs()
+        # the server stopped after the audio was converted
+        job_store.checkpoint(job["id"], "converted", audio_file=audio_file)
+
+        restarted = Transcription(test_mode=True, job_store=job_store)
+        [transcript] = restarted.restore_queue()
+        assert transcript.stage == "converted"
+
+        with (
+            mock.patch.object(Transcript, "acquire_source") as acquire,
+            mock.patch.object(Transcript, "convert_source") as convert,
+        ):
+            restarted.start()
+
+        acquire.assert_not_called()
+        convert.assert_not_called()
+        assert transcript.status == "completed"
+        # the batch completed, nothing is left to resume
+        assert job_store.pending_jobs() == []
+
+    def test_missing_artifacts_are_processed_again(
+        self, patched_transcription, job_store, audio_file
+    ):
+        from app.transcription import Transcription
+
+        transcription = Transcription(test_mode=True, job_store=job_store)
+        transcription.add_transcription_source(
+            source_file=audio_file, title="talk"
+        )
+        [job] = job_store.pending_jobs()
+        job_store.checkpoint(
+            job["id"],
+            "converted",
+            media_file=audio_file,
+            audio_file="/gone.mp3",
+        )
+
+        restarted = Transcription(test_mode=True, job_store=job_store)
+        [transcript] = restarted.restore_queue()
+        restarted.start()
+
+        # the download is still there, only the conversion was repeated
+        assert transcript.media_file == audio_file
+        assert transcript.audio_file == audio_file
+
+    def test_failed_batch_is_kept_to_resume(
+        self, patched_transcription, job_store, audio_file
+    ):
+        from app.transcription import Transcription
+        from routes import transcription as routes
+
+        job_store.save_config({"test_mode": True})
+        transcription = Transcription(test_mode=True, job_store=job_store)
+        transcription.add_transcription_source(
+            source_file=audio_file, title="talk"
+        )
+
+        with (
+            mock.patch.object(routes, "job_store", job_store),
+            mock.patch.object(routes, "transcription_instance", transcription),
+            mock.patch.object(
+                Transcription, "_transcribe", side_effect=Exception("down")
+            ),
+        ):
+            with pytest.raises(Exception, match="down"):
+                routes.run_and_reset_transcription(transcription)
+            restored = routes.transcription_instance
+
+        assert job_store.get_status() == "failed"
+        [job] = job_store.pending_jobs()
+        assert job["stage"] == "converted"
+        # the failed batch is queued again from its last finished stage
+        [transcript] = restored.transcripts
+        assert transcript.stage == "converted"
+
+    def test_existing_batch_takes_the_new_concurrency(self, job_store):
+        from app.transcription import Transcription
+        from routes import transcription as routes
+
+        job_store.save_config({"test_mode": True})
+        transcription = Transcription(test_mode=True, job_store=job_store)
+
+        with mock.patch.object(
+            routes, "transcription_instance", transcription
+        ):
+            same = routes.get_transcription_instance(
+                test_mode=True, max_concurrent_transcripts=3
+            )
+
+        assert same is transcription
+        assert transcription.max_concurrent_transcripts == 3
+        # a restored batch keeps it too
+        assert job_store.load_config() == {
+            "test_mode": True,
+            "max_concurrent_transcripts": 3,
+        }
+
+    def test_failed_restore_keeps_the_queue(self, job_store, audio_file):
+        import asyncio
+        from fastapi import BackgroundTasks
+        from app.transcription import Transcription
+        from routes import transcription as routes
+
+        job_store.save_config({"test_mode": True, "username": "tester"})
+        job_store.add_job("misc", "talk", {"source_file": audio_file})
+
+        with (
+            mock.patch.object(routes, "job_store", job_store),
+            mock.patch.object(routes, "transcription_instance", None),
+            mock.patch.object(routes, "restore_error", None),
+            mock.patch.object(
+                Transcription, "restore_queue", side_effect=Exception("broken")
+            ),
+        ):
+            assert routes.get_transcription_instance(test_mode=True) is None
+            response = asyncio.run(routes.start(BackgroundTasks()))
+            queue = asyncio.run(routes.get_queue())
+
+        assert response["status"] == "restore_failed"
+        assert "broken" in response["message"]
+        assert [job["title"] for job in queue["data"]] == ["talk"]
+        # neither adding to the queue nor starting replaced the batch
+        assert len(job_store.pending_jobs()) == 1
+        assert job_store.load_config() == {
+            "test_mode": True,
+            "username": "tester",
+        }
+
+    def test_sources_added_while_running_stay_queued(
+        self, patched_transcription, job_store, audio_file, temp_dir
+    ):
+        from app.transcription import Transcription
+        from routes import transcription as routes
+
+        later_file = os.path.join(temp_dir, "later.mp3")
+        with open(later_file, "wb") as f:
+            f.write(b"not really an mp3 either")
+        job_store.save_config({"test_mode": True})
+        transcription = Transcription(test_mode=True, job_store=job_store)
+        transcription.add_transcription_source(
+            source_file=audio_file, title="talk"
+        )
+
+        export = Transcription._export
+
+        def export_and_queue(self, transcript):
+            export(self, transcript)
+            if transcript.title == "talk":
+                self.add_transcription_source(
+                    source_file=later_file, title="later"
+                )
+
+        with (
+            mock.patch.object(routes, "job_store", job_store),
+            mock.patch.object(routes, "transcription_instance", transcription),
+            mock.patch.object(Transcription, "_export", export_and_queue),
+        ):
+            routes.run_and_reset_transcription(transcription)
+            instance = routes.transcription_instance
+
+        [job] = job_store.pending_jobs()
+        assert job["title"] == "later"
+        assert job_store.get_status() == "completed"
+        # the source is still queued for the next batch
+        assert instance is transcription
+        assert [t.title for t in transcription.transcripts] == ["later"]
+
+    def test_batches_with_the_same_title_share_a_store(
+        self, patched_transcription, job_store, audio_file
+    ):
+        from app.transcription import Transcription
+
+        tmp_dirs = []
+        for _ in range(2):
+            # the files of the first batch are kept, e.g. with nocleanup
+            transcription = Transcription(
+                test_mode=True, job_store=job_store, nocleanup=True
+            )
+            transcription.add_transcription_source(
+                source_file=audio_file, title="same title"
+            )
+            [transcript] = transcription.start()
+            assert transcript.status == "completed"
+            tmp_dirs.append(transcript.tmp_dir)
+
+        assert tmp_dirs[0] != tmp_dirs[1]
+        assert all(
+            os.path.dirname(tmp_dir) == job_store.working_dir
+            for tmp_dir in tmp_dirs
+        )
@@ -0,0 +1,185 @@
+import os
+from unittest import mock
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.media_processor import MediaProcessor
+
+
+@pytest.mark.unit
+class TestSplitAudio:
+    """Tests for splitting audio into overlapping chunks"""
+
+    def test_chunk_boundaries(self):
+        processor = MediaProcessor(chunk_length=100.0)
+
+        assert processor.chunk_boundaries(250.0, overlap=10.0) == [
+            (0, 100.0), (90.0, 190.0), (180.0, 250.0)
+        ]
+        assert processor.chunk_boundaries(80.0) == [(0, 80.0)]
+        assert processor.chunk_boundaries(200.0) == [(0, 100.0), (100.0, 200.0)]
+
+    def test_overlap_must_be_shorter_than_chunk(self):
+        with pytest.raises(Exception):
+            MediaProcessor(chunk_length=10.0).chunk_boundaries(
+                100.0, overlap=10.0
+            )
+
+    def test_chunks_are_stream_copied(self, temp_dir):
+        audio_path = os.path.join(temp_dir, "talk.mp3")
+        processor = MediaProcessor(chunk_length=100.0)
+
+        with mock.patch("app.media_processor.ffmpeg") as ffmpeg:
+            ffmpeg.probe.return_value = {"format": {"duration": "250.0"}}
+            chunk_paths = processor.split_audio(
+                audio_path, os.path.join(temp_dir, "chunks"), overlap=10.0
+            )
+
+        assert chunk_paths == [
+            os.path.join(temp_dir, "chunks", f"chunk_{i}.mp3")
+            for i in [1, 2, 3]
+        ]
+        seeks = [call.kwargs for call in ffmpeg.input.call_args_list]
+        assert seeks == [
+            {"ss": 0, "t": 100.0},
+            {"ss": 90.0, "t": 100.0},
+            {"ss": 180.0, "t": 70.0},
+        ]
+        output = ffmpeg.input.return_value.output
+        assert output.call_args.kwargs["acodec"] == "copy"
+
+
+def energy_with_pauses(start, duration, pauses, window=0.05):
+    """RMS energy of speech with silent (start, end) `pauses`"""
+    times = start + np.arange(int(round(duration / window))) * window
+    energy = np.full(len(times), 1000.0)
+    for pause_start, pause_end in pauses:
+        energy[(times >= pause_start) & (times < pause_end)] = 10.0
+    return energy
+
+
+@pytest.mark.unit
+class TestQuietChunkBoundaries:
+    """Tests for cutting chunks at quiet points"""
+
+    def test_chunks_end_in_pauses(self):
+        processor = MediaProcessor(chunk_length=100.0)
+        pauses = [(85.0, 86.0), (170.0, 171.0), (194.0, 194.5)]
+
+        def energy(audio, start, duration, window):
+            return energy_with_pauses(start, duration, pauses, window)
+
+        with mock.patch.object(
+            processor, "rms_energy", side_effect=energy
+        ) as rms_energy:
+            boundaries = processor.quiet_chunk_boundaries(
+                "talk.mp3", 250.0, overlap=2.0, search_window=20.0)
+
+        assert boundaries == [(0, 85.5), (83.5, 170.5), (168.5, 250.0)]
+        # only the search windows are decoded
+        assert [call.args[1:3] for call in rms_energy.call_args_list] == [
+            (80.0, 20.0), (163.5, 20.0)
+        ]
+
+    def test_last_of_equally_quiet_pauses(self):
+        processor = MediaProcessor(chunk_length=100.0)
+        energy = energy_with_pauses(90.0, 10.0, [(91.0, 92.0), (96.0, 97.0)])
+
+        with mock.patch.object(processor, "rms_energy", return_value=energy):
+            assert processor.find_quiet_point("talk.mp3", 90.0, 100.0) == 96.5
+        with mock.patch.object(
+            processor, "rms_energy", return_value=np.full(200, 5.0)
+        ):
+            assert processor.find_quiet_point("talk.mp3", 90.0, 100.0) == 95.0
+
+    def test_cut_at_chunk_length_when_audio_cannot_be_decoded(self):
+        processor = MediaProcessor(chunk_length=100.0)
+
+        with mock.patch("app.media_processor.ffmpeg") as ffmpeg:
+            ffmpeg.Error = type("Error", (Exception,), {"stderr": None})
+            run = ffmpeg.input.return_value.output.return_value.run
+            run.side_effect = ffmpeg.Error()
+            boundaries = processor.quiet_chunk_boundaries("talk.mp3", 150.0)
+
+        assert boundaries == [(0, 100.0), (100.0, 150.0)]
+
+    def test_rms_energy(self):
+        processor = MediaProcessor()
+        # 0.1s of silence, then 0.1s of a square wave, at 8kHz
+        samples = np.concatenate(
+            [np.zeros(800), np.tile([3000, -3000], 400)]).astype(np.int16)
+
+        with mock.patch("app.media_processor.ffmpeg") as ffmpeg:
+            ffmpeg.input.return_value.output.return_value.run.return_value = (
+                samples.tobytes(), b"")
+            energy = processor.rms_energy("talk.mp3", 60.0, 0.2)
+
+        assert energy.tolist() == [0.0, 0.0, 3000.0, 3000.0]
+        assert ffmpeg.input.call_args.kwargs == {"ss": 60.0, "t": 0.2}
+        assert ffmpeg.input.return_value.output.call_args.kwargs["ar"] == 8000
+
+
+@pytest.mark.unit
+class TestProbe:
+    """Tests for reading media properties without decoding"""
+
+    def test_ffprobe(self):
+        probe_output = {
+            "format": {"duration": "5400.25"},
+            "streams": [
+                {"codec_type": "video", "codec_name": "h264"},
+                {
+                    "codec_type": "audio",
+                    "codec_name": "mp3",
+                    "sample_rate": "44100",
+                    "channels": 2,
+                },
+            ],
+        }
+        with mock.patch(
+            "app.media_processor.ffmpeg.probe", return_value=probe_output
+        ):
+            info = MediaProcessor().probe("talk.mp4")
+
+        assert info == {
+            "duration": 5400.25,
+            "codec": "mp3",
+            "sample_rate": 44100,
+            "channels": 2,
+        }
+
+    def test_headers_are_read_without_ffprobe(self, temp_dir):
+        audio_path = os.path.join(temp_dir, "talk.wav")
+        sf.write(audio_path, np.zeros(16000 * 3), 16000)
+
+        with mock.patch(
+            "app.media_processor.ffmpeg.probe",
+            side_effect=FileNotFoundError("ffprobe"),
+        ):
+            info = MediaProcessor().probe(audio_path)
+
+        assert info["duration"] == 3.0
+        assert info["sample_rate"] == 16000
+        assert info["channels"] == 1
+
+    def test_probe_is_cached_on_transcript(self, temp_dir):
+        from app.transcript import Transcript
+
+        transcript = Transcript(source=mock.MagicMock())
+        transcript.audio_file = os.path.join(temp_dir, "talk.mp3")
+        media_info = {
+            "duration": 60.0,
+            "codec": "mp3",
+            "sample_rate": 44100,
+            "channels": 1,
+        }
+
+        with mock.patch.object(
+            MediaProcessor, "probe", return_value=media_info
+        ) as probe:
+            assert transcript.probe_audio() == media_info
+            assert transcript.probe_audio() == media_info
+
+        probe.assert_called_once_with(transcript.audio_file)
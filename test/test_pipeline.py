@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+from app.exceptions import StageError
+from app.pipeline import Pipeline, Stage
+
+
+@pytest.mark.unit
+class TestPipeline:
+    """Tests for the staged execution of transcripts"""
+
+    def test_items_pass_through_every_stage_in_order(self):
+        visited = []
+        lock = threading.Lock()
+
+        def record(stage_name):
+            def func(item):
+                with lock:
+                    visited.append((item, stage_name))
+
+            return func
+
+        pipeline = Pipeline(
+            [
+                Stage("acquire", record("acquire")),
+                Stage("export", record("export")),
+            ]
+        )
+        pipeline.run([1, 2, 3])
+
+        for item in [1, 2, 3]:
+            stages = [
+                stage for visited_item, stage in visited if visited_item == item
+            ]
+            assert stages == ["acquire", "export"]
+
+    def test_stages_overlap(self):
+        """A batch takes about the time of its slowest stage, not the sum"""
+        delay = 0.05
+
+        def slow(item):
+            time.sleep(delay)
+
+        pipeline = Pipeline([Stage(name, slow) for name in "abcd"])
+        started = time.monotonic()
+        pipeline.run(range(8))
+        elapsed = time.monotonic() - started
+
+        sequential = 8 * 4 * delay
+        assert elapsed < sequential * 0.6
+
+    def test_multiple_workers_per_stage(self):
+        processed = []
+        lock = threading.Lock()
+
+        def func(item):
+            time.sleep(0.01)
+            with lock:
+                processed.append(item)
+
+        pipeline = Pipeline(
+            [
+                Stage("a", func, workers=3),
+                Stage("b", lambda item: None, workers=2),
+            ]
+        )
+        pipeline.run(range(20))
+
+        assert sorted(processed) == list(range(20))
+
+    def test_failure_stops_pipeline(self):
+        exported = []
+
+        def acquire(item):
+            if item == 2:
+                raise Exception("download failed")
+
+        pipeline = Pipeline(
+            [Stage("acquire", acquire), Stage("export", exported.append)]
+        )
+        with pytest.raises(StageError) as excinfo:
+            pipeline.run(range(50))
+
+        assert excinfo.value.stage == "acquire"
+        assert excinfo.value.item == 2
+        assert str(excinfo.value) == "download failed"
+        assert 2 not in exported
+        assert len(exported) < 50
+
+    def test_stage_requires_a_worker(self):
+        with pytest.raises(Exception):
+            Stage("acquire", lambda item: None, workers=0)
+
+
+@pytest.mark.unit
+class TestTranscriptionConcurrency:
+    """Tests for the worker limits of the transcription pipeline"""
+
+    @pytest.fixture
+    def config(self, patched_transcription, mock_transcription_deps):
+        values = {}
+        mock_transcription_deps["settings"].config.getint.side_effect = (
+            lambda key, fallback=None: values.get(key, fallback)
+        )
+        return values
+
+    def test_default_is_one_transcript_at_a_time(self, config):
+        from app.transcription import Transcription
+
+        transcription = Transcription(test_mode=True)
+        assert transcription.max_concurrent_transcripts == 1
+        assert transcription._stage_workers("download_workers") == 1
+
+    def test_stage_limits_are_capped(self, config):
+        from app.transcription import Transcription
+
+        config["ffmpeg_workers"] = 2
+        config["download_workers"] = 16
+        transcription = Transcription(
+            test_mode=True, max_concurrent_transcripts=8
+        )
+        assert transcription._stage_workers("ffmpeg_workers") == 2
+        assert transcription._stage_workers("download_workers") == 8
+        assert transcription._stage_workers("transcription_workers") == 8
+
+    def test_invalid_limit(self, config):
+        from app.transcription import Transcription
+
+        with pytest.raises(Exception):
+            Transcription(test_mode=True, max_concurrent_transcripts=0)
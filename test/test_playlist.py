@@ -0,0 +1,201 @@
+import threading
+import time
+from datetime import date
+from unittest import mock
+
+import pytest
+
+from app.transcript import Playlist, Source, Video
+
+
+def playlist_source():
+    return Source(
+        source_file="https://www.youtube.com/playlist?list=test",
+        loc="misc",
+        local=False,
+        title=None,
+        date=None,
+        tags=[],
+        category=[],
+        speakers=[],
+        preprocess=True,
+    )
+
+
+def entries(count):
+    return [
+        {"url": f"https://www.youtube.com/watch?v={i}", "title": f"video {i}"}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.unit
+class TestPlaylist:
+    """Tests for the expansion of YouTube playlists"""
+
+    def test_metadata_is_resolved_concurrently(self):
+        active = 0
+        max_active = 0
+        lock = threading.Lock()
+
+        def download_video_metadata(video):
+            nonlocal active, max_active
+            with lock:
+                active += 1
+                max_active = max(max_active, active)
+            time.sleep(0.02)
+            with lock:
+                active -= 1
+
+        with mock.patch.object(
+            Video, "download_video_metadata", autospec=True,
+            side_effect=download_video_metadata,
+        ):
+            playlist = Playlist(source=playlist_source(), entries=entries(12))
+
+        assert max_active > 1
+        # playlist order is kept
+        assert [video.title for video in playlist.videos] == [
+            f"video {i}" for i in range(12)
+        ]
+
+    def test_failed_entry_does_not_abort_the_playlist(self):
+        def download_video_metadata(video):
+            if video.title == "video 2":
+                raise Exception("Video unavailable")
+
+        with mock.patch.object(
+            Video, "download_video_metadata", autospec=True,
+            side_effect=download_video_metadata,
+        ):
+            playlist = Playlist(
+                source=playlist_source(),
+                entries=entries(4)
+                + [{"url": "private", "title": "[Private video]"}],
+            )
+
+        assert [video.title for video in playlist.videos] == [
+            "video 0", "video 1", "video 3"
+        ]
+        assert playlist.failed_entries == ["https://www.youtube.com/watch?v=2"]
+
+    def test_entries_are_filtered_before_fetching_metadata(self):
+        playlist_entries = entries(6)
+        for i, entry in enumerate(playlist_entries):
+            # newest first
+            entry["upload_date"] = f"202401{20 - i:02d}"
+        excluded = {playlist_entries[0]["url"]: True}
+
+        with mock.patch.object(
+            Video, "download_video_metadata", autospec=True
+        ) as download_video_metadata:
+            playlist = Playlist(
+                source=playlist_source(),
+                entries=playlist_entries,
+                excluded_media=excluded,
+                cutoff_date=date(2024, 1, 17),
+            )
+
+        titles = [video.title for video in playlist.videos]
+        assert titles == ["video 1", "video 2"]
+        assert download_video_metadata.call_count == 2
+        assert playlist.skipped_entries == [
+            entry["url"] for entry in playlist_entries if entry["title"] not in
+            ["video 1", "video 2"]
+        ]
+
+    def test_unsorted_playlist_is_filtered_entry_by_entry(self):
+        playlist_entries = entries(5)
+        # a curated playlist, in no particular order
+        for entry, day in zip(playlist_entries, [20, 18, 10, 25, 5]):
+            entry["upload_date"] = f"202401{day:02d}"
+
+        with mock.patch.object(Video, "download_video_metadata", autospec=True):
+            playlist = Playlist(
+                source=playlist_source(),
+                entries=playlist_entries,
+                cutoff_date=date(2024, 1, 17),
+            )
+
+        assert [video.title for video in playlist.videos] == [
+            "video 0", "video 1", "video 3"
+        ]
+        assert playlist.skipped_entries == [
+            playlist_entries[2]["url"], playlist_entries[4]["url"]
+        ]
+
+    def test_uploads_stop_at_the_cutoff_date(self):
+        playlist_entries = entries(5)
+        for i, entry in enumerate(playlist_entries):
+            entry["upload_date"] = f"202401{20 - i:02d}"
+        # the order of the uploads is trusted, the rest is not looked at
+        playlist_entries[4]["upload_date"] = "20240125"
+        info_dict = {"id": "UUchannel", "entries": playlist_entries}
+
+        with mock.patch.object(Video, "download_video_metadata", autospec=True):
+            playlist = Playlist(
+                source=playlist_source(),
+                entries=iter(playlist_entries),
+                cutoff_date=date(2024, 1, 17),
+                newest_first=Playlist.is_newest_first(info_dict),
+            )
+
+        assert [video.title for video in playlist.videos] == [
+            "video 0", "video 1", "video 2"
+        ]
+        assert playlist.skipped_entries == [
+            entry["url"] for entry in playlist_entries[3:]
+        ]
+
+    def test_only_channel_uploads_are_newest_first(self):
+        assert Playlist.is_newest_first({"id": "UUabc"})
+        assert Playlist.is_newest_first(
+            {
+                "id": "UCabc",
+                "webpage_url": "https://www.youtube.com/@btc/videos",
+            }
+        )
+        assert not Playlist.is_newest_first(
+            {
+                "id": "PLabc",
+                "webpage_url": "https://www.youtube.com/playlist?list=PLabc",
+            }
+        )
+
+    def test_entries_without_dates_are_kept(self):
+        with mock.patch.object(Video, "download_video_metadata", autospec=True):
+            playlist = Playlist(
+                source=playlist_source(),
+                entries=entries(3),
+                cutoff_date=date(2024, 1, 17),
+            )
+
+        assert len(playlist.videos) == 3
+
+
+@pytest.mark.integration
+class TestPlaylistSources:
+    """Tests for queuing the entries of a playlist"""
+
+    def test_failed_entries_are_returned(self, patched_transcription):
+        from app.transcription import Transcription
+
+        def download_video_metadata(video):
+            if video.title == "video 1":
+                raise Exception("Video unavailable")
+
+        with mock.patch.object(
+            Video, "download_video_metadata", autospec=True,
+            side_effect=download_video_metadata,
+        ):
+            playlist = Playlist(source=playlist_source(), entries=entries(3))
+        transcription = Transcription(test_mode=True)
+
+        with mock.patch.object(
+            Transcription, "_initialize_source", return_value=playlist
+        ):
+            sources = transcription.add_transcription_source(
+                source_file=playlist.source_file, title="playlist")
+
+        assert len(sources["added"]) == 2
+        assert sources["failed"] == ["https://www.youtube.com/watch?v=1"]
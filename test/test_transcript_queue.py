@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.exceptions import DuplicateSourceError
+from app.transcript_queue import TranscriptQueue
+
+
+def make_transcript(title, loc="misc", media=None):
+    source = SimpleNamespace(
+        loc=loc, title=title, media=media or f"https://example.com/{title}"
+    )
+    return SimpleNamespace(source=source, title=title)
+
+
+@pytest.mark.unit
+class TestTranscriptQueue:
+    """Tests for the indexed transcription queue"""
+
+    def test_behaves_like_a_list(self):
+        transcripts = [make_transcript(f"talk-{i}") for i in range(3)]
+        queue = TranscriptQueue(transcripts)
+
+        assert len(queue) == 3
+        assert list(queue) == transcripts
+        assert transcripts[1] in queue
+        assert not TranscriptQueue()
+
+    def test_lookups(self):
+        queue = TranscriptQueue()
+        transcript = make_transcript("talk", media="https://example.com/a.mp3")
+        queue.append(transcript)
+
+        assert queue.find("misc", "talk") is transcript
+        assert queue.find("/misc/", "talk") is transcript
+        assert queue.find("other", "talk") is None
+        assert queue.has_media("https://example.com/a.mp3")
+
+        queue.remove(transcript)
+        assert queue.find("misc", "talk") is None
+        assert not queue.has_media("https://example.com/a.mp3")
+        with pytest.raises(ValueError):
+            queue.remove(transcript)
+
+    def test_same_location_and_title(self):
+        first = make_transcript("talk", media="https://example.com/1")
+        second = make_transcript("talk", media="https://example.com/2")
+        queue = TranscriptQueue([first, second])
+
+        assert queue.find("misc", "talk") is first
+        queue.remove(first)
+        assert queue.find("misc", "talk") is second
+
+    def test_iterate_while_threads_change_the_queue(self):
+        queue = TranscriptQueue(
+            [make_transcript(f"talk-{i}") for i in range(100)])
+
+        def churn():
+            for i in range(1000):
+                transcript = make_transcript(f"new-{i}")
+                queue.append(transcript)
+                queue.remove(transcript)
+
+        thread = threading.Thread(target=churn)
+        thread.start()
+        while thread.is_alive():
+            assert len([t for t in queue if t.title.startswith("talk")]) == 100
+        thread.join()
+        assert len(queue) == 100
+
+
+@pytest.mark.integration
+class TestTranscriptionQueue:
+    """Tests for adding and removing sources of a transcription"""
+
+    @pytest.fixture
+    def sources(self, temp_dir):
+        sources = []
+        for i in range(50):
+            path = os.path.join(temp_dir, f"talk-{i}.mp3")
+            with open(path, "wb") as f:
+                f.write(b"audio")
+            sources.append(
+                {"source_file": path, "title": f"talk {i}", "loc": "misc"}
+            )
+        return sources
+
+    def test_add_and_remove_json(
+        self, patched_transcription, temp_dir, sources
+    ):
+        from app.transcription import Transcription
+
+        json_file = os.path.join(temp_dir, "sources.json")
+        with open(json_file, "w") as f:
+            json.dump(sources, f)
+
+        transcription = Transcription(test_mode=True)
+        transcription.add_transcription_source_JSON(json_file)
+        assert len(transcription.transcripts) == 50
+
+        with pytest.raises(DuplicateSourceError):
+            transcription.add_transcription_source(
+                source_file=sources[0]["source_file"], title="talk 0"
+            )
+
+        with open(json_file, "w") as f:
+            json.dump(sources[10:], f)
+        removed = transcription.remove_transcription_source_JSON(json_file)
+
+        assert len(removed) == 40
+        assert [t.title for t in transcription.transcripts] == [
+            f"talk {i}" for i in range(10)
+        ]
+
+    def test_media_is_queued_once(self, patched_transcription, sources):
+        from app.transcription import Transcription
+
+        transcription = Transcription(test_mode=True)
+        source_file = sources[0]["source_file"]
+        transcription.add_transcription_source(
+            source_file=source_file, title="talk"
+        )
+        result = transcription.add_transcription_source(
+            source_file=source_file, title="same talk"
+        )
+
+        assert result["exist"] == [source_file]
+        assert len(transcription.transcripts) == 1
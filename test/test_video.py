@@ -1,11 +1,10 @@
 import json
 import os
 import re
-from datetime import datetime
 
 import pytest
 
-from app import application, __version__
+from app import __version__
 from app.transcription import Transcription
 from test_helpers import check_md_file
 
@@ -29,7 +28,13 @@ def test_video_with_title():
         test_mode=True,
     )
     transcription.add_transcription_source(
-        source_file=source, title=title, date=date, tags=tags, category=category, speakers=speakers)
+        source_file=source,
+        title=title,
+        date=date,
+        tags=tags,
+        category=category,
+        speakers=speakers,
+    )
     transcripts = transcription.start()
 
     assert os.path.isfile(transcripts[0].outputs["markdown"])
@@ -61,7 +66,13 @@ def test_video_with_all_options():
         test_mode=True,
     )
     transcription.add_transcription_source(
-        source_file=source, title=title, date=date, tags=tags, category=category, speakers=speakers)
+        source_file=source,
+        title=title,
+        date=date,
+        tags=tags,
+        category=category,
+        speakers=speakers,
+    )
     transcripts = transcription.start()
     assert os.path.isfile(transcripts[0].outputs["markdown"])
 
@@ -96,7 +107,13 @@ def test_video_with_chapters():
         test_mode=True,
     )
     transcription.add_transcription_source(
-        source_file=source, title=title, date=date, tags=tags, category=category, speakers=speakers)
+        source_file=source,
+        title=title,
+        date=date,
+        tags=tags,
+        category=category,
+        speakers=speakers,
+    )
     transcripts = transcription.start(result)
 
     chapter_names = []
@@ -142,9 +159,16 @@ def test_generate_payload():
         test_mode=True,
     )
     transcription.add_transcription_source(
-        source_file=source, loc=loc, title=title, date=date, tags=tags, category=category, speakers=speakers)
+        source_file=source,
+        loc=loc,
+        title=title,
+        date=date,
+        tags=tags,
+        category=category,
+        speakers=speakers,
+    )
     transcription.start(test_transcript=transcript)
-    transcript_json = transcription.transcripts[0].to_json()
+    transcript_json = transcription.transcripts.find(loc, title).to_json()
     transcript_json["transcript_by"] = f"{username} via tstbtc v{__version__}"
     payload = {
         "content": transcript_json
@@ -0,0 +1,43 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+
+from app.data_writer import DataWriter
+from app.services.whisper import Whisper
+
+
+@pytest.mark.unit
+class TestWhisperModel:
+    """Tests for sharing the Whisper model between transcription workers"""
+
+    def test_model_is_loaded_once_for_concurrent_workers(self, temp_dir):
+        running = []
+        overlapped = threading.Event()
+
+        def transcribe(audio_file):
+            running.append(audio_file)
+            if len(running) > 1:
+                overlapped.set()
+            time.sleep(0.01)
+            running.remove(audio_file)
+            return {"text": audio_file}
+
+        whisper_module = mock.MagicMock()
+        model = whisper_module.load_model.return_value
+        model.transcribe.side_effect = transcribe
+        service = Whisper(
+            "tiny.en", False, DataWriter(os.path.join(temp_dir, "metadata"))
+        )
+        service._whisper = whisper_module
+
+        audio_files = [f"{i}.mp3" for i in range(8)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(service.audio_to_text, audio_files))
+
+        assert [result["text"] for result in results] == audio_files
+        whisper_module.load_model.assert_called_once_with("tiny.en")
+        assert not overlapped.is_set()
@@ -0,0 +1,83 @@
+import pytest
+
+from app.word_table import WordRange, WordTable
+
+
+def make_words():
+    words = []
+    for i, (text, speaker) in enumerate(
+        [("Hello", 0), ("there.", 0), ("Hi", 1), ("again.", 1), ("Bye.", 0)]
+    ):
+        words.append(
+            {
+                "word": text.lower().rstrip("."),
+                "start": i * 0.5,
+                "end": i * 0.5 + 0.4,
+                "confidence": 0.9,
+                "speaker": speaker,
+                "speaker_confidence": 0.75,
+                "punctuated_word": text,
+            }
+        )
+    return words
+
+
+@pytest.mark.unit
+class TestWordTable:
+    """Tests for the columnar store of the words of a transcript"""
+
+    def test_rows_are_the_original_words(self):
+        words = make_words()
+        # without diarization, words have no speaker
+        del words[1]["speaker"], words[1]["speaker_confidence"]
+        table = WordTable(words)
+
+        assert table.rows(0, len(table)) == words
+        assert [table.row(i) for i in range(len(table))] == words
+        assert table.texts(1, 3) == ["there.", "Hi"]
+        assert not table.has_speakers()
+
+    def test_strings_are_interned(self):
+        table = WordTable(make_words() * 100)
+
+        assert len(table) == 500
+        assert len(table.strings) == 10
+
+    def test_speaker_turns(self):
+        table = WordTable(make_words())
+
+        assert table.speaker_turns() == [(0, 2), (2, 4), (4, 5)]
+        assert WordTable([]).speaker_turns() == []
+
+
+@pytest.mark.unit
+class TestWordRange:
+    """Tests for the views of a word table used by segments and sentences"""
+
+    def test_behaves_like_a_list(self):
+        words = make_words()
+        words_range = WordRange(WordTable(words), 1, 4)
+
+        assert len(words_range) == 3
+        assert words_range == words[1:4]
+        assert words_range[0] == words[1]
+        assert words_range[-1] == words[3]
+        assert words_range[1:] == words[2:4]
+        assert words_range.column("start") == [0.5, 1.0, 1.5]
+        with pytest.raises(IndexError):
+            words_range[3]
+
+    def test_addition(self):
+        words = make_words()
+        table = WordTable(words)
+        first, second = WordRange(table, 0, 2), WordRange(table, 2, 5)
+
+        combined = first + second
+        assert isinstance(combined, WordRange)
+        assert (combined.first, combined.last) == (0, 5)
+        # anything else than adjacent ranges gives a list
+        band_aid_word = {"punctuated_word": "[bs=0.000]"}
+        assert first + [band_aid_word] + second == (
+            words[:2] + [band_aid_word] + words[2:]
+        )
+        assert second + first == words[2:] + words[:2]
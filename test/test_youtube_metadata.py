@@ -0,0 +1,119 @@
+from unittest import mock
+
+import pytest
+
+from app.media_processor import MediaProcessor
+from app.transcript import Source, Video
+from app.youtube_metadata import YouTubeMetadataCache, youtube_metadata
+
+VIDEO_URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+class FakeYoutubeDL:
+    """Records the calls that would reach YouTube"""
+
+    calls = []
+
+    def __init__(self, params=None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def extract_info(self, url, download=False):
+        self.calls.append(("extract_info", url, download))
+        return {"id": "dQw4w9WgXcQ", "title": "talk", "upload_date": "20240101"}
+
+    def sanitize_info(self, info):
+        return info
+
+    def process_ie_result(self, info, download=False):
+        self.calls.append(("process_ie_result", info["id"], download))
+        return info
+
+    def prepare_filename(self, info):
+        return f"/tmp/{info['id']}.mp4"
+
+
+@pytest.fixture
+def fake_youtube():
+    FakeYoutubeDL.calls = []
+    youtube_metadata.clear()
+    with mock.patch("yt_dlp.YoutubeDL", FakeYoutubeDL):
+        yield FakeYoutubeDL.calls
+    youtube_metadata.clear()
+
+
+@pytest.mark.unit
+class TestYouTubeMetadataCache:
+    """Tests for sharing yt-dlp metadata between source detection,
+    metadata extraction and download"""
+
+    def test_video_id(self):
+        video_id = YouTubeMetadataCache.video_id
+        assert video_id(VIDEO_URL) == "dQw4w9WgXcQ"
+        assert video_id("https://youtu.be/dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+        assert video_id("https://example.com/talk.mp4") is None
+
+    def test_entries_expire(self, fake_youtube):
+        cache = YouTubeMetadataCache(ttl=0)
+        cache.extract_info(VIDEO_URL)
+        cache.extract_info(VIDEO_URL)
+        assert len(fake_youtube) == 2
+
+    def test_expired_entries_are_purged(self, fake_youtube):
+        cache = YouTubeMetadataCache(ttl=0)
+        cache.extract_info("https://www.youtube.com/watch?v=aaaaaaaaaaa")
+        cache.extract_info("https://www.youtube.com/watch?v=bbbbbbbbbbb")
+        assert list(cache._entries) == ["bbbbbbbbbbb"]
+
+    def test_least_recently_used_entries_are_evicted(self, fake_youtube):
+        cache = YouTubeMetadataCache(ttl=3600, max_entries=2)
+        first, second, third = (
+            f"https://www.youtube.com/watch?v={c * 11}" for c in "abc"
+        )
+        cache.extract_info(first)
+        cache.extract_info(second)
+        cache.extract_info(first)  # first is now the most recently used
+        cache.extract_info(third)
+
+        assert list(cache._entries) == ["aaaaaaaaaaa", "ccccccccccc"]
+        assert len(fake_youtube) == 3
+
+    def test_one_extraction_per_video(self, fake_youtube):
+        video = Video(
+            source=Source(
+                source_file=VIDEO_URL, loc="misc", local=False, title=None,
+                date=None, tags=[], category=[], speakers=[], preprocess=True,
+            )
+        )
+        # another URL form of the same video
+        youtube_metadata.extract_info("https://youtu.be/dQw4w9WgXcQ")
+        filename = MediaProcessor().download_youtube_video(
+            VIDEO_URL, output_dir="/tmp"
+        )
+
+        assert video.title == "talk"
+        assert filename == "/tmp/dQw4w9WgXcQ.mp4"
+        assert fake_youtube == [
+            ("extract_info", VIDEO_URL, False),
+            ("process_ie_result", "dQw4w9WgXcQ", True),
+        ]
+
+    def test_video_url_is_detected_once(
+        self, fake_youtube, patched_transcription
+    ):
+        from app.transcription import Transcription
+
+        transcription = Transcription(test_mode=True)
+        sources = transcription.add_transcription_source(
+            VIDEO_URL, nocheck=True
+        )
+
+        assert sources["added"] == [VIDEO_URL]
+        assert len(transcription.transcripts) == 1
+        # detection and metadata share a single extraction
+        assert fake_youtube == [("extract_info", VIDEO_URL, False)]
@@ -1,18 +1,19 @@
-import json
+# aliased, as the `json` option of the commands shadows the module
+import json as json_module
 import logging
 import traceback
-import os
 import click
 
 from app import __app_name__, __version__, commands, utils
 from app.api_client import APIClient
 from app.commands.cli_utils import (
-    get_transcription_url, 
+    get_transcription_url,
     auto_start_server
 )
 from app.config import settings
 from app.data_writer import DataWriter
 from app.logging import configure_logger, get_logger
+from app.services.deepgram import ChunkCombiner
 from app.transcription import Transcription
 
 logger = get_logger()
@@ -58,7 +59,8 @@ def print_version(ctx, param, value):
 @click.group()
 @click.pass_context
 def cli(ctx, auto_server, server_mode, server_verbose):
-    # Store auto_server and server_mode in the context for use in ServerCheckGroup
+    # Store auto_server and server_mode in the context for use in
+    # ServerCheckGroup
     ctx.obj = {
         "auto_server": auto_server,
         "server_mode": server_mode,
@@ -125,10 +127,10 @@ cutoff_date = click.option(
     default=settings.config.get("cutoff_date", None),
     help=(
         "Specify a cutoff date (in YYYY-MM-DD format) to process only sources "
-        "published after this date. Sources with a publication date on or before "
-        "the cutoff will be excluded from processing. This option is useful for "
-        "focusing on newer content or limiting the scope of processing to a "
-        "specific date range."
+        "published after this date. Sources with a publication date on or "
+        "before the cutoff will be excluded from processing. This option is "
+        "useful for focusing on newer content or limiting the scope of "
+        "processing to a specific date range."
     ),
 )
 nocheck = click.option(
@@ -136,7 +138,10 @@ nocheck = click.option(
     is_flag=True,
     default=settings.config.getboolean("nocheck", False),
     show_default=True,
-    help=f"Do not check for existing sources using {settings.BTC_TRANSCRIPTS_URL}/status.json",
+    help=(
+        "Do not check for existing sources using "
+        f"{settings.BTC_TRANSCRIPTS_URL}/status.json"
+    ),
 )
 username = click.option(
     "--username",
@@ -202,6 +207,15 @@ nocleanup = click.option(
     default=settings.config.getboolean("nocleanup", False),
     help="Do not remove temp files on exit",
 )
+max_concurrent_transcripts = click.option(
+    "--max-concurrent-transcripts",
+    type=click.IntRange(min=1),
+    default=settings.config.getint("max_concurrent_transcripts", 1),
+    show_default=True,
+    help="Maximum number of transcripts of the batch that are processed at "
+    "the same time. The download, ffmpeg and transcription stages can be "
+    "limited further in config.ini",
+)
 verbose_logging = click.option(
     "-V",
     "--verbose",
@@ -213,13 +227,19 @@ verbose_logging = click.option(
 add_loc = click.option(
     "--loc",
     default="misc",
-    help="Add the location in the bitcointranscripts hierarchy that you want to associate the transcript with",
+    help=(
+        "Add the location in the bitcointranscripts hierarchy that you want "
+        "to associate the transcript with"
+    ),
 )
 add_title = click.option(
     "-t",
     "--title",
     type=str,
-    help="Add the title for the resulting transcript (required for audio files)",
+    help=(
+        "Add the title for the resulting transcript "
+        "(required for audio files)"
+    ),
 )
 add_date = click.option(
     "-d",
@@ -237,13 +257,19 @@ add_speakers = click.option(
     "-s",
     "--speakers",
     multiple=True,
-    help="Add a speaker to the transcript's metadata (can be used multiple times)",
+    help=(
+        "Add a speaker to the transcript's metadata "
+        "(can be used multiple times)"
+    ),
 )
 add_category = click.option(
     "-c",
     "--category",
     multiple=True,
-    help="Add a category to the transcript's metadata (can be used multiple times)",
+    help=(
+        "Add a category to the transcript's metadata "
+        "(can be used multiple times)"
+    ),
 )
 
 
@@ -277,6 +303,7 @@ add_category = click.option(
 # Configuration options
 @model_output_dir
 @nocleanup
+@max_concurrent_transcripts
 @verbose_logging
 @auto_start_server
 def transcribe(
@@ -304,6 +331,7 @@ def transcribe(
     needs_review: bool,
     cutoff_date: str,
     nocheck: bool,
+    max_concurrent_transcripts: int,
 ) -> None:
     """Transcribe the provided sources. Suported sources include: \n
     - YouTube videos and playlists\n
@@ -343,6 +371,7 @@ def transcribe(
         "needs_review": needs_review,
         "cutoff_date": cutoff_date,
         "nocheck": nocheck,
+        "max_concurrent_transcripts": max_concurrent_transcripts,
     }
     try:
         queue_response = api_client.add_to_queue(data, source)
@@ -368,6 +397,21 @@ def get_queue():
         logger.error(f"Failed to get queue: {e}")
 
 
+@cli.command()
+def reset_queue():
+    """Discard the transcription queue, including a persisted queue that
+    the server could not restore"""
+    configure_logger(log_level=logging.INFO)
+    url = get_transcription_url()
+    api_client = APIClient(url)
+
+    try:
+        response = api_client.reset_queue()
+        logger.info(response)
+    except Exception as e:
+        logger.error(f"Failed to reset queue: {e}")
+
+
 @cli.command()
 @click.argument("source", nargs=1)
 # Options for configuring the transcription preprocess
@@ -479,7 +523,7 @@ def postprocess(
         logger.info(
             f"Postprocessing {service} transcript from {metadata_json_file}")
         with open(metadata_json_file, "r") as outfile:
-            metadata_json = json.load(outfile)
+            metadata_json = json_module.load(outfile)
         metadata = utils.configure_metadata_given_from_JSON(
             metadata_json, from_json=metadata_json_file)
         transcription.add_transcription_source(
@@ -501,22 +545,39 @@ def postprocess(
             cutoff_date=metadata["cutoff_date"]
         )
         # Finalize transcription service output
-        transcript = transcription.transcripts[0]
+        transcript = transcription.transcripts.find(
+            metadata["loc"], metadata["title"])
+        transcription_service_output = None
         if metadata.get("deepgram_chunks"):
             logger.info("Combining deepgram chunk outputs...")
-            all_chunks_output = []
+            # where the chunks were cut, not stored for older transcripts
+            boundaries = metadata.get("deepgram_chunk_boundaries")
+            if not boundaries:
+                # used before chunks were cut at quiet points
+                overlap_between_chunks = 30.0
+            elif len(boundaries) > 1:
+                overlap_between_chunks = boundaries[0][1] - boundaries[1][0]
+            else:
+                overlap_between_chunks = 0.0
+            combiner = ChunkCombiner(
+                transcription.service.processor.chunk_length,
+                overlap_between_chunks,
+                transcription.service.summarize,
+                boundaries,
+            )
+            # load one chunk at a time
             for chunk_file in metadata["deepgram_chunks"]:
                 with open(chunk_file, "r") as chunk:
-                    all_chunks_output.append(json.load(chunk))
-            overlap_between_chunks = 30.0  # or any other value used during splitting
-            transcription_service_output = transcription.service.combine_chunk_outputs(
-                all_chunks_output, overlap=overlap_between_chunks)
-            transcript.outputs["transcription_service_output_file"] = transcription.service.write_to_json_file(
+                    combiner.add(json_module.load(chunk))
+            transcription_service_output = combiner.output
+            output_file = transcription.service.write_to_json_file(
                 transcription_service_output, transcript)
         else:
-            transcript.outputs["transcription_service_output_file"] = metadata[f"{service}_output"]
+            output_file = metadata[f"{service}_output"]
+        transcript.outputs["transcription_service_output_file"] = output_file
 
-        transcription.service.finalize_transcript(transcript)
+        transcription.service.finalize_transcript(
+            transcript, transcription_service_output)
         transcription.postprocess(transcript)
 
         if transcription.github: